@@ -1,12 +1,13 @@
 {
     'name': 'Grab Dashboard',
-    'version': '1.0.0',
+    'version': '1.0.4',
     'summary': 'Integrate and display Grab data in Odoo dashboard (Odoo 18 ready)',
     'author': 'Boon',
-    'depends': ['base', 'product', 'website_sale'],
+    'depends': ['base', 'product', 'account', 'website_sale'],
     'data': [
         'security/ir.model.access.csv',
         'data/system_parameters.xml',
+        'data/ir_cron.xml',
         'views/order_ready_time_wizard.xml',
         'views/grab_view.xml',
         'views/grab_menu_views.xml',
@@ -110,3 +110,44 @@ class GrabWebhooks(http.Controller):
     def get_menu(self, **kwargs):
         # TODO: 返回你真实的菜单
         return {"menu": []}
+
+
+# ====== 出站调用观测：各端点延迟直方图 + token 缓存计数（仅管理员）======
+class GrabMetricsController(http.Controller):
+
+    @http.route('/grab/metrics', type='http', auth='user', methods=['GET'])
+    def grab_metrics(self, **kwargs):
+        if not request.env.user.has_group('base.group_system'):
+            return http.Response(status=403)
+        from ..utils.grab_http import latency_stats
+        from ..utils.grab_oauth import token_stats
+        from ..utils.grab_event_journal import journal
+        from ..utils.grab_idempotency import idempotency_stats
+        body = {"http": latency_stats(), "oauth": token_stats(),
+                "webhook_journal": dict(journal.stats, pending=journal.pending()),
+                "webhook_idempotency": idempotency_stats()}
+        return http.Response(json.dumps(body, indent=2), status=200, content_type='application/json')
+
+
+# ====== 厨显 / 前台：批量 mark ready，返回逐单结果 ======
+class GrabOrderActionsController(http.Controller):
+
+    @http.route('/grab/orders/mark_ready', type='json', auth='user', methods=['POST'])
+    def mark_ready(self, order_ids=None, grab_order_ids=None, mark_status=1, **kwargs):
+        """
+        参数：order_ids（grab.order 的 id）和 / 或 grab_order_ids（Grab 订单号），mark_status 默认 1
+        返回：{"results": [{"id", "grab_order_id", "ok", "status", "message", "queued"}], "elapsed_ms": ...}
+        """
+        Order = request.env['grab.order']
+        domain = []
+        if order_ids:
+            domain = [('id', 'in', [int(i) for i in order_ids])]
+        if grab_order_ids:
+            by_code = [('grab_order_id', 'in', list(grab_order_ids))]
+            domain = ['|'] + domain + by_code if domain else by_code
+        if not domain:
+            return {"results": [], "elapsed_ms": 0}
+        orders = Order.search(domain)
+        start = time.time()
+        results = orders._push_marks(mark_status=int(mark_status))
+        return {"results": results, "elapsed_ms": int((time.time() - start) * 1000)}
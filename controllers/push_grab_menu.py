@@ -3,6 +3,8 @@ from odoo.http import request
 from werkzeug.wrappers import Response
 import json, logging
 
+from ..utils.grab_event_journal import journal_event
+
 _logger = logging.getLogger(__name__)
 
 class GrabPushMenuWebhook(http.Controller):
@@ -14,11 +16,8 @@ class GrabPushMenuWebhook(http.Controller):
             _logger.exception("PushGrabMenu invalid json")
             return Response("Bad Request", status=400)
 
-        # 可保存到一张日志表
-        request.env['grab.push.menu.log'].sudo().create({
-            'grab_merchant_id': data.get('merchantID'),
-            'partner_merchant_id': data.get('partnerMerchantID'),
-            'payload': json.dumps(data)
-        })
+        # 写入统一 webhook 事件日志（进程内缓冲，批量落库）
+        journal_event(request.env, 'push_menu', data, merchant_id=data.get('merchantID'),
+                      partner_merchant_id=data.get('partnerMerchantID'), http_status=204)
         # 如需解析 currency/sellingTimes/categories 可在此入库
         return Response(status=204)
@@ -3,6 +3,8 @@ from odoo.http import request
 from werkzeug.wrappers import Response
 import json, logging
 
+from ..utils.grab_event_journal import journal_event
+
 _logger = logging.getLogger(__name__)
 
 class GrabWebhookIntegrationStatus(http.Controller):
@@ -13,11 +15,9 @@ class GrabWebhookIntegrationStatus(http.Controller):
         except Exception:
             return Response(status=400)
 
-        # 入库或更新状态
-        request.env['grab.integration.status.log'].sudo().create({
-            'grab_merchant_id': data.get('grabMerchantID') or data.get('merchantID'),
-            'partner_merchant_id': data.get('partnerMerchantID'),
-            'status': data.get('integrationStatus') or data.get('status'),
-            'payload': json.dumps(data)
-        })
+        # 写入统一 webhook 事件日志（进程内缓冲，批量落库）
+        journal_event(request.env, 'integration_status', data,
+                      merchant_id=data.get('grabMerchantID') or data.get('merchantID'),
+                      partner_merchant_id=data.get('partnerMerchantID'),
+                      status=data.get('integrationStatus') or data.get('status'), http_status=204)
         return Response(status=204)
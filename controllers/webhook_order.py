@@ -3,12 +3,14 @@
 
 import json
 import logging
-from datetime import datetime
-
 
 from odoo import http
 from odoo.http import request, Response
 
+from ..utils import grab_idempotency
+from ..utils.grab_event_journal import journal_event
+from ..utils.grab_order_pipeline import GrabOrderPipeline, SUBMIT_REQUIRED_FIELDS
+
 _logger = logging.getLogger(__name__)
 
 # ==== Helpers ====
@@ -34,17 +36,6 @@ def _parse_json_from_request():
     except Exception:
         return {}
 
-def _dt_iso_to_odoo(s):
-    if not s or not str(s).strip():
-        return False
-    v = s[:-1] if isinstance(s, str) and s.endswith('Z') else s
-    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
-        try:
-            return datetime.strptime(v, fmt).strftime("%Y-%m-%d %H:%M:%S")
-        except Exception:
-            pass
-    return False
-
 def _json_response(payload, status=200):
     return Response(json.dumps(payload), status=status, headers=[("Content-Type", "application/json")])
 
@@ -56,176 +47,67 @@ def _bad_request(reason, details=None):
 def _server_error(msg):
     return _json_response({"success": False, "reason": "server_error", "message": msg}, status=500)
 
+def _journal(data, status, http_status):
+    values = data if isinstance(data, dict) else {}
+    journal_event(request.env, 'order_submit', data, grab_order_id=values.get('orderID'),
+                  merchant_id=values.get('merchantID'), partner_merchant_id=values.get('partnerMerchantID'),
+                  status=status, http_status=http_status)
+
+def _ingest_mode():
+    """grab.order_ingest_mode: sync（默认，请求内直接入库）/ queue（入队后异步入库）"""
+    ICP = request.env['ir.config_parameter'].sudo()
+    return (ICP.get_param('grab.order_ingest_mode', 'sync') or 'sync').strip().lower()
+
 # ==== Controller ====
 
 class GrabOrderWebhookController(http.Controller):
     @http.route('/grab/webhook/order', type='http', auth='public', csrf=False, cors='*', methods=['POST'])
     def submit_order(self, **kwargs):
+        data = {}
         try:
             data = _parse_json_from_request()
+            if not isinstance(data, dict):
+                _logger.warning("SubmitOrder body is not a JSON object: %s", data)
+                _journal(data, 'invalid_payload', 400)
+                return _bad_request("invalid_payload")
+
+            # --- 重投：与已成功处理过的 payload 完全相同，直接返回当时的应答，不再 upsert ---
+            key, cached = grab_idempotency.lookup(request.env, 'order_submit', data)
+            if cached is not None:
+                _journal(data, 'duplicate', 200)
+                return _json_response(cached, status=200)
 
             # --- 基础校验（Best Practice #1）---
-            required = ["orderID", "shortOrderNumber", "merchantID", "paymentType", "cutlery", "orderTime", "currency", "featureFlags", "items", "price"]
-            missing = [k for k in required if k not in data]
-            if missing:
-                _logger.warning("SubmitOrder missing fields: %s payload=%s", missing, data)
-                return _bad_request("missing_fields", missing)
+            pipeline = GrabOrderPipeline(request.env, required=SUBMIT_REQUIRED_FIELDS)
+            error = pipeline.validate(data)
+            if error:
+                _logger.warning("SubmitOrder %s: %s payload=%s", error[0], error[1], data)
+                _journal(data, error[0], 400)
+                return _bad_request(*error)
 
             order_id = data["orderID"]
 
-            # --- 幂等：命中即“更新”（Best Practice #2）---
-            Order = request.env["grab.order"].sudo()
-            Line  = request.env["grab.order.line"].sudo()
-            MenuItem = request.env['grab.menu.item'].sudo()
-
-            cur = data.get("currency") or {}
-            currency_exponent = cur.get("exponent", 2)  # Default to 2 (cents)
-            price_divisor = 10 ** currency_exponent  # e.g., 100 for SGD (10^2)
-            
-            vals = {
-                "grab_order_id": order_id,
-                "short_order_number": data.get("shortOrderNumber"),
-                "merchant_id": data.get("merchantID"),
-                "partner_merchant_id": data.get("partnerMerchantID"),
-                "payment_type": data.get("paymentType"),
-                "cutlery": data.get("cutlery"),
-                "order_time": _dt_iso_to_odoo(data.get("orderTime")),
-                "submit_time": _dt_iso_to_odoo(data.get("submitTime")),
-                "complete_time": _dt_iso_to_odoo(data.get("completeTime")),
-                "scheduled_time": _dt_iso_to_odoo(data.get("scheduledTime")),
-                "order_state": data.get("orderState") or "",  # Submit payload 里通常为空
-                "currency_code": cur.get("code"),
-                "currency_symbol": cur.get("symbol"),
-                "currency_exponent": currency_exponent,
-                "feature_flags": data.get("featureFlags"),
-                "dine_in": data.get("dineIn"),
-                "receiver": data.get("receiver"),
-                "order_ready_estimation": data.get("orderReadyEstimation"),
-                "price_info": data.get("price"),
-                "membership_id": data.get("membershipID") or "",
-                "raw_json": data,
-                # 记录编辑标志
-                "is_mex_edit_order": bool((data.get("featureFlags") or {}).get("isMexEditOrder")),
-            }
-
-            rec = Order.search([("grab_order_id", "=", order_id)], limit=1)
-            if rec:
-                # 更新头
-                rec.write(vals)
-                # 清理并重建行（编辑单会替换最新明细）
-                old_lines = rec.line_ids
-                old_lines.unlink()
-            else:
-                rec = Order.create(vals)
-
-            # 明细（不要把 "ITEM-xx" 当 Many2one 的 id）
-            for item in (data.get("items") or []):
-                # Convert modifier prices from minor units
-                modifiers = item.get("modifiers") or []
-                converted_modifiers = []
-                for mod in modifiers:
-                    mod_copy = dict(mod)  # Create a copy
-                    if 'price' in mod_copy and mod_copy['price'] is not None:
-                        mod_copy['price'] = mod_copy['price'] / price_divisor
-                    if 'tax' in mod_copy and mod_copy['tax'] is not None:
-                        mod_copy['tax'] = mod_copy['tax'] / price_divisor
-                    converted_modifiers.append(mod_copy)
-
-                # 统一提取与清洗外部标识
-                grab_item_id = (item.get("grabItemID") or item.get("itemID") or item.get("itemId") or item.get("grabItemId") or "").strip()
-                grab_item_code = (item.get("id") or item.get("itemCode") or item.get("code") or "").strip()
-
-                # 先用 payload 自带的名称（若有）
-                line_name = item.get("name") or item.get("shortName") or item.get("short_name") or ""
-
-                search_code = grab_item_code or grab_item_id
-                menu_item = MenuItem.search([('grab_item_code', '=', search_code)], limit=1) if search_code else MenuItem.browse()
-
-                ProductProduct = request.env['product.product'].sudo()
-
-                # 按 default_code / barcode 尝试匹配变体
-                variant = ProductProduct.browse()
-                if not menu_item and grab_item_code:
-                    variant = ProductProduct.search([('default_code', '=', grab_item_code)], limit=1)
-                if not variant and grab_item_id:
-                    variant = ProductProduct.search([('default_code', '=', grab_item_id)], limit=1)
-                if not variant and not menu_item:
-                    barcode = (item.get('barcode') or "").strip()
-                    if barcode:
-                        variant = ProductProduct.search([('barcode', '=', barcode)], limit=1)
-                if variant and not menu_item:
-                    menu_item = MenuItem.search([('product_id', '=', variant.product_tmpl_id.id)], limit=1)
-
-                # 最后兜底：名称至少填上可识别的ID
-                product_name = (
-                    menu_item.product_id.name
-                    if menu_item and menu_item.product_id
-                    else line_name
-                    or search_code
-                    or "Unknown Item"
-                )
-
-                if not line_name:
-                    line_name = product_name
-
-                _logger.info(
-                    "Webhook item lookup: code=%s id=%s -> menu item=%s",
-                    grab_item_code,
-                    grab_item_id,
-                    menu_item.display_name if menu_item else 'None',
-                )
-
-                Line.create({
-                    "order_id": rec.id,
-                    "grab_item_id": grab_item_id or False,
-                    "grab_item_code": grab_item_code or False,
-                    "name": line_name,
-                    "product_id": menu_item.id if menu_item else False,
-                    "product_name": product_name,
-                    "quantity": item.get("quantity"),
-                    "price": (item.get("price") or 0) / price_divisor,  # Convert from minor units
-                    "tax": (item.get("tax") or 0) / price_divisor,  # Convert from minor units
-                    "specifications": item.get("specifications") or "",
-                    "out_of_stock_instruction": item.get("outOfStockInstruction"),
-                    "modifiers": converted_modifiers,  # Modifiers with converted prices
-                })
-
-            # campaigns / promos 允许为 null
-            Campaign = request.env['grab.order.campaign'].sudo()
-            Promo    = request.env['grab.order.promo'].sudo()
-            rec.campaign_ids.unlink()
-            for c in (data.get("campaigns") or []):
-                Campaign.create({
-                    "order_id": rec.id,
-                    "campaign_id": c.get("id"),
-                    "name": c.get("name"),
-                    "level": c.get("level"),
-                    "type": c.get("type"),
-                    "usage_count": c.get("usageCount"),
-                    "mex_funded_ratio": c.get("mexFundedRatio"),
-                    "deducted_amount": (c.get("deductedAmount") or 0) / price_divisor,  # Convert from minor units
-                    "deducted_part": c.get("deductedPart"),
-                    "campaign_name_for_mex": c.get("campaignNameForMex"),
-                    "applied_item_ids": c.get("appliedItemIDs"),
-                    "free_item": c.get("freeItem"),
-                })
-            rec.promo_ids.unlink()
-            for p in (data.get("promos") or []):
-                Promo.create({
-                    "order_id": rec.id,
-                    "code": p.get("code"),
-                    "description": p.get("description"),
-                    "name": p.get("name"),
-                    "promo_amount": (p.get("promoAmount") or 0) / price_divisor,  # Convert from minor units
-                    "mex_funded_ratio": p.get("mexFundedRatio"),
-                    "mex_funded_amount": (p.get("mexFundedAmount") or 0) / price_divisor,  # Convert from minor units
-                    "targeted_price": (p.get("targetedPrice") or 0) / price_divisor,  # Convert from minor units
-                    "promo_amount_in_min": (p.get("promoAmountInMin") or 0) / price_divisor,  # Convert from minor units
-                })
+            # --- 队列模式：落一条 INSERT 立即应答，由 cron 消费者异步入库 ---
+            if _ingest_mode() == 'queue':
+                Queue = request.env['grab.order.queue'].sudo()
+                queue_id = Queue._enqueue(order_id, json.dumps(data))
+                Queue._trigger_consumers()
+                _logger.info("SubmitOrder queued orderID=%s queue#%s", order_id, queue_id)
+                _journal(data, 'queued', 200)
+                body = {"success": True, "message": "queued", "queue_id": queue_id}
+                grab_idempotency.remember(request.env, key, 'order_submit', data, body)
+                return _json_response(body, status=200)
+
+            # --- 幂等：命中即“更新”（Best Practice #2），与 List Orders 同步共用同一条流水线 ---
+            rec = pipeline.run(data).orders
 
             _logger.info("SubmitOrder OK orderID=%s rec#%s mex_edit=%s", order_id, rec.id, rec.is_mex_edit_order)
-            return _json_response({"success": True, "message": "synced", "order_id": rec.id}, status=200)
+            _journal(data, 'synced', 200)
+            body = {"success": True, "message": "synced", "order_id": rec.id}
+            grab_idempotency.remember(request.env, key, 'order_submit', data, body)
+            return _json_response(body, status=200)
 
         except Exception as e:
             _logger.exception("SubmitOrder crashed: %s", e)
+            _journal(data, 'server_error', 500)
             return _server_error(str(e))
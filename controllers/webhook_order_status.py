@@ -6,6 +6,9 @@ import logging
 from odoo import http
 from odoo.http import request, Response
 
+from ..utils import grab_idempotency
+from ..utils.grab_event_journal import journal_event
+
 _logger = logging.getLogger(__name__)
 
 def _parse_json_from_request():
@@ -36,40 +39,52 @@ def _bad_request(reason, details=None):
     if details: payload["details"] = details
     return _json_response(payload, status=400)
 
+def _journal(data, status, http_status):
+    values = data if isinstance(data, dict) else {}
+    journal_event(request.env, 'order_state', data, grab_order_id=values.get('orderID'),
+                  merchant_id=values.get('merchantID'), partner_merchant_id=values.get('partnerMerchantID'),
+                  status=status, http_status=http_status)
+
 def _server_error(msg):
     return _json_response({"success": False, "reason": "server_error", "message": msg}, status=500)
 
 class GrabOrderStatusWebhookController(http.Controller):
     @http.route('/grab/webhook/order/state', type='http', auth='public', csrf=False, cors='*', methods=['PUT','POST'])
     def push_order_state(self, **kwargs):
+        data = {}
         try:
             data = _parse_json_from_request()
+            if not isinstance(data, dict):
+                _logger.warning("OrderState body is not a JSON object: %s", data)
+                _journal(data, 'invalid_payload', 400)
+                return _bad_request("invalid_payload")
             order_id = data.get("orderID")
             if not order_id:
                 _logger.warning("OrderState missing orderID: %s", data)
+                _journal(data, 'missing_fields', 400)
                 return _bad_request("missing_fields", ["orderID"])
 
-            state = data.get("state")
-            code  = data.get("code")
-            Order = request.env['grab.order'].sudo()
-            rec = Order.search([('grab_order_id', '=', order_id)], limit=1)
-
-            if not rec:
-                # Best Practice: Return 409 to let Grab retry later or use manual sync
-                _logger.warning("OrderState for unknown orderID=%s payload=%s", order_id, data)
-                return _json_response({"success": False, "reason": "order_not_found"}, status=409)
+            # 重投的同一条推送：直接返回当时的应答，不再记录事件
+            key, cached = grab_idempotency.lookup(request.env, 'order_state', data)
+            if cached is not None:
+                _journal(data, 'duplicate', 200)
+                return _json_response(cached, status=200)
 
-            vals = {
-                "order_state": state or rec.order_state,
-                "state_code":  code  or rec.state_code,
-                "state_message": data.get("message") or rec.state_message,
-                "driver_eta":    data.get("driverETA") or rec.driver_eta,
-            }
-            rec.write(vals)
+            # 订单未落地也接收：事件先缓存，SubmitOrder 入库时按 Grab 事件时间顺序应用（不再返回 409 让 Grab 重试）
+            event = request.env['grab.order.state.event'].sudo()._record(data)
+            message = {
+                'pending': 'state_buffered',
+                'stale': 'state_out_of_order',
+            }.get(event.status, 'state_updated')
 
-            _logger.info("OrderState OK orderID=%s state=%s code=%s", order_id, state, code)
-            return _json_response({"success": True, "message": "state_updated"}, status=200)
+            _logger.info("OrderState OK orderID=%s state=%s code=%s -> %s",
+                         order_id, event.state, event.code, event.status)
+            _journal(data, event.state, 200)
+            body = {"success": True, "message": message}
+            grab_idempotency.remember(request.env, key, 'order_state', data, body)
+            return _json_response(body, status=200)
 
         except Exception as e:
             _logger.exception("OrderState crashed: %s", e)
+            _journal(data, 'server_error', 500)
             return _server_error(str(e))
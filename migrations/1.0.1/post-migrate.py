@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""grab_order.raw_json 移到 grab_order_raw 归档表后删除旧列"""
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    cr.execute("""
+        SELECT 1 FROM information_schema.columns
+         WHERE table_name = 'grab_order' AND column_name = 'raw_json'
+    """)
+    if not cr.fetchone():
+        return
+    cr.execute("""
+        INSERT INTO grab_order_raw (order_id, payload, size, create_uid, write_uid, create_date, write_date)
+        SELECT id, raw_json, octet_length(raw_json::text), create_uid, write_uid, create_date, write_date
+          FROM grab_order
+         WHERE raw_json IS NOT NULL
+        ON CONFLICT (order_id) DO NOTHING
+    """)
+    _logger.info("Moved %s grab.order raw payloads to grab_order_raw", cr.rowcount)
+    cr.execute("ALTER TABLE grab_order DROP COLUMN raw_json")
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""Grab 没给事件时间的状态推送：event_time 原来填的是接收时间，清空后只按 STATE_RANK 比较"""
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    cr.execute("""
+        UPDATE grab_order_state_event
+           SET event_time = NULL
+         WHERE event_time IS NOT NULL
+           AND NOT (payload ?| ARRAY['updatedAt', 'timestamp', 'eventTime'])
+    """)
+    _logger.info("Cleared receive-time event_time on %s grab.order.state.event rows", cr.rowcount)
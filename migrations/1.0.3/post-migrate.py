@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+旧的 webhook 日志模型（grab.menu.sync.log / grab.push.menu.log / grab.integration.status.log）已删除：
+保留期内的记录搬进 grab_webhook_event，各商户最近一次的 requestID / jobID 写回菜单；旧表随模型由升级流程删除
+"""
+import logging
+from odoo.addons.odoo_grab_integration.utils.grab_event_journal import ensure_partitions
+
+_logger = logging.getLogger(__name__)
+
+# 旧表的 payload 是 Text 存的 JSON 原文：能解析的转成 jsonb 对象，解析失败的保留为 JSON 字符串，NULL / 空串为 NULL
+TRY_JSONB = """
+    CREATE OR REPLACE FUNCTION pg_temp.grab_try_jsonb(value text) RETURNS jsonb AS $$
+    BEGIN
+        RETURN NULLIF(btrim(value), '')::jsonb;
+    EXCEPTION WHEN invalid_text_representation THEN
+        RETURN to_jsonb(value);
+    END;
+    $$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+# 旧表 -> 搬进日志的 SELECT（列顺序同 INSERT）
+LEGACY_LOGS = {
+    'grab_menu_sync_log': """
+        SELECT create_date, 'menu_sync_state', merchant_id, partner_merchant_id, status, NULL::integer,
+               jsonb_strip_nulls(jsonb_build_object(
+                   'requestID', request_id, 'jobID', job_id, 'merchantID', merchant_id,
+                   'partnerMerchantID', partner_merchant_id, 'status', status,
+                   'updatedAt', updated_at, 'errors', error)),
+               request_id, job_id
+          FROM grab_menu_sync_log
+    """,
+    'grab_push_menu_log': """
+        SELECT create_date, 'push_menu', grab_merchant_id, partner_merchant_id, NULL, NULL::integer,
+               pg_temp.grab_try_jsonb(payload), NULL, NULL
+          FROM grab_push_menu_log
+    """,
+    'grab_integration_status_log': """
+        SELECT create_date, 'integration_status', grab_merchant_id, partner_merchant_id, status, NULL::integer,
+               pg_temp.grab_try_jsonb(payload), NULL, NULL
+          FROM grab_integration_status_log
+    """,
+}
+
+
+def _table_exists(cr, table):
+    cr.execute("SELECT 1 FROM pg_class WHERE relname = %s AND relkind = 'r'", (table,))
+    return bool(cr.fetchone())
+
+
+def migrate(cr, version):
+    cr.execute("SELECT value FROM ir_config_parameter WHERE key = 'grab.webhook_event_retention_days'")
+    row = cr.fetchone()
+    days = int(row[0]) if row and (row[0] or '').isdigit() else 30
+    # 保留期为 0 表示不按时间清理：全部搬过去
+    cr.execute("SELECT (now() at time zone 'UTC')::date - %s", (max(days, 0) or 36500,))
+    cutoff = cr.fetchone()[0]
+    cr.execute(TRY_JSONB)
+
+    for table, select in LEGACY_LOGS.items():
+        if not _table_exists(cr, table):
+            continue
+        cr.execute("SELECT DISTINCT create_date::date FROM %s WHERE create_date >= %%s" % table, (cutoff,))
+        ensure_partitions(cr, [day for (day,) in cr.fetchall()])
+        cr.execute("""
+            INSERT INTO grab_webhook_event
+                (received_at, event_type, merchant_id, partner_merchant_id, status, http_status, payload,
+                 request_id, job_id)
+            %s WHERE create_date >= %%s
+        """ % select.strip(), (cutoff,))
+        _logger.info("Moved %s rows from %s to grab_webhook_event", cr.rowcount, table)
+
+    if _table_exists(cr, 'grab_menu_sync_log'):
+        cr.execute("""
+            UPDATE grab_menu m
+               SET last_menu_request_id = COALESCE(m.last_menu_request_id, l.request_id),
+                   last_menu_job_id = COALESCE(m.last_menu_job_id, l.job_id)
+              FROM (SELECT DISTINCT ON (merchant_id) merchant_id, request_id, job_id
+                      FROM grab_menu_sync_log
+                     WHERE merchant_id IS NOT NULL AND (request_id IS NOT NULL OR job_id IS NOT NULL)
+                  ORDER BY merchant_id, id DESC) l
+             WHERE m.merchant_id = l.merchant_id
+        """)
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""grab.menu.item.photo_url 改为只存 /web/image/... 路径：去掉旧记录里写死的 web.base.url 前缀"""
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    cr.execute("""
+        UPDATE grab_menu_item
+           SET photo_url = substring(photo_url FROM '/web/image/.*$')
+         WHERE photo_url LIKE '%/web/image/%'
+           AND photo_url NOT LIKE '/web/image/%'
+    """)
+    _logger.info("Stripped the base URL from %s grab.menu.item photo_url values", cr.rowcount)
@@ -4,7 +4,12 @@ from . import grab_order
 from . import grab_order_sync
 from . import grab_client
 from . import order_ready_time_wizard
-from . import menu_sync_log
-from . import push_menu_log
-from . import integration_status_log
-from . import product_template_grab
\ No newline at end of file
+from . import product_template_grab
+from . import grab_menu_snapshot
+from . import grab_order_queue
+from . import grab_order_backfill
+from . import grab_outbox
+from . import grab_order_raw
+from . import grab_order_state_event
+from . import grab_webhook_event
+from . import grab_webhook_idempotency
@@ -1,14 +1,54 @@
 # models/grab_menu.py
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, _, SUPERUSER_ID
 from odoo.exceptions import UserError
 import json
-import requests
+from collections import Counter
 
 # 工具：获取 Grab 访问令牌、创建 SSA 激活、通知菜单更新
 from ..utils.grab_oauth import grab_get_access_token
 from ..utils.grab_activation import create_self_serve_activation
-from ..utils.push_menu_notification import push_menu_notification
+from ..utils.grab_http import grab_request
+from ..utils.grab_menu_payload import _build_payload, _payload_hash
+from ..utils.description_sanitizer import DESCRIPTION_FIELDS, pick_description
+
+# 快照重建自己写入的字段：写这些字段不算“菜单变更”，避免重建后又被标记为过期
+SNAPSHOT_FIELDS = {
+    'payload_snapshot', 'payload_version', 'payload_etag', 'payload_dirty', 'payload_built_at',
+    'payload_build_queries', 'payload_hash', 'payload_changed_at', 'last_pushed_payload_hash',
+}
+
+# cr.postcommit.data 键：本事务已排过一次快照重建
+SNAPSHOT_REBUILD_SCHEDULED = 'grab.menu_snapshot_rebuild_scheduled'
+
+# 会改变 GetMenu payload 的系统参数（见 utils.grab_menu_payload）
+SNAPSHOT_PARAMS = {'web.base.url', 'grab.price_tax_included', 'grab.external_image_field'}
+
+# 变体上影响 payload 的字段：首个变体（active / 所属模板）与变体图片
+VARIANT_PAYLOAD_FIELDS = {'active', 'product_tmpl_id', 'image_variant_1920'}
+
+# 会改变 payload 的税字段（含税价计算）
+TAX_PAYLOAD_FIELDS = {
+    'amount', 'amount_type', 'price_include', 'price_include_override', 'include_base_amount',
+    'children_tax_ids', 'company_id', 'active', 'sequence',
+}
+
+# grab.menu.item.photo_url 依次尝试的产品图片尺寸
+PHOTO_IMAGE_FIELDS = ['image_1920', 'image_1024', 'image_512']
+
+# 订单明细匹配索引依赖的字段：写这些字段时让索引失效
+ITEM_INDEX_FIELDS = {'grab_item_code', 'product_id'}
+VARIANT_INDEX_FIELDS = {'default_code', 'barcode', 'active', 'product_tmpl_id'}
+
+# 本进程内订单明细匹配索引的命中统计（builds = 索引重建次数）
+ITEM_INDEX_STATS = Counter()
+
+# 本进程内的匹配索引：{dbname: (版本, 索引)}
+ITEM_INDEX_CACHE = {}
+# precommit.data 的键：本事务读到的索引版本 / 本事务是否改过索引字段 / 本事务内的索引
+ITEM_INDEX_VERSION = 'grab.menu.item.index.version'
+ITEM_INDEX_DIRTY = 'grab.menu.item.index.dirty'
+ITEM_INDEX_LOCAL = 'grab.menu.item.index.local'
 
 
 class GrabMenu(models.Model):
@@ -16,8 +56,8 @@ class GrabMenu(models.Model):
     _description = 'Grab Menu'
 
     name = fields.Char(string="Menu Name", required=True)
-    merchant_id = fields.Char(string="Merchant ID", required=True)
-    partner_merchant_id = fields.Char(string="Partner Merchant ID")
+    merchant_id = fields.Char(string="Merchant ID", required=True, index=True)
+    partner_merchant_id = fields.Char(string="Partner Merchant ID", index=True)
 
     integration_status = fields.Selection([
         ('PENDING', 'Pending'),
@@ -40,6 +80,140 @@ class GrabMenu(models.Model):
     last_menu_request_id = fields.Char()
     last_menu_job_id = fields.Char()
 
+    # GetMenu 预序列化快照：Grab 拉菜单时直接返回已存的 JSON，不再每次遍历整棵菜单树
+    payload_snapshot = fields.Text(string="GetMenu Snapshot", readonly=True, copy=False, prefetch=False)
+    payload_version = fields.Integer(string="Snapshot Version", readonly=True, copy=False, default=0)
+    payload_etag = fields.Char(string="Snapshot ETag", readonly=True, copy=False)
+    payload_dirty = fields.Boolean(string="Snapshot Outdated", readonly=True, copy=False, default=True, index=True)
+    payload_built_at = fields.Datetime(string="Snapshot Built At", readonly=True, copy=False)
+    payload_build_queries = fields.Integer(string="Snapshot Build Queries", readonly=True, copy=False,
+                                           help="SQL queries used by the last snapshot build")
+    # 内容哈希：只随菜单内容变化，用作 ETag，并让 push_menu_to_grab 跳过没有变化的推送
+    payload_hash = fields.Char(string="Snapshot Content Hash", readonly=True, copy=False)
+    payload_changed_at = fields.Datetime(string="Snapshot Content Changed At", readonly=True, copy=False)
+    last_pushed_payload_hash = fields.Char(string="Last Pushed Content Hash", readonly=True, copy=False,
+                                           help="Content hash of the menu at the last successful push to Grab")
+
+    def write(self, vals):
+        res = super().write(vals)
+        if set(vals) - SNAPSHOT_FIELDS:
+            self._mark_payload_dirty()
+        return res
+
+    # -------------------------------
+    # GetMenu 快照
+    # -------------------------------
+    def _mark_payload_dirty(self):
+        """菜单树或关联产品变更后调用：只打标记，真正的重建交给 cron / 推送 / 下一次拉取。"""
+        menus = self.sudo().filtered(lambda m: not m.payload_dirty)
+        if menus:
+            menus.write({'payload_dirty': True})
+
+    @api.model
+    def _mark_payload_dirty_for_templates(self, template_ids):
+        """变体、税、图片附件等不在菜单树里的数据变更后调用：让引用这些 product.template 的菜单过期"""
+        template_ids = list({tid for tid in template_ids if tid})
+        if template_ids:
+            items = self.env['grab.menu.item'].sudo().search([('product_id', 'in', template_ids)])
+            items._get_grab_menus()._mark_payload_dirty()
+
+    @api.model
+    def _mark_all_payload_dirty(self):
+        """影响整份 payload 的系统参数（图片域名、是否含税价）变更后调用"""
+        self.sudo().search([('payload_dirty', '=', False)]).write({'payload_dirty': True})
+
+    def _rebuild_payload_snapshot(self):
+        for menu in self.sudo():
+            stats = {}
+            payload = _build_payload(menu, "", "", stats=stats)
+            now = fields.Datetime.now()
+            vals = {
+                'payload_snapshot': json.dumps(payload, ensure_ascii=False),
+                'payload_dirty': False,
+                'payload_built_at': now,
+                'payload_build_queries': stats.get('queries', 0),
+            }
+            # 内容没变时保留版本号与 ETag，Grab 的条件请求继续命中 304
+            content_hash = _payload_hash(payload)
+            if content_hash != menu.payload_hash:
+                vals.update({
+                    'payload_hash': content_hash,
+                    'payload_version': menu.payload_version + 1,
+                    'payload_etag': f'"{content_hash[:32]}"',
+                    'payload_changed_at': now,
+                })
+            menu.write(vals)
+        return True
+
+    def _get_payload_snapshot(self):
+        """返回 (json bytes, etag)；快照过期或不存在时先重建。ETag 取自内容哈希。"""
+        self.ensure_one()
+        menu = self.sudo()
+        if menu.payload_dirty or not menu.payload_snapshot:
+            menu._rebuild_payload_snapshot()
+        return menu.payload_snapshot.encode('utf-8'), menu.payload_etag
+
+    def _get_payload_body(self):
+        """
+        GetMenu 使用：返回 (json bytes, 内容是否与已存快照一致)。
+        快照过期时现算一份直接返回、不写菜单行，并发的拉取不会争同一行；
+        快照由提交后触发的 _cron_rebuild_payload_snapshots 重建
+        """
+        self.ensure_one()
+        menu = self.sudo()
+        if not menu.payload_dirty and menu.payload_snapshot:
+            return menu.payload_snapshot.encode('utf-8'), True
+        payload = _build_payload(menu, "", "")
+        self._schedule_snapshot_rebuild()
+        return json.dumps(payload, ensure_ascii=False).encode('utf-8'), _payload_hash(payload) == menu.payload_hash
+
+    @api.model
+    def _schedule_snapshot_rebuild(self):
+        cr = self.env.cr
+        if cr.postcommit.data.get(SNAPSHOT_REBUILD_SCHEDULED):
+            return
+        cron = self.env.ref('odoo_grab_integration.ir_cron_grab_menu_payload_snapshot', raise_if_not_found=False)
+        if not cron:
+            return
+        cr.postcommit.data[SNAPSHOT_REBUILD_SCHEDULED] = True
+        registry, cron_id = self.env.registry, cron.id
+
+        @cr.postcommit.add
+        def trigger():
+            with registry.cursor() as trigger_cr:
+                api.Environment(trigger_cr, SUPERUSER_ID, {})['ir.cron'].browse(cron_id)._trigger()
+
+    @api.model
+    def _active_merchant_ids(self):
+        """需要同步订单的商户：状态为 Active 或 Grab 尚未回传集成状态的菜单，按 merchant_id 去重"""
+        menus = self.sudo().search_read(
+            [('merchant_id', '!=', False), ('integration_status', 'in', ('ACTIVE', False))],
+            ['merchant_id'], order='id')
+        return list(dict.fromkeys(m['merchant_id'].strip() for m in menus if m['merchant_id'].strip()))
+
+    @api.model
+    def _cron_rebuild_payload_snapshots(self, limit=50):
+        menus = self.search([('payload_dirty', '=', True)], limit=limit)
+        menus._rebuild_payload_snapshot()
+
+    def action_rebuild_payload_snapshot(self):
+        self._rebuild_payload_snapshot()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('GetMenu Snapshot'),
+                'message': _('Snapshot rebuilt for %s menu(s).') % len(self),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
+
+    def build_export_payload(self):
+        """/grab/menu/export 使用：返回快照内容，快照过期时同 GetMenu 现算、不写菜单行。"""
+        self.ensure_one()
+        return json.loads(self._get_payload_body()[0])
+
     # -------------------------------
     # 按钮：推送菜单（实际=通知 Grab 你更新了菜单；Grab 会来拉 GetMenu）
     # -------------------------------
@@ -48,20 +222,28 @@ class GrabMenu(models.Model):
         if not self.merchant_id:
             raise UserError(_("Please set Grab merchantID on this menu record."))
 
-        try:
-            code, text = push_menu_notification(self.env, self.merchant_id)
-            if code == 204:
-                msg = _("Push OK (204 No Content). Grab will fetch the latest menu from our GetMenu endpoint.")
-                t = 'success'
-            elif code == 409:
-                msg = _("Too frequent (409). Please retry after ~120 seconds.")
-                t = 'warning'
-            else:
-                msg = _("Push failed: %s %s") % (code, text or "")
-                t = 'danger'
-        except Exception as e:
-            msg = _("Push exception: %s") % str(e)
-            t = 'danger'
+        # 先把快照准备好，Grab 收到通知后来拉菜单时直接命中
+        self._get_payload_snapshot()
+
+        # 上次推送成功后内容没变：不必再通知 Grab（context force_push=True 可强制推送）
+        if (self.payload_hash and self.payload_hash == self.last_pushed_payload_hash
+                and not self.env.context.get('force_push')):
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {
+                    'title': 'Push to Grab',
+                    'message': _("Menu unchanged since the last successful push; Grab was not notified."),
+                    'type': 'info',
+                    'sticky': False,
+                }
+            }
+
+        # 入发件箱：同一商户待发的通知合并为一条，409 冷却期由发送 cron 顺延重试；
+        # 发送成功后发件箱回写 last_pushed_payload_hash
+        self.env['grab.outbox'].sudo()._enqueue_menu_notification(self)
+        msg = _("Queued. Grab will be notified shortly and then fetch the latest menu from our GetMenu endpoint.")
+        t = 'success'
 
         return {
             'type': 'ir.actions.client',
@@ -90,6 +272,20 @@ class GrabMenu(models.Model):
 
         return {'type': 'ir.actions.act_url', 'url': activation_url, 'target': 'new'}
 
+    @api.model
+    def _record_menu_sync(self, merchant_id, request_id=None, job_id=None):
+        """menu-sync-state webhook：记下该商户最近一次同步的 requestID / jobID，供查看同步轨迹使用"""
+        if not (merchant_id and (request_id or job_id)):
+            return
+        # 直接 UPDATE：只是追踪字段，不走 write（不标记快照过期、不改 write_date）
+        self.env.cr.execute("""
+            UPDATE grab_menu
+               SET last_menu_request_id = COALESCE(%s, last_menu_request_id),
+                   last_menu_job_id = COALESCE(%s, last_menu_job_id)
+             WHERE merchant_id = %s
+        """, (request_id or None, job_id or None, merchant_id))
+        self.invalidate_model(['last_menu_request_id', 'last_menu_job_id'])
+
     # -------------------------------
     # 按钮：查看菜单同步轨迹（调试用）
     # -------------------------------
@@ -113,7 +309,8 @@ class GrabMenu(models.Model):
 
         last = None
         for key, val in tries:
-            r = requests.get(f"{base}/partner/v1/merchant/menu/trace", headers=headers, params={key: val}, timeout=20)
+            r = grab_request('GET', f"{base}/partner/v1/merchant/menu/trace", 'menu_trace', env=self.env,
+                             headers=headers, params={key: val})
             last = (key, val, r.status_code, r.text)
             if 200 <= r.status_code < 300:
                 data = r.json() if (r.text or "").strip() else {}
@@ -126,9 +323,44 @@ class GrabMenu(models.Model):
 
 # ===================== 子模型：菜单结构 =====================
 
+class GrabMenuSnapshotMixin(models.AbstractModel):
+    """菜单树子模型增删改时，把所属 grab.menu 的 GetMenu 快照标记为过期。"""
+    _name = 'grab.menu.snapshot.mixin'
+    _description = 'Grab Menu Snapshot Invalidation'
+
+    # 从当前记录走到 grab.menu 的路径，由各子模型覆盖
+    _grab_menu_path = None
+
+    def _get_grab_menus(self):
+        if not self._grab_menu_path:
+            return self.env['grab.menu']
+        return self.sudo().mapped(self._grab_menu_path)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        records._get_grab_menus()._mark_payload_dirty()
+        return records
+
+    def write(self, vals):
+        # 记录可能被移动到别的菜单下，新旧两边都要失效
+        menus = self._get_grab_menus()
+        res = super().write(vals)
+        (menus | self._get_grab_menus())._mark_payload_dirty()
+        return res
+
+    def unlink(self):
+        menus = self._get_grab_menus()
+        res = super().unlink()
+        menus._mark_payload_dirty()
+        return res
+
+
 class GrabMenuSection(models.Model):
     _name = 'grab.menu.section'
+    _inherit = ['grab.menu.snapshot.mixin']
     _description = 'Grab Menu Section'
+    _grab_menu_path = 'menu_id'
 
     name = fields.Char(string="Section Name", required=True)
     menu_id = fields.Many2one('grab.menu', string="Menu", required=True, ondelete='cascade')
@@ -148,7 +380,9 @@ class GrabMenuSection(models.Model):
 
 class GrabMenuCategory(models.Model):
     _name = 'grab.menu.category'
+    _inherit = ['grab.menu.snapshot.mixin']
     _description = 'Grab Menu Category'
+    _grab_menu_path = 'section_id.menu_id'
 
     name = fields.Char(string="Category Name", required=True)
     sequence = fields.Integer(string="Sequence", default=1)
@@ -183,7 +417,9 @@ class GrabMenuCategory(models.Model):
 
 class GrabMenuItem(models.Model):
     _name = 'grab.menu.item'
+    _inherit = ['grab.menu.snapshot.mixin']
     _description = 'Grab Menu Item'
+    _grab_menu_path = 'category_id.section_id.menu_id'
 
     product_id = fields.Many2one('product.template', string='Odoo Product', required=True)
 
@@ -194,10 +430,11 @@ class GrabMenuItem(models.Model):
     grab_item_code = fields.Char('Grab Item Code')
     name = fields.Char(string="Product Name", related='product_id.name', store=False, readonly=True)
     price = fields.Float(related='product_id.list_price', store=False, readonly=True)
+    # 存储字段：只在产品描述/图片变化时由 ORM 批量重算，列表、导出和 GetMenu 直接读库
     website_description = fields.Html(string="Website Description",
-                                      compute='_compute_website_description', store=False, readonly=True,
+                                      compute='_compute_website_description', store=True, readonly=True,
                                       help="Auto-populated from product description fields")
-    photo_url = fields.Char(string='Photo URL', compute='_compute_photo_url', store=False, readonly=True)
+    photo_url = fields.Char(string='Photo URL', compute='_compute_photo_url', store=True, readonly=True)
     product_category_id = fields.Many2one(related='product_id.categ_id', store=False, readonly=True,
                                           string="Odoo Category")
     
@@ -221,6 +458,137 @@ class GrabMenuItem(models.Model):
 
     modifier_group_ids = fields.One2many('grab.menu.modifier.group', 'item_id', string='Modifier Groups')
 
+    # -------------------------------
+    # 订单明细 → grab.menu.item 匹配索引
+    # -------------------------------
+    def init(self):
+        # 只追加的变更日志：每个改动了索引字段的事务插一行，(min, max, count) 即索引版本
+        self.env.cr.execute("""
+            CREATE TABLE IF NOT EXISTS grab_menu_item_index_change (
+                id bigserial PRIMARY KEY,
+                changed_at timestamp NOT NULL DEFAULT (now() at time zone 'UTC')
+            )
+        """)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._invalidate_grab_item_index()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ITEM_INDEX_FIELDS.intersection(vals):
+            self._invalidate_grab_item_index()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._invalidate_grab_item_index()
+        return res
+
+    @api.model
+    def _invalidate_grab_item_index(self):
+        """
+        索引字段变更后调用：本事务第一次调用时在变更日志里插一行（其他 worker 看到新版本后重建），
+        本事务之后的匹配改用事务内的索引。不动 ormcache，不影响其他缓存。
+        """
+        data = self.env.cr.precommit.data
+        data.pop(ITEM_INDEX_LOCAL, None)
+        if not data.get(ITEM_INDEX_DIRTY):
+            self.env.cr.execute("INSERT INTO grab_menu_item_index_change DEFAULT VALUES")
+            data[ITEM_INDEX_DIRTY] = True
+
+    @api.model
+    def _grab_item_index_version(self):
+        # 只插入、只由 cron 删除最旧的行：提交顺序与 id 顺序不一致时 count 也会变化，三元组不会重复
+        self.env.cr.execute("SELECT min(id), max(id), count(*) FROM grab_menu_item_index_change")
+        return self.env.cr.fetchone()
+
+    @api.model
+    def _grab_item_index(self):
+        """
+        进程内按数据库缓存的匹配索引，版本与构建在同一个事务快照里读取，结果一定一致。
+        版本每个事务只查一次；本事务自己改过索引字段时用事务内单独构建的索引，不写入进程缓存。
+        """
+        data = self.env.cr.precommit.data
+        if data.get(ITEM_INDEX_DIRTY):
+            if ITEM_INDEX_LOCAL not in data:
+                data[ITEM_INDEX_LOCAL] = self._build_grab_item_index()
+            return data[ITEM_INDEX_LOCAL]
+        if ITEM_INDEX_VERSION not in data:
+            data[ITEM_INDEX_VERSION] = self._grab_item_index_version()
+        version = data[ITEM_INDEX_VERSION]
+        dbname = self.env.cr.dbname
+        cached = ITEM_INDEX_CACHE.get(dbname)
+        if cached and cached[0] == version:
+            return cached[1]
+        index = self._build_grab_item_index()
+        ITEM_INDEX_CACHE[dbname] = (version, index)
+        return index
+
+    @api.model
+    def _build_grab_item_index(self):
+        """
+        一次性读出匹配订单明细所需的全部映射：
+        - codes: grab_item_code → grab.menu.item id
+        - default_codes / barcodes: product.product 的 default_code / barcode → product.template id
+        - templates: product.template id → 第一个 grab.menu.item id
+        读取顺序与各模型的默认排序一致，每个键保留第一条，结果与原来的 search(..., limit=1) 相同。
+        """
+        ITEM_INDEX_STATS['builds'] += 1
+        Item = self.sudo()
+        Variant = self.env['product.product'].sudo()
+        codes, templates = {}, {}
+        for it in Item.search_read([], ['grab_item_code', 'product_id'], load=None):
+            if it['grab_item_code']:
+                codes.setdefault(it['grab_item_code'], it['id'])
+            if it['product_id']:
+                templates.setdefault(it['product_id'], it['id'])
+        default_codes, barcodes = {}, {}
+        variants = Variant.search_read(
+            ['|', ('default_code', '!=', False), ('barcode', '!=', False)],
+            ['default_code', 'barcode', 'product_tmpl_id'], load=None)
+        for v in variants:
+            if v['default_code']:
+                default_codes.setdefault(v['default_code'], v['product_tmpl_id'])
+            if v['barcode']:
+                barcodes.setdefault(v['barcode'], v['product_tmpl_id'])
+        return {'codes': codes, 'default_codes': default_codes, 'barcodes': barcodes, 'templates': templates}
+
+    @api.model
+    def _cron_purge_item_index_changes(self, days=1):
+        """删除一天前的变更日志；最新一行始终保留，版本不会回到空表时的值"""
+        self.env.cr.execute("""
+            DELETE FROM grab_menu_item_index_change
+             WHERE changed_at < (now() at time zone 'UTC') - make_interval(days => %s)
+               AND id < (SELECT max(id) FROM grab_menu_item_index_change)
+        """, (days,))
+        return self.env.cr.rowcount
+
+    @api.model
+    def _resolve_grab_item(self, grab_item_code, grab_item_id, barcode=None):
+        """
+        Grab 订单明细 → grab.menu.item（空记录集表示没匹配上），匹配顺序：
+        grab_item_code → 变体 default_code（code，再 id）→ 变体 barcode → 模板的第一个菜单项。
+        全部走内存索引，不发查询。
+        """
+        index = self._grab_item_index()
+        search_code = grab_item_code or grab_item_id
+        item_id = index['codes'].get(search_code) if search_code else None
+        if not item_id:
+            tmpl_id = (grab_item_code and index['default_codes'].get(grab_item_code)) \
+                or (grab_item_id and index['default_codes'].get(grab_item_id)) \
+                or (barcode and index['barcodes'].get(barcode))
+            item_id = index['templates'].get(tmpl_id) if tmpl_id else None
+        ITEM_INDEX_STATS['hits' if item_id else 'misses'] += 1
+        return self.browse(item_id or [])
+
+    @api.model
+    def _grab_item_index_stats(self):
+        """本进程内的匹配统计：hits / misses / builds"""
+        return {key: ITEM_INDEX_STATS[key] for key in ('hits', 'misses', 'builds')}
+
     @api.depends('grab_price', 'gst_rate', 'use_grab_price', 'product_id.list_price')
     def _compute_grab_price_with_gst(self):
         """Compute the final Grab price including GST"""
@@ -243,79 +611,9 @@ class GrabMenuItem(models.Model):
             desc = ""
             if rec.product_id:
                 # Priority order for description fields (only existing fields)
-                description_fields = [
-                    'website_description',      # Website-specific description (highest priority)
-                    'description_ecommerce',    # Ecommerce description
-                    'public_description',       # Public description
-                    'description_sale',         # Sales description
-                    'description',              # Main description (fallback)
-                ]
-                
-                # Try each field in priority order
-                for field_name in description_fields:
-                    if hasattr(rec.product_id, field_name):
-                        field_value = getattr(rec.product_id, field_name, None)
-                        if field_value and field_value.strip():
-                            candidate_desc = field_value.strip()
-                            
-                            # Clean HTML tags, JavaScript, and other unwanted content
-                            import re
-                            import html
-                            
-                            # Skip if content looks like JavaScript/code (contains common JS patterns)
-                            js_patterns = [
-                                r'document\.',
-                                r'addEventListener',
-                                r'querySelector',
-                                r'function\s*\(',
-                                r'const\s+\w+\s*=',
-                                r'let\s+\w+\s*=',
-                                r'var\s+\w+\s*=',
-                                r'=>',
-                                r'\.forEach\(',
-                                r'\.trim\(\)',
-                                r'innerText',
-                                r'innerHTML'
-                            ]
-                            
-                            # Check if description contains JavaScript code
-                            is_javascript = any(re.search(pattern, candidate_desc, re.IGNORECASE) for pattern in js_patterns)
-                            
-                            if is_javascript:
-                                # Skip this field and continue to next one
-                                continue
-                            
-                            # More comprehensive HTML tag removal
-                            # Remove HTML tags (including malformed ones)
-                            candidate_desc = re.sub(r'<[^<>]*>', '', candidate_desc)  # Standard tags
-                            candidate_desc = re.sub(r'<[^>]*$', '', candidate_desc)   # Unclosed tags at end
-                            candidate_desc = re.sub(r'^[^<]*>', '', candidate_desc)   # Unopened tags at start
-                            candidate_desc = re.sub(r'</?[a-zA-Z][^>]*/?>', '', candidate_desc)  # Any remaining HTML-like tags
-                            
-                            # Remove any remaining angle brackets that might be leftover
-                            candidate_desc = re.sub(r'[<>]', '', candidate_desc)
-                            
-                            # Decode HTML entities (like &amp;, &lt;, etc.)
-                            candidate_desc = html.unescape(candidate_desc)
-                            
-                            # Clean up extra whitespace and newlines
-                            candidate_desc = re.sub(r'\s+', ' ', candidate_desc).strip()
-                            
-                            # Remove common HTML artifacts
-                            candidate_desc = re.sub(r'&nbsp;', ' ', candidate_desc)
-                            candidate_desc = re.sub(r'&[a-zA-Z]+;', '', candidate_desc)  # Remove any remaining entities
-                            
-                            # Final cleanup
-                            candidate_desc = candidate_desc.strip()
-                            
-                            # Final check: if result is too short or looks like code, skip it
-                            if len(candidate_desc) < 10 or any(char in candidate_desc for char in ['{', '}', ';', '()', '=>']):
-                                continue
-                            
-                            # If we get here, we have a valid description
-                            desc = candidate_desc
-                            break
-                    
+                field_names = [f for f in DESCRIPTION_FIELDS if f in rec.product_id._fields]
+                desc = pick_description(rec.product_id, field_names)
+
             # Always assign a value to the field (even if empty string)
             rec.website_description = desc
 
@@ -323,22 +621,35 @@ class GrabMenuItem(models.Model):
 
     @api.depends('product_id', 'product_id.image_1920', 'product_id.image_1024', 'product_id.image_512')
     def _compute_photo_url(self):
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        # 只存站内路径：web.base.url 会变，完整 URL 由 GetMenu 构造 payload 时再拼
+        image_fields = self._product_image_fields(PHOTO_IMAGE_FIELDS)
         for rec in self:
             p = rec.product_id
-            if p:
-                # Try different image sizes in order of preference
-                if p.image_1920:
-                    rec.photo_url = f"{base_url}/web/image/product.template/{p.id}/image_1920"
-                elif p.image_1024:
-                    rec.photo_url = f"{base_url}/web/image/product.template/{p.id}/image_1024"
-                elif p.image_512:
-                    rec.photo_url = f"{base_url}/web/image/product.template/{p.id}/image_512"
-                else:
-                    rec.photo_url = ""
+            # Try different image sizes in order of preference
+            field_name = next((f for f in PHOTO_IMAGE_FIELDS if f in image_fields.get(p._origin.id, ())), None)
+            if p and field_name:
+                rec.photo_url = f"/web/image/product.template/{p._origin.id}/{field_name}"
             else:
                 rec.photo_url = ""
 
+    def _product_image_fields(self, field_names):
+        """
+        {product.template id: 有图片的字段集合}。
+        只查 ir.attachment 的 res_id/res_field 元数据，不读取图片内容。
+        """
+        product_ids = [pid for pid in self.mapped('product_id')._origin.ids if pid]
+        if not product_ids:
+            return {}
+        attachments = self.env['ir.attachment'].sudo().search_read([
+            ('res_model', '=', 'product.template'),
+            ('res_field', 'in', list(field_names)),
+            ('res_id', 'in', product_ids),
+        ], ['res_id', 'res_field'])
+        result = {}
+        for att in attachments:
+            result.setdefault(att['res_id'], set()).add(att['res_field'])
+        return result
+
     @api.onchange('product_id')
     def _onchange_product_id_set_category(self):
         """Auto-set category based on product category when product changes"""
@@ -427,7 +738,9 @@ class GrabMenuItem(models.Model):
 
 class GrabMenuModifierGroup(models.Model):
     _name = 'grab.menu.modifier.group'
+    _inherit = ['grab.menu.snapshot.mixin']
     _description = 'Grab Menu Modifier Group'
+    _grab_menu_path = 'item_id.category_id.section_id.menu_id'
 
     name = fields.Char('Modifier Group Name', required=True)
     item_id = fields.Many2one('grab.menu.item', string='Menu Item', required=True, ondelete='cascade')
@@ -445,7 +758,9 @@ class GrabMenuModifierGroup(models.Model):
 
 class GrabMenuModifier(models.Model):
     _name = 'grab.menu.modifier'
+    _inherit = ['grab.menu.snapshot.mixin']
     _description = 'Grab Menu Modifier'
+    _grab_menu_path = 'group_id.item_id.category_id.section_id.menu_id'
 
     name = fields.Char('Modifier Name', required=True)
     group_id = fields.Many2one('grab.menu.modifier.group', string='Modifier Group', required=True, ondelete='cascade')
@@ -0,0 +1,96 @@
+# models/grab_menu_snapshot.py
+# -*- coding: utf-8 -*-
+from odoo import models, api
+
+from .grab_menu import SNAPSHOT_PARAMS, TAX_PAYLOAD_FIELDS
+
+# 会进入 GetMenu payload 的图片附件（模板 image_XXX / 变体 image_variant_XXX）
+IMAGE_MODELS = ('product.template', 'product.product')
+IMAGE_RES_FIELDS = {
+    'image_1920', 'image_1024', 'image_512', 'image_256',
+    'image_variant_1920', 'image_variant_1024', 'image_variant_512', 'image_variant_256',
+}
+
+
+def _image_template_ids(env, attachments):
+    """图片附件 → 所属 product.template id"""
+    template_ids, variant_ids = set(), set()
+    for att in attachments:
+        if att['res_model'] not in IMAGE_MODELS or att['res_field'] not in IMAGE_RES_FIELDS or not att['res_id']:
+            continue
+        (template_ids if att['res_model'] == 'product.template' else variant_ids).add(att['res_id'])
+    if variant_ids:
+        variants = env['product.product'].sudo().with_context(active_test=False).browse(variant_ids).exists()
+        template_ids.update(variants.product_tmpl_id.ids)
+    return template_ids
+
+
+class IrAttachmentGrabSnapshot(models.Model):
+    """图片附件（unique 戳取自 checksum / write_date）直接变更时让引用它的菜单快照过期"""
+    _inherit = 'ir.attachment'
+
+    def _grab_image_values(self):
+        return [{'res_model': a.res_model, 'res_field': a.res_field, 'res_id': a.res_id} for a in self.sudo()]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(vals.get('res_model') in IMAGE_MODELS and vals.get('res_field') for vals in vals_list):
+            self.env['grab.menu']._mark_payload_dirty_for_templates(
+                _image_template_ids(self.env, records._grab_image_values()))
+        return records
+
+    def write(self, vals):
+        before = self._grab_image_values()
+        res = super().write(vals)
+        template_ids = _image_template_ids(self.env, before + self._grab_image_values())
+        if template_ids:
+            self.env['grab.menu']._mark_payload_dirty_for_templates(template_ids)
+        return res
+
+    def unlink(self):
+        template_ids = _image_template_ids(self.env, self._grab_image_values())
+        res = super().unlink()
+        if template_ids:
+            self.env['grab.menu']._mark_payload_dirty_for_templates(template_ids)
+        return res
+
+
+class AccountTaxGrabSnapshot(models.Model):
+    """销售税变更会改变含税价：让使用这些税的产品所在菜单过期"""
+    _inherit = 'account.tax'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if TAX_PAYLOAD_FIELDS.intersection(vals):
+            taxes = self | self.sudo().search([('children_tax_ids', 'in', self.ids)])
+            templates = self.env['product.template'].sudo().with_context(active_test=False).search(
+                [('taxes_id', 'in', taxes.ids)])
+            self.env['grab.menu']._mark_payload_dirty_for_templates(templates.ids)
+        return res
+
+
+class IrConfigParameterGrabSnapshot(models.Model):
+    """set_param 经由 create / write / unlink；payload 用到的参数变更时让全部菜单过期"""
+    _inherit = 'ir.config_parameter'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if SNAPSHOT_PARAMS.intersection(vals.get('key') for vals in vals_list):
+            self.env['grab.menu']._mark_all_payload_dirty()
+        return records
+
+    def write(self, vals):
+        keys = set(self.mapped('key'))
+        res = super().write(vals)
+        if ({'key', 'value'} & set(vals)) and SNAPSHOT_PARAMS.intersection(keys | set(self.mapped('key'))):
+            self.env['grab.menu']._mark_all_payload_dirty()
+        return res
+
+    def unlink(self):
+        affected = SNAPSHOT_PARAMS.intersection(self.mapped('key'))
+        res = super().unlink()
+        if affected:
+            self.env['grab.menu']._mark_all_payload_dirty()
+        return res
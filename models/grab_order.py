@@ -1,11 +1,39 @@
 import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from odoo import models, fields, api
 from odoo.exceptions import UserError
-from odoo.addons.odoo_grab_integration.push_grab_order_ready import push_grab_order_ready
+
+from odoo.addons.odoo_grab_integration.push_grab_order_ready import post_order_mark
+
+from ..utils.grab_http import _timeout_for
+from ..utils.grab_oauth import grab_get_access_token, grab_invalidate_access_token
+from ..utils.grab_order_pipeline import GrabOrderPipeline
 
 
 _logger = logging.getLogger(__name__)
 
+MARK_MAX_WORKERS = 16  # 批量 mark 时同时在途的 Grab 请求数
+
+# Stable keys used to match incoming children to existing rows on a repeat submit / MEX edit
+CHILD_KEYS = {
+    'line_ids': ('grab_item_code', 'grab_item_id'),
+    'campaign_ids': ('campaign_id',),
+    'promo_ids': ('code',),
+}
+
+
+def _changed_vals(record, vals):
+    """Subset of vals that differs from what record currently holds (compared after field conversion)."""
+    changed = {}
+    for fname, value in vals.items():
+        field = record._fields[fname]
+        if field.convert_to_record(field.convert_to_cache(value, record), record) != record[fname]:
+            changed[fname] = value
+    return changed
+
 class GrabOrder(models.Model):
     _name = 'grab.order'
     _description = 'Grab Order'
@@ -17,7 +45,7 @@ class GrabOrder(models.Model):
     partner_merchant_id = fields.Char('Partner Merchant ID')
     payment_type = fields.Char('Payment Type')
     cutlery = fields.Boolean('Cutlery')
-    order_time = fields.Datetime('Order Time')
+    order_time = fields.Datetime('Order Time', index=True)
     submit_time = fields.Datetime('Submit Time')
     complete_time = fields.Datetime('Complete Time')
     scheduled_time = fields.Datetime('Scheduled Time')
@@ -25,6 +53,9 @@ class GrabOrder(models.Model):
     state_message = fields.Char('Order State Message')
     state_code = fields.Char('Order State Code')
     driver_eta = fields.Integer('Driver ETA (seconds)')
+    state_event_time = fields.Datetime('State Event Time', readonly=True,
+                                       help="Grab timestamp of the state push currently reflected in Order State")
+    state_event_ids = fields.One2many('grab.order.state.event', 'order_id', string='State Events')
 
 
     # Currency fields
@@ -50,8 +81,10 @@ class GrabOrder(models.Model):
     campaign_ids = fields.One2many('grab.order.campaign', 'order_id', string='Campaigns')
     promo_ids = fields.One2many('grab.order.promo', 'order_id', string='Promos')
 
-    # Store original JSON for reference/debug
-    raw_json = fields.Json('Original JSON')
+    # Store original JSON for reference/debug; kept in grab.order.raw so list/dashboard scans skip it
+    raw_json = fields.Json('Original JSON', compute='_compute_raw_json', inverse='_inverse_raw_json')
+    last_sync_diff = fields.Json('Last Edit Diff', readonly=True,
+                                 help='Rows created / updated / deleted per child model by the last repeat submit or MEX edit')
 
     _sql_constraints = [
         ('grab_order_id_unique', 'UNIQUE(grab_order_id)', 'Grab Order ID must be unique!')
@@ -77,27 +110,105 @@ class GrabOrder(models.Model):
         for rec in self:
             rec.receiver_address = (rec.receiver or {}).get('address') if rec.receiver else ''
 
+    def _compute_raw_json(self):
+        payloads = self.env['grab.order.raw'].sudo()._load(self.filtered('id').ids)
+        for rec in self:
+            rec.raw_json = payloads.get(rec.id, False)
+
+    def _inverse_raw_json(self):
+        self.env['grab.order.raw'].sudo()._store({rec.id: rec.raw_json for rec in self if rec.raw_json})
+
+    def init(self):
+        # 看板的热过滤：按商户 / 状态筛选并按下单时间排序（单独的日期区间查询走 order_time 索引）
+        cr = self.env.cr
+        cr.execute("""CREATE INDEX IF NOT EXISTS grab_order_merchant_time_idx
+                      ON grab_order (merchant_id, order_time DESC)""")
+        cr.execute("""CREATE INDEX IF NOT EXISTS grab_order_state_time_idx
+                      ON grab_order (order_state, order_time DESC)""")
+        cr.execute("""CREATE INDEX IF NOT EXISTS grab_order_merchant_state_time_idx
+                      ON grab_order (merchant_id, order_state, order_time DESC)""")
+
     # ========= Buttons to push status to Grab =========
     def action_push_order_ready(self):
         self.ensure_one()
         if not self.grab_order_id:
             raise UserError('Missing Grab Order ID')
-        status_code, resp_text = push_grab_order_ready(self.env, self.grab_order_id)
-        if status_code == 204:
-            msg = "Success: Grab acknowledged order ready."
-        else:
-            msg = f"Failed: {status_code} {resp_text}"
+        # 入发件箱，由 cron 发送（限速 + 重试），按钮不再等待 Grab 应答
+        self.env['grab.outbox'].sudo()._enqueue_order_mark(self)
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': 'Push Order Status to Grab',
-                'message': msg,
-                'type': 'success' if status_code == 204 else 'danger',
+                'message': "Queued: order ready will be sent to Grab shortly.",
+                'type': 'success',
                 'sticky': False,
             }
         }
 
+    def _push_marks(self, mark_status=1, max_workers=MARK_MAX_WORKERS, send=post_order_mark):
+        """
+        并发发送多张订单的 mark 调用，总耗时约等于最慢的单次调用。
+        token 与超时在主线程取好，工作线程只做 HTTP；429 / 5xx / 网络异常转入发件箱稍后重试。
+        返回与 self 同序的结果列表：[{'id', 'grab_order_id', 'ok', 'status', 'message', 'queued'}]
+        """
+        results = {o.id: {'id': o.id, 'grab_order_id': o.grab_order_id, 'ok': False,
+                          'status': None, 'message': 'Missing Grab Order ID', 'queued': False}
+                   for o in self}
+        orders = self.filtered('grab_order_id')
+        if orders:
+            token = grab_get_access_token(self.env)
+            timeout = _timeout_for('order_mark', self.env)
+
+            def _send_all(batch, token):
+                with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batch)))) as pool:
+                    futures = {pool.submit(send, token, o.grab_order_id, mark_status, None, timeout): o for o in batch}
+                    for future in as_completed(futures):
+                        res = results[futures[future].id]
+                        try:
+                            status, text = future.result()
+                        except Exception as e:
+                            res.update(message=str(e))
+                            continue
+                        res.update(ok=200 <= status < 300, status=status, message=text or '')
+
+            _send_all(orders, token)
+            # token 被吊销（401）：作废后换新 token，被拒的订单重发一次
+            rejected = orders.filtered(lambda o: results[o.id]['status'] == 401)
+            if rejected:
+                grab_invalidate_access_token(self.env, token)
+                _send_all(rejected, grab_get_access_token(self.env))
+
+            Outbox = self.env['grab.outbox'].sudo()
+            for order in orders:
+                res = results[order.id]
+                if not res['ok'] and (res['status'] is None or res['status'] == 429 or res['status'] >= 500):
+                    Outbox._enqueue_order_mark(order, mark_status)
+                    res['queued'] = True
+        return [results[o.id] for o in self]
+
+    def action_push_orders_ready(self):
+        """列表多选：并发 mark ready，汇总结果"""
+        start = time.perf_counter()
+        results = self._push_marks()
+        elapsed = time.perf_counter() - start
+        ok = [r for r in results if r['ok']]
+        failed = [r for r in results if not r['ok']]
+        _logger.info("Grab bulk mark ready: %s ok, %s failed in %.2fs", len(ok), len(failed), elapsed)
+        lines = ["%s marked ready in %.1fs." % (len(ok), elapsed)]
+        lines += ["%s: %s %s%s" % (r['grab_order_id'] or r['id'], r['status'] or '', r['message'][:80],
+                                   ' (queued for retry)' if r['queued'] else '') for r in failed]
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Push Order Status to Grab',
+                'message': '\n'.join(lines),
+                'type': 'success' if not failed else 'warning',
+                'sticky': bool(failed),
+            }
+        }
+
     def action_push_order_completed(self):
         self.ensure_one()
         client_id = self.env['ir.config_parameter'].sudo().get_param('grab.client_id')
@@ -107,173 +218,92 @@ class GrabOrder(models.Model):
 
     def _upsert_from_grab_json(self, data):
         """Upsert order from Grab JSON data (used by webhook and sync)"""
+        orders = GrabOrderPipeline(self.env).run(data).orders
+        return orders or None
+
+    def _upsert_many_from_grab_json(self, orders):
+        """Upsert a batch of Grab order JSONs (e.g. one List Orders page) with one INSERT per model"""
+        return GrabOrderPipeline(self.env).run(orders).orders
+
+    def _after_grab_ingest(self):
+        """Post-hook stage of the ingestion pipeline, called on every batch of upserted orders; extend via _inherit"""
+        # 先于 SubmitOrder 到达、缓存着的状态推送
+        self.env['grab.order.state.event'].sudo()._apply_pending(self.mapped('grab_order_id'))
+        return True
+
+    def _upsert_prepared_orders(self, prepared):
+        """
+        Upsert [(header vals, {child field: [child vals]})] in bulk: one search for the existing
+        orders, one create([...]) for the new headers and one create([...]) per child model.
+        Existing orders are diffed by stable keys (see _sync_children). When the same orderID
+        shows up more than once in a batch, the last payload wins.
+        """
         self = self.sudo()
-        order_id = data.get('orderID')
-        if not order_id:
-            return None
-            
-        # Helper function to parse ISO datetime
-        def _dt_iso_to_odoo(s):
-            if not s or not str(s).strip():
-                return False
-            from datetime import datetime
-            v = s[:-1] if isinstance(s, str) and s.endswith('Z') else s
-            for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
-                try:
-                    return datetime.strptime(v, fmt).strftime("%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    pass
-            return False
-        
-        # Get currency info and calculate divisor for price conversion
-        # Grab returns prices in minor units (e.g., cents for SGD)
-        cur = data.get('currency') or {}
-        currency_exponent = cur.get('exponent', 2)  # Default to 2 (cents)
-        price_divisor = 10 ** currency_exponent  # e.g., 100 for SGD (10^2)
-        
-        vals = {
-            'grab_order_id': order_id,
-            'short_order_number': data.get('shortOrderNumber'),
-            'merchant_id': data.get('merchantID'),
-            'partner_merchant_id': data.get('partnerMerchantID'),
-            'payment_type': data.get('paymentType'),
-            'cutlery': bool(data.get('cutlery')),
-            'order_time': _dt_iso_to_odoo(data.get('orderTime')),
-            'submit_time': _dt_iso_to_odoo(data.get('submitTime')),
-            'complete_time': _dt_iso_to_odoo(data.get('completeTime')),
-            'scheduled_time': _dt_iso_to_odoo(data.get('scheduledTime')),
-            'order_state': data.get('orderState') or '',
-            'currency_code': cur.get('code'),
-            'currency_symbol': cur.get('symbol'),
-            'currency_exponent': currency_exponent,
-            'feature_flags': data.get('featureFlags'),
-            'dine_in': data.get('dineIn'),
-            'receiver': data.get('receiver'),
-            'order_ready_estimation': data.get('orderReadyEstimation'),
-            'price_info': data.get('price'),
-            'membership_id': data.get('membershipID') or '',
-            'raw_json': data,
-            'is_mex_edit_order': bool((data.get('featureFlags') or {}).get('isMexEditOrder')),
+        by_id = {vals['grab_order_id']: (vals, children) for vals, children in prepared}
+        if not by_id:
+            return self.browse()
+        existing = {o.grab_order_id: o for o in self.search([('grab_order_id', 'in', list(by_id))])}
+
+        new_ids = [oid for oid in by_id if oid not in existing]
+        created = self.create([by_id[oid][0] for oid in new_ids]) if new_ids else self.browse()
+        records = {**existing, **dict(zip(new_ids, created))}
+
+        to_create = defaultdict(list)
+        for oid, (vals, children) in by_id.items():
+            rec = records[oid]
+            diff = rec._sync_grab_children(children, to_create)
+            if oid in existing:
+                # Repeat submit / MEX edit: only touch the children that changed
+                vals['last_sync_diff'] = diff
+                rec.write(vals)
+        for field_name, vals_list in to_create.items():
+            self.env[self._fields[field_name].comodel_name].sudo().create(vals_list)
+        return self.browse([records[oid].id for oid in by_id])
+
+    def _sync_grab_children(self, children, to_create):
+        """
+        Match lines / campaigns / promos to existing rows by stable keys; rows to insert are
+        queued on to_create so the caller can create them in one batch. Returns the diff per child model.
+        """
+        self.ensure_one()
+        diff = {
+            label: self._sync_children(field_name, children.get(field_name) or [],
+                                       CHILD_KEYS[field_name], to_create[field_name])
+            for label, field_name in (('lines', 'line_ids'), ('campaigns', 'campaign_ids'), ('promos', 'promo_ids'))
         }
-        
-        rec = self.search([('grab_order_id', '=', order_id)], limit=1)
-        if rec:
-            rec.write(vals)
-            # Clear existing lines, campaigns, promos
-            rec.line_ids.unlink()
-            rec.campaign_ids.unlink()
-            rec.promo_ids.unlink()
-        else:
-            rec = self.create(vals)
-        
-        # Create order lines with price conversion
-        Line = self.env['grab.order.line'].sudo()
-        MenuItem = self.env['grab.menu.item'].sudo()  # Reference to grab.menu.item model
-        for item in (data.get('items') or []):
-            # Normalise every identifier we might receive from Grab
-            grab_item_id = (
-                item.get('grabItemID')
-                or item.get('itemID')
-                or item.get('itemId')
-                or item.get('grabItemId')
-                or ''
-            ).strip()
-            grab_item_code = (
-                item.get('id')
-                or item.get('itemCode')
-                or item.get('code')
-                or ''
-            ).strip()
-            search_code = grab_item_code or grab_item_id
-
-            # Try to match the grab.menu.item record that already stores grab_item_code
-            product = MenuItem.search([('grab_item_code', '=', search_code)], limit=1) if search_code else MenuItem.browse()
-
-            # Fallback: Resolve through the corresponding product variant if the direct match fails
-            if not product:
-                ProductVariant = self.env['product.product'].sudo()
-                variant = ProductVariant.search([('default_code', '=', grab_item_code)], limit=1) if grab_item_code else ProductVariant.browse()
-                if not variant and grab_item_id:
-                    variant = ProductVariant.search([('default_code', '=', grab_item_id)], limit=1)
-                if not variant:
-                    barcode = (item.get('barcode') or '').strip()
-                    if barcode:
-                        variant = ProductVariant.search([('barcode', '=', barcode)], limit=1)
-                if variant:
-                    product = MenuItem.search([('product_id', '=', variant.product_tmpl_id.id)], limit=1)
-
-            product_name = product.product_id.name if product else (
-                item.get('name')
-                or item.get('shortName')
-                or search_code
-                or 'Unknown Item'
-            )
-
-            _logger.info(
-                "Processing Grab item: code=%s id=%s -> menu item=%s",
-                grab_item_code,
-                grab_item_id,
-                product.display_name if product else 'None',
-            )
-            
-            modifiers = item.get('modifiers') or []
-            converted_modifiers = []
-            for mod in modifiers:
-                mod_copy = dict(mod)  # Create a copy
-                if 'price' in mod_copy and mod_copy['price'] is not None:
-                    mod_copy['price'] = mod_copy['price'] / price_divisor
-                if 'tax' in mod_copy and mod_copy['tax'] is not None:
-                    mod_copy['tax'] = mod_copy['tax'] / price_divisor
-                converted_modifiers.append(mod_copy)
-                
-            Line.create({
-                'order_id': rec.id,
-                'grab_item_id': grab_item_id or False,
-                'grab_item_code': grab_item_code or False,
-                'quantity': item.get('quantity'),
-                'price': (item.get('price') or 0) / price_divisor,  # Convert from minor units
-                'tax': (item.get('tax') or 0) / price_divisor,  # Convert from minor units
-                'specifications': item.get('specifications') or '',
-                'out_of_stock_instruction': item.get('outOfStockInstruction'),
-                'modifiers': converted_modifiers,  # Modifiers with converted prices
-                'product_id': product.id if product else False,  # Store product ID as Char
-                'product_name': product_name,  # Optionally store product name
-            })
-        
-        # Create campaigns with price conversion
-        Campaign = self.env['grab.order.campaign'].sudo()
-        for c in (data.get('campaigns') or []):
-            Campaign.create({
-                'order_id': rec.id,
-                'campaign_id': c.get('id'),
-                'name': c.get('name'),
-                'level': c.get('level'),
-                'type': c.get('type'),
-                'usage_count': c.get('usageCount'),
-                'mex_funded_ratio': c.get('mexFundedRatio'),
-                'deducted_amount': (c.get('deductedAmount') or 0) / price_divisor,  # Convert from minor units
-                'deducted_part': c.get('deductedPart'),
-                'campaign_name_for_mex': c.get('campaignNameForMex'),
-                'applied_item_ids': c.get('appliedItemIDs'),
-                'free_item': c.get('freeItem'),
-            })
-        
-        # Create promos with price conversion
-        Promo = self.env['grab.order.promo'].sudo()
-        for p in (data.get('promos') or []):
-            Promo.create({
-                'order_id': rec.id,
-                'code': p.get('code'),
-                'description': p.get('description'),
-                'name': p.get('name'),
-                'promo_amount': (p.get('promoAmount') or 0) / price_divisor,  # Convert from minor units
-                'mex_funded_ratio': p.get('mexFundedRatio'),
-                'mex_funded_amount': (p.get('mexFundedAmount') or 0) / price_divisor,  # Convert from minor units
-                'targeted_price': (p.get('targetedPrice') or 0) / price_divisor,  # Convert from minor units
-                'promo_amount_in_min': (p.get('promoAmountInMin') or 0) / price_divisor,  # Convert from minor units
-            })
-        
-        return rec
+        if any(any(d.values()) for d in diff.values()):
+            _logger.info("Grab order %s children diff: %s", self.grab_order_id, diff)
+        return diff
+
+    def _sync_children(self, field_name, vals_list, key_fields, to_create):
+        """
+        Upsert the rows of one One2many: rows with the same key (plus occurrence number, so the
+        same item ordered twice stays two rows) are updated in place with only the changed fields,
+        new keys are appended to to_create and rows no longer present are deleted.
+        """
+        existing = defaultdict(list)
+        if self[field_name]:
+            for child in self[field_name].sorted('id'):
+                existing[tuple(child[f] or False for f in key_fields)].append(child)
+
+        diff = {'created': 0, 'updated': 0, 'deleted': 0}
+        for vals in vals_list:
+            matches = existing.get(tuple(vals.get(f) or False for f in key_fields))
+            if matches:
+                child = matches.pop(0)
+                changed = _changed_vals(child, vals)
+                if changed:
+                    child.write(changed)
+                    diff['updated'] += 1
+            else:
+                to_create.append(dict(vals, order_id=self.id))
+                diff['created'] += 1
+
+        removed = self[field_name].browse([c.id for rows in existing.values() for c in rows])
+        if removed:
+            removed.sudo().unlink()
+            diff['deleted'] = len(removed)
+        return diff
 
 class GrabOrderLine(models.Model):
     _name = 'grab.order.line'
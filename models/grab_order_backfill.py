@@ -0,0 +1,322 @@
+# models/grab_order_backfill.py
+# -*- coding: utf-8 -*-
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from ..utils.grab_http import grab_request
+from ..utils.grab_rate_limit import RateLimiter
+
+_logger = logging.getLogger(__name__)
+
+LIST_ORDERS_URL = 'https://partner-api.grab.com/grabfood/partner/v1/orders'
+DEFAULT_MAX_PAGE_FAILURES = 5
+
+
+def _fetch_orders_page(token, merchant_id, day, page):
+    """在线程里跑，只做 HTTP，不碰 env / cursor。返回 (orders, more)，失败抛异常。"""
+    resp = grab_request(
+        'GET', LIST_ORDERS_URL, 'list_orders',
+        headers={'Authorization': f'Bearer {token}'},
+        params={'merchantID': merchant_id, 'date': day.strftime('%Y-%m-%d'), 'page': page},
+    )
+    if resp.status_code == 401:
+        from ..utils.grab_oauth import TokenRejected
+        raise TokenRejected(token, _("Grab list orders failed: %s %s") % (resp.status_code, resp.text))
+    if resp.status_code != 200:
+        raise UserError(_("Grab list orders failed: %s %s") % (resp.status_code, resp.text))
+    payload = resp.json() or {}
+    return payload.get('orders') or [], bool(payload.get('more'))
+
+
+def _rate_limited(fetch, limiter):
+    """所有线程共享同一个 limiter；返回 (orders, more, 拉取耗时秒数)"""
+    def _fetch(token, merchant_id, day, page):
+        limiter.acquire()
+        start = time.perf_counter()
+        orders, more = fetch(token, merchant_id, day, page)
+        return orders, more, time.perf_counter() - start
+    return _fetch
+
+
+class GrabOrderBackfill(models.Model):
+    """
+    List Orders 回填任务：日期区间 × 商户，按页拉单入库。
+
+    - 不同（商户, 日期）之间并发拉取，最多 max_workers 个请求同时在途；同一（商户, 日期）
+      的页必须顺序拉，因为只有上一页的 more 才知道有没有下一页
+    - 每拉完一页写一条 grab.order.backfill.page 检查点；入库在主线程按批提交，
+      中断后再次运行从检查点继续，已完成的页不会重拉
+    - 同一页失败 grab.backfill_max_page_failures 次后不再重试，任务置为 failed，错误里列出这些页
+    - 由 cron 在后台执行，向导只负责建任务
+    """
+    _name = 'grab.order.backfill'
+    _description = 'Grab Order Backfill (List Orders)'
+    _order = 'id desc'
+
+    name = fields.Char('Name', compute='_compute_name', store=True)
+    date_from = fields.Date('From', required=True)
+    date_to = fields.Date('To', required=True)
+    merchant_ids = fields.Char('Merchant IDs', required=True, default=lambda self: self._default_merchant_ids(),
+                               help='Comma separated Grab merchant IDs; defaults to every active outlet in Grab Menus')
+    max_workers = fields.Integer('Parallel Requests', default=4)
+    commit_every = fields.Integer('Commit Every (pages)', default=10)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='pending', required=True, index=True, readonly=True)
+    page_ids = fields.One2many('grab.order.backfill.page', 'backfill_id', string='Checkpoints', readonly=True)
+    page_count = fields.Integer('Pages Fetched', readonly=True)
+    order_count = fields.Integer('Orders Synced', readonly=True)
+    error = fields.Text('Last Error', readonly=True)
+    throughput_summary = fields.Text('Throughput per Merchant', compute='_compute_throughput_summary')
+
+    @api.model
+    def _default_merchant_ids(self):
+        merchants = self.env['grab.menu']._active_merchant_ids()
+        if not merchants:
+            # 还没有配置 grab.menu 的老库，沿用单商户参数
+            merchant = self.env['ir.config_parameter'].sudo().get_param('grab.merchant_id')
+            merchants = [merchant] if merchant else []
+        return ','.join(merchants)
+
+    def _merchant_stats(self):
+        """{merchant_id: {'pages', 'orders', 'seconds', 'orders_per_sec'}}，seconds 为拉取 + 入库耗时"""
+        stats = {}
+        for cp in self.page_ids.filtered(lambda p: p.state == 'done'):
+            st = stats.setdefault(cp.merchant_id, {'pages': 0, 'orders': 0, 'seconds': 0.0})
+            st['pages'] += 1
+            st['orders'] += cp.order_count
+            st['seconds'] += cp.duration
+        for st in stats.values():
+            st['orders_per_sec'] = st['orders'] / st['seconds'] if st['seconds'] else 0.0
+        return stats
+
+    @api.depends('page_ids.order_count', 'page_ids.duration')
+    def _compute_throughput_summary(self):
+        for job in self:
+            job.throughput_summary = '\n'.join(
+                '%s: %s pages, %s orders in %.1fs (%.1f orders/s)' % (
+                    merchant, st['pages'], st['orders'], st['seconds'], st['orders_per_sec'])
+                for merchant, st in sorted(job._merchant_stats().items())
+            )
+
+    @api.depends('date_from', 'date_to')
+    def _compute_name(self):
+        for job in self:
+            job.name = '%s → %s' % (job.date_from or '', job.date_to or '')
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        for job in self:
+            if job.date_from and job.date_to and job.date_from > job.date_to:
+                raise UserError(_("Backfill start date must be before the end date."))
+
+    def _merchant_list(self):
+        return [m.strip() for m in (self.merchant_ids or '').split(',') if m.strip()]
+
+    def _days(self):
+        day = self.date_from
+        while day <= self.date_to:
+            yield day
+            day += timedelta(days=1)
+
+    def _max_page_failures(self):
+        value = self.env['ir.config_parameter'].sudo().get_param(
+            'grab.backfill_max_page_failures', DEFAULT_MAX_PAGE_FAILURES)
+        try:
+            return max(int(value or 0), 1)
+        except (TypeError, ValueError):
+            return DEFAULT_MAX_PAGE_FAILURES
+
+    def _exhausted_pages(self):
+        """失败次数已达上限的 (商户, 日期, 页)，按顺序返回"""
+        failures = {}
+        for cp in self.page_ids.filtered(lambda p: p.state == 'failed'):
+            key = (cp.merchant_id, cp.date, cp.page)
+            failures[key] = failures.get(key, 0) + 1
+        cap = self._max_page_failures()
+        return sorted(key for key, count in failures.items() if count >= cap)
+
+    def _next_pages(self):
+        """
+        从检查点算出每个（商户, 日期）下一页要拉的页号；已拉完（最后一页 more=False）的、
+        以及失败次数已达上限的页不再返回。
+        """
+        exhausted = set(self._exhausted_pages())
+        last = {}
+        for cp in self.page_ids.filtered(lambda p: p.state == 'done'):
+            key = (cp.merchant_id, cp.date)
+            if key not in last or cp.page > last[key].page:
+                last[key] = cp
+        todo = []
+        for merchant_id in self._merchant_list():
+            for day in self._days():
+                cp = last.get((merchant_id, day))
+                if cp is None:
+                    page = 0
+                elif cp.more:
+                    page = cp.page + 1
+                else:
+                    continue
+                if (merchant_id, day, page) not in exhausted:
+                    todo.append((merchant_id, day, page))
+        return todo
+
+    def action_start(self):
+        # 手动重新开始：之前失败的页重新计数
+        self.page_ids.filtered(lambda p: p.state == 'failed').unlink()
+        self.write({'state': 'running', 'error': False})
+        cron = self.env.ref('odoo_grab_integration.ir_cron_grab_order_backfill', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+        return True
+
+    @api.model
+    def _cron_run_backfills(self, auto_commit=True):
+        cr = self.env.cr
+        for job in self.search([('state', '=', 'running')], order='id'):
+            # 同一任务同一时间只让一个 worker 跑。_run 每 commit_every 页提交一次，事务级锁会随之释放，
+            # 所以用会话级 advisory lock，跑完（或出错）后在 finally 里显式释放
+            cr.execute("SELECT pg_try_advisory_lock(hashtext('grab.order.backfill'), %s)", (job.id,))
+            if not cr.fetchone()[0]:
+                continue
+            try:
+                # 拿到锁之前另一个 worker 可能刚跑完：换一个新快照重新读取任务状态和检查点
+                if auto_commit:
+                    cr.commit()
+                self.env.invalidate_all()
+                if job.state == 'running':
+                    job._run(auto_commit=auto_commit)
+            except Exception:
+                # 失败的事务里无法再执行 unlock，先回滚
+                cr.rollback()
+                raise
+            finally:
+                cr.execute("SELECT pg_advisory_unlock(hashtext('grab.order.backfill'), %s)", (job.id,))
+
+    def _run(self, auto_commit=True, fetch=_fetch_orders_page):
+        self.ensure_one()
+        from ..utils.grab_oauth import TokenRejected, grab_get_access_token, grab_invalidate_access_token
+        try:
+            token = grab_get_access_token(self.env)
+        except Exception as e:
+            self.write({'state': 'failed', 'error': str(e)})
+            return
+
+        Page = self.env['grab.order.backfill.page'].sudo()
+        todo = self._next_pages()
+        # 所有商户共享一个限流器：并发只决定同时在途的请求数，总速率受 grab.list_orders_rate 约束
+        rate = float(self.env['ir.config_parameter'].sudo().get_param('grab.list_orders_rate', 5) or 0)
+        fetch = _rate_limited(fetch, RateLimiter(rate))
+        uncommitted = 0
+        failed = False
+        token_refreshed = False
+        with ThreadPoolExecutor(max_workers=max(1, self.max_workers)) as pool:
+            inflight = {}
+
+            def _submit():
+                while todo and len(inflight) < max(1, self.max_workers):
+                    merchant_id, day, page = todo.pop(0)
+                    inflight[pool.submit(fetch, token, merchant_id, day, page)] = (merchant_id, day, page)
+
+            _submit()
+            while inflight:
+                finished, _pending = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    merchant_id, day, page = inflight.pop(future)
+                    cp_vals = {'backfill_id': self.id, 'merchant_id': merchant_id, 'date': day, 'page': page}
+                    try:
+                        orders, more, fetch_seconds = future.result()
+                        start = time.perf_counter()
+                        self._upsert_page(orders)
+                        duration = fetch_seconds + time.perf_counter() - start
+                    except Exception as e:
+                        if isinstance(e, TokenRejected):
+                            if e.token == token and not token_refreshed:
+                                # token 被吊销：作废后换新 token，本轮只刷新一次
+                                token_refreshed = True
+                                grab_invalidate_access_token(self.env, token)
+                                token = grab_get_access_token(self.env)
+                            if e.token != token:
+                                # 用旧 token 发出的页换新 token 重拉，不计失败
+                                todo.append((merchant_id, day, page))
+                                continue
+                        _logger.warning("Grab backfill #%s %s %s page %s failed: %s", self.id, merchant_id, day, page, e)
+                        Page.create(dict(cp_vals, state='failed', error=str(e)))
+                        failed = True
+                        continue
+                    Page.create(dict(cp_vals, state='done', more=more, order_count=len(orders), duration=duration))
+                    self.write({'page_count': self.page_count + 1, 'order_count': self.order_count + len(orders)})
+                    if more:
+                        todo.append((merchant_id, day, page + 1))
+                    uncommitted += 1
+                    if auto_commit and uncommitted >= max(1, self.commit_every):
+                        self.env.cr.commit()
+                        uncommitted = 0
+                _submit()
+
+        # 失败的页留在 running 状态，下一次 cron 从检查点重试；同一页失败次数到上限则整个任务失败
+        exhausted = self._exhausted_pages()
+        if exhausted:
+            self.write({'state': 'failed', 'error': _("Gave up after %(count)s failed attempts on: %(pages)s") % {
+                'count': self._max_page_failures(),
+                'pages': ', '.join('%s %s page %s' % page for page in exhausted),
+            }})
+        else:
+            self.write({'state': 'running' if failed else 'done'})
+        if auto_commit:
+            self.env.cr.commit()
+        _logger.info("Grab backfill #%s: %s pages, %s orders, state=%s\n%s",
+                     self.id, self.page_count, self.order_count, self.state, self.throughput_summary)
+
+    def _upsert_page(self, orders):
+        """整页一次批量落地；失败时退回逐单处理，坏单只记日志，不拖累整页"""
+        Order = self.env['grab.order'].sudo()
+        try:
+            with self.env.cr.savepoint():
+                Order._upsert_many_from_grab_json(orders)
+            return
+        except Exception as e:
+            _logger.warning("Batch upsert of %s orders failed (%s), retrying one by one", len(orders), e)
+        for order_json in orders:
+            try:
+                with self.env.cr.savepoint():
+                    Order._upsert_from_grab_json(order_json)
+            except Exception as e:
+                _logger.error("Failed to process order %s: %s", order_json.get('orderID', 'UNKNOWN'), e)
+
+    def action_view_orders(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Orders'),
+            'res_model': 'grab.order',
+            'view_mode': 'list,form',
+            'domain': [('merchant_id', 'in', self._merchant_list()),
+                       ('order_time', '>=', self.date_from),
+                       ('order_time', '<', self.date_to + timedelta(days=1))],
+        }
+
+
+class GrabOrderBackfillPage(models.Model):
+    """回填检查点：每个（任务, 商户, 日期, 页）一行；done 的页不会重拉"""
+    _name = 'grab.order.backfill.page'
+    _description = 'Grab Order Backfill Checkpoint'
+    _order = 'merchant_id, date, page'
+
+    backfill_id = fields.Many2one('grab.order.backfill', required=True, ondelete='cascade', index=True)
+    merchant_id = fields.Char('Merchant ID', required=True)
+    date = fields.Date('Date', required=True)
+    page = fields.Integer('Page', required=True)
+    state = fields.Selection([('done', 'Done'), ('failed', 'Failed')], required=True)
+    more = fields.Boolean('More Pages')
+    order_count = fields.Integer('Orders')
+    duration = fields.Float('Seconds', digits=(16, 3), help='Fetch + upsert time of this page')
+    error = fields.Text('Error')
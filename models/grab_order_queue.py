@@ -0,0 +1,165 @@
+# models/grab_order_queue.py
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+from psycopg2 import errors
+
+from odoo import models, fields, api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# 消费者 cron（data/ir_cron.xml），新增 worker 时同步加在这里
+CONSUMER_CRONS = (
+    'odoo_grab_integration.ir_cron_grab_order_queue',
+    'odoo_grab_integration.ir_cron_grab_order_queue_2',
+)
+CONSUMERS_TRIGGERED = 'grab.order_queue_triggered'  # cr.postcommit.data 键：本事务已排过唤醒
+
+
+class GrabOrderQueue(models.Model):
+    """
+    /grab/webhook/order 的入库队列（grab.order_ingest_mode = queue 时使用）。
+    webhook 只做字段校验 + 一条 INSERT 就应答 Grab；cron 消费者按批次把 payload 交给
+    grab.order._upsert_from_grab_json。同一订单同一时间只有一个消费者处理（advisory lock + 行锁），
+    且按到达顺序处理：SubmitOrder 每次都是整单快照，所以只需落地最新一份，较早的直接标记完成。
+    """
+    _name = 'grab.order.queue'
+    _description = 'Grab Order Ingestion Queue'
+    _order = 'id'
+
+    grab_order_id = fields.Char('Order ID', required=True, index=True, readonly=True)
+    payload = fields.Text('Raw Payload', required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='pending', required=True, index=True, readonly=True)
+    attempts = fields.Integer('Attempts', default=0, readonly=True)
+    error = fields.Text('Last Error', readonly=True)
+    processed_at = fields.Datetime('Processed At', readonly=True)
+    order_id = fields.Many2one('grab.order', string='Order', readonly=True, ondelete='set null')
+
+    @api.model
+    def _enqueue(self, grab_order_id, payload):
+        """一条 INSERT 把原始 payload 持久化，返回队列行 id。不经过 ORM create，webhook 可以立即应答。"""
+        self.env.cr.execute("""
+            INSERT INTO grab_order_queue
+                (grab_order_id, payload, state, attempts, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, 'pending', 0, %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            RETURNING id
+        """, (grab_order_id, payload, self.env.uid, self.env.uid))
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _backlog_depth(self):
+        self.env.cr.execute("SELECT count(*) FROM grab_order_queue WHERE state = 'pending'")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _trigger_consumers(self):
+        """
+        入队后唤醒所有消费者 cron（不只第一个），任何一个空闲的都能立即开始处理。
+        提交后用独立游标写 trigger，每个事务只排一次，不占 Grab 请求的事务；事务回滚则不排，
+        漏掉的由 cron 的 1 分钟间隔兜底
+        """
+        cr = self.env.cr
+        if cr.postcommit.data.get(CONSUMERS_TRIGGERED):
+            return
+        cron_ids = [cron.id for cron in (self.env.ref(xmlid, raise_if_not_found=False) for xmlid in CONSUMER_CRONS)
+                    if cron]
+        if not cron_ids:
+            return
+        cr.postcommit.data[CONSUMERS_TRIGGERED] = True
+        registry = self.env.registry
+
+        @cr.postcommit.add
+        def trigger():
+            with registry.cursor() as trigger_cr:
+                api.Environment(trigger_cr, SUPERUSER_ID, {})['ir.cron'].browse(cron_ids)._trigger()
+
+    def _claim_orders(self, limit, exclude=()):
+        """
+        按最早到达顺序认领一批订单，返回 [(订单号, 该订单全部 pending 行的 id)]。
+
+        - advisory lock（事务级）保证同一订单同一时间只有一个消费者
+        - 拿到 advisory lock 后再对该订单的 pending 行加 FOR UPDATE：REPEATABLE READ 下快照可能早于
+          上一个消费者的提交，快照里还是 pending 的行实际已被处理，加锁时 PostgreSQL 会报序列化冲突，
+          这时跳过该订单，不会把已完成的订单再处理一遍
+        """
+        cr = self.env.cr
+        cr.execute("""
+            SELECT grab_order_id
+              FROM grab_order_queue
+             WHERE state = 'pending'
+               AND NOT (grab_order_id = ANY(%s))
+          GROUP BY grab_order_id
+          ORDER BY min(id)
+             LIMIT %s
+        """, (list(exclude), limit))
+        claimed = []
+        for (grab_order_id,) in cr.fetchall():
+            cr.execute("SELECT pg_try_advisory_xact_lock(hashtext('grab.order.queue'), hashtext(%s))",
+                       (grab_order_id,))
+            if not cr.fetchone()[0]:
+                continue
+            try:
+                with cr.savepoint(flush=False):
+                    cr.execute("""
+                        SELECT id FROM grab_order_queue
+                         WHERE grab_order_id = %s AND state = 'pending'
+                      ORDER BY id
+                           FOR UPDATE
+                    """, (grab_order_id,))
+                    ids = [row[0] for row in cr.fetchall()]
+            except errors.SerializationFailure:
+                _logger.debug("Grab order queue: orderID=%s already processed by another consumer", grab_order_id)
+                continue
+            if ids:
+                claimed.append((grab_order_id, ids))
+        return claimed
+
+    def _process_order(self, grab_order_id, queue_ids):
+        rows = self.browse(queue_ids)
+        if not rows:
+            return
+        latest = rows[-1]
+        try:
+            with self.env.cr.savepoint():
+                order = self.env['grab.order']._upsert_from_grab_json(json.loads(latest.payload))
+        except Exception as e:
+            _logger.exception("Grab order queue: orderID=%s failed", grab_order_id)
+            for row in rows:
+                attempts = row.attempts + 1
+                row.write({
+                    'attempts': attempts,
+                    'error': str(e),
+                    'state': 'failed' if attempts >= MAX_ATTEMPTS else 'pending',
+                })
+            return
+        rows.write({
+            'state': 'done',
+            'error': False,
+            'processed_at': fields.Datetime.now(),
+            'order_id': order.id if order else False,
+        })
+
+    @api.model
+    def _cron_process_queue(self, batch_size=50, max_batches=20, auto_commit=True):
+        """消费者：每批处理 batch_size 张订单，每批提交一次；可以配置多个 cron 并行消费。"""
+        seen = set()
+        for _i in range(max_batches):
+            # 本轮失败的订单留到下一次 cron 再重试
+            orders = self._claim_orders(batch_size, exclude=seen)
+            if not orders:
+                break
+            for grab_order_id, queue_ids in orders:
+                seen.add(grab_order_id)
+                self._process_order(grab_order_id, queue_ids)
+            if auto_commit:
+                self.env.cr.commit()
+        _logger.info("Grab order queue: backlog=%s", self._backlog_depth())
+
+    def action_retry(self):
+        self.filtered(lambda r: r.state == 'failed').write({'state': 'pending', 'attempts': 0})
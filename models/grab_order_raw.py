@@ -0,0 +1,97 @@
+# models/grab_order_raw.py
+# -*- coding: utf-8 -*-
+import base64
+import json
+import logging
+import zlib
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+PURGE_BATCH = 5000
+
+
+class GrabOrderRaw(models.Model):
+    """
+    grab.order 原始 JSON 的归档表：每张订单一行，只保留最新一份 payload。
+
+    大 JSON 不再和看板常用的热字段放在同一行，列表 / 分组查询扫表时不用读它们。
+    grab.order_raw_compress = 1 时以 zlib 压缩存入 payload_z（bytea），否则存 payload（jsonb）。
+    grab.order_raw_retention_days 天前的归档由 cron 分批删除（0 = 永久保留）。
+    """
+    _name = 'grab.order.raw'
+    _description = 'Grab Order Raw Payload Archive'
+    _order = 'id'
+
+    order_id = fields.Many2one('grab.order', required=True, ondelete='cascade', index=True)
+    payload = fields.Json('Payload')
+    payload_z = fields.Binary('Compressed Payload', attachment=False)
+    size = fields.Integer('Size (bytes)', help='Uncompressed JSON size')
+
+    _sql_constraints = [
+        ('order_uniq', 'unique(order_id)', 'Only one raw payload per Grab order.'),
+    ]
+
+    @api.model
+    def _compress_enabled(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('grab.order_raw_compress', '0')
+        return str(value or '0').strip().lower() in ('1', 'true', 'yes')
+
+    @api.model
+    def _prepare_vals(self, data, compress):
+        raw = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        if compress:
+            return {'payload': False, 'payload_z': base64.b64encode(zlib.compress(raw, 6)), 'size': len(raw)}
+        return {'payload': data, 'payload_z': False, 'size': len(raw)}
+
+    @api.model
+    def _store(self, payloads):
+        """{grab.order id: JSON}：已有归档的改写，没有的一次 create([...])"""
+        if not payloads:
+            return
+        compress = self._compress_enabled()
+        existing = self.search([('order_id', 'in', list(payloads))])
+        for row in existing:
+            row.write(self._prepare_vals(payloads[row.order_id.id], compress))
+        done = set(existing.order_id.ids)
+        self.create([dict(self._prepare_vals(data, compress), order_id=order_id)
+                     for order_id, data in payloads.items() if order_id not in done])
+
+    @api.model
+    def _load(self, order_ids):
+        """{grab.order id: JSON}，未归档或已过保留期的订单不在结果里"""
+        result = {}
+        for row in self.search_read([('order_id', 'in', list(order_ids))], ['order_id', 'payload', 'payload_z']):
+            if row['payload_z']:
+                result[row['order_id'][0]] = json.loads(zlib.decompress(base64.b64decode(row['payload_z'])))
+            else:
+                result[row['order_id'][0]] = row['payload']
+        return result
+
+    @api.model
+    def _cron_purge(self, batch_size=PURGE_BATCH):
+        days = int(self.env['ir.config_parameter'].sudo().get_param('grab.order_raw_retention_days', 90) or 0)
+        if days <= 0:
+            return 0
+        cr = self.env.cr
+        total = 0
+        while True:
+            # 按 write_date 走索引分批删，避免一次长事务锁住大量行
+            cr.execute("""
+                DELETE FROM grab_order_raw
+                 WHERE id IN (SELECT id FROM grab_order_raw
+                               WHERE write_date < (now() at time zone 'UTC') - make_interval(days => %s)
+                               LIMIT %s)
+            """, (days, batch_size))
+            total += cr.rowcount
+            if cr.rowcount < batch_size:
+                break
+        if total:
+            self.invalidate_model()
+            _logger.info("Grab raw payload retention: purged %s payloads older than %s days", total, days)
+        return total
+
+    def init(self):
+        self.env.cr.execute(
+            "CREATE INDEX IF NOT EXISTS grab_order_raw_write_date_idx ON grab_order_raw (write_date)")
@@ -0,0 +1,317 @@
+# models/grab_order_state_event.py
+# -*- coding: utf-8 -*-
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from odoo import models, fields, api, SUPERUSER_ID
+
+from ..utils.grab_order_pipeline import dt_iso_to_odoo
+
+_logger = logging.getLogger(__name__)
+
+# Grab 推送里可能携带的事件时间字段，按顺序取第一个能解析的；都没有时 event_time 留空，只按 STATE_RANK 比较
+EVENT_TIME_KEYS = ('updatedAt', 'timestamp', 'eventTime')
+
+# 同一时间戳的两个事件按流程先后排序（例如秒级时间戳相同的 DRIVER_ARRIVED 与 COLLECTED）
+STATE_RANK = {
+    'DRIVER_ALLOCATED': 10,
+    'DRIVER_ARRIVED': 20,
+    'COLLECTED': 30,
+    'DELIVERED': 40,
+    'FAILED': 40,
+    'CANCELLED': 40,
+}
+TERMINAL_STATES = frozenset(['DELIVERED', 'FAILED', 'CANCELLED'])
+
+ORDER_STATE_FIELDS = ('order_state', 'state_code', 'state_message', 'driver_eta', 'state_event_time')
+
+FLUSH_BATCH = 5000       # 每次合并应用的最多事件数
+ORPHAN_AFTER_HOURS = 48  # 超过这个时间订单仍未落地的事件不再等待
+RETENTION_DAYS = 30      # 已处理事件的保留天数
+FLUSH_SCHEDULED = 'grab.order_state_flush_scheduled'  # cr.postcommit.data 键：本事务已排过 flush
+
+
+def fold_state_events(last_state, last_time, events):
+    """
+    把一张订单的若干状态推送合并。events 为 [(id, state, code, message, driver_eta, event_time)]，
+    event_time 为空表示 Grab 没给事件时间。
+    - 带 Grab 时间的事件按 (事件时间, STATE_RANK, id) 排序；事件或订单当前状态任一方没有 Grab 时间时只比较 STATE_RANK，
+      这类事件排在带时间的事件之后，同一 rank 按到达顺序（id）
+    - 只带 ETA 的推送沿用它到达之前最近一个状态的 rank
+    - 订单已是终态（DELIVERED / FAILED / CANCELLED）时，除了同一终态的重复推送，其余事件（更低的状态、
+      另一个终态、只带 ETA 的推送）不论时间一律 stale
+    比订单当前状态旧的事件记为 stale；返回 (vals, applied_ids, stale_ids)，vals 只包含最终要写入订单的值，
+    没有可应用的事件时为空。
+    """
+    last_rank = STATE_RANK.get(last_state or '', 0)
+    ranked, rank = [], last_rank
+    for event in sorted(events, key=lambda e: e[0]):
+        rank = STATE_RANK.get(event[1], 0) if event[1] else rank
+        ranked.append((event, rank))
+
+    vals, applied, stale = {}, [], []
+    for (event_id, state, code, message, eta, event_time), rank in sorted(
+            ranked, key=lambda r: (not r[0][5], r[0][5] or datetime.min, r[1], r[0][0])):
+        if last_state in TERMINAL_STATES:
+            is_stale = state != last_state
+        elif event_time and last_time:
+            is_stale = (event_time, rank) < (last_time, last_rank)
+        else:
+            is_stale = rank < last_rank
+        if is_stale:
+            stale.append(event_id)
+            continue
+        last_rank = rank
+        last_state = state or last_state
+        applied.append(event_id)
+        if event_time:
+            last_time = vals['state_event_time'] = event_time
+        if state:
+            vals['order_state'] = state
+        if code:
+            vals['state_code'] = code
+        if message:
+            vals['state_message'] = message
+        if eta:
+            vals['driver_eta'] = eta
+    return vals, applied, stale
+
+
+class GrabOrderStateEvent(models.Model):
+    """
+    /grab/webhook/order/state 收到的每一条状态推送。
+
+    - 订单还没落地（SubmitOrder 尚未完成）：事件以 pending 缓存，订单入库时（_after_grab_ingest）
+      或下一次 cron 再应用，webhook 直接返回 200，不再用 409 让 Grab 重试
+    - 订单已存在：按 Grab 的事件时间（同一时间按 STATE_RANK；Grab 没给时间时只按 STATE_RANK）比较，只有比订单
+      当前状态更新的事件才会写入 order_state；迟到的旧事件记为 stale，不会把 COLLECTED 覆盖回 DRIVER_ALLOCATED，
+      终态（DELIVERED / FAILED / CANCELLED）之后只接受同一终态的重复推送
+    - 配送途中大量只改 driverETA 的推送：grab.order_state_coalesce_seconds 窗口内订单的第一条推送立即应用，
+      之后的推送只追加一行事件，窗口结束后合并、只把每张订单的最新值批量 UPDATE 到 grab_order，事件表本身保留完整历史
+    """
+    _name = 'grab.order.state.event'
+    _description = 'Grab Order State Event'
+    _order = 'id desc'
+
+    grab_order_id = fields.Char('Order ID', required=True, index=True, readonly=True)
+    order_id = fields.Many2one('grab.order', string='Order', index=True, readonly=True, ondelete='cascade')
+    state = fields.Char('State', readonly=True)
+    code = fields.Char('Code', readonly=True)
+    message = fields.Char('Message', readonly=True)
+    driver_eta = fields.Integer('Driver ETA (seconds)', readonly=True)
+    event_time = fields.Datetime('Event Time', index=True, readonly=True,
+                                 help="Grab's timestamp for the event; empty when Grab sent none (see Received)")
+    payload = fields.Json('Payload', readonly=True)
+    status = fields.Selection([
+        ('pending', 'Waiting for Order'),
+        ('applied', 'Applied'),
+        ('stale', 'Stale'),
+        ('orphan', 'Orphan'),
+    ], default='pending', required=True, index=True, readonly=True)
+
+    @api.model
+    def _event_time(self, data):
+        for key in EVENT_TIME_KEYS:
+            value = dt_iso_to_odoo(data.get(key))
+            if value:
+                return value
+        return False
+
+    @api.model
+    def _prepare_vals(self, data):
+        eta = data.get('driverETA')
+        try:
+            eta = int(eta) if eta not in (None, '') else False
+        except (TypeError, ValueError):
+            eta = False
+        return {
+            'grab_order_id': str(data['orderID']).strip(),
+            'state': data.get('state') or False,
+            'code': data.get('code') or False,
+            'message': data.get('message') or False,
+            'driver_eta': eta,
+            'event_time': self._event_time(data),
+            'payload': data,
+        }
+
+    @api.model
+    def _coalesce_seconds(self):
+        value = self.env['ir.config_parameter'].sudo().get_param('grab.order_state_coalesce_seconds', 0)
+        try:
+            return max(float(value or 0), 0.0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    @api.model
+    def _insert(self, vals):
+        """追加一行事件历史：一条 INSERT，不经过 ORM create"""
+        self.env.cr.execute("""
+            INSERT INTO grab_order_state_event
+                (grab_order_id, state, code, message, driver_eta, event_time, payload, status,
+                 create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb, 'pending',
+                    %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            RETURNING id
+        """, (vals['grab_order_id'], vals['state'] or None, vals['code'] or None, vals['message'] or None,
+              vals['driver_eta'] or None, vals['event_time'] or None, json.dumps(vals['payload']),
+              self.env.uid, self.env.uid))
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _record(self, data):
+        """
+        记录一条状态推送。grab.order_state_coalesce_seconds = 0，或窗口内该订单没有别的推送时立即应用；
+        否则只落事件，窗口结束后由 flush cron 把这段时间内每张订单的最新状态 / ETA 合并成一次批量 UPDATE。
+        返回事件记录（status 即处理结果）
+        """
+        vals = self._prepare_vals(data)
+        event_id = self._insert(vals)
+        window = self._coalesce_seconds()
+        if window and self._has_recent_event(vals['grab_order_id'], event_id, window):
+            self._schedule_flush(event_id, window)
+        else:
+            self._apply_pending([vals['grab_order_id']])
+        return self.browse(event_id)
+
+    @api.model
+    def _has_recent_event(self, grab_order_id, event_id, window):
+        """该订单在窗口内已有推送，或还有等待中的事件"""
+        self.env.cr.execute("""
+            SELECT 1 FROM grab_order_state_event
+             WHERE grab_order_id = %s AND id < %s
+               AND (status = 'pending' OR create_date >= (now() at time zone 'UTC') - make_interval(secs => %s))
+             LIMIT 1
+        """, (grab_order_id, event_id, window))
+        return bool(self.env.cr.fetchone())
+
+    @api.model
+    def _schedule_flush(self, event_id, window):
+        cr = self.env.cr
+        # 窗口内已有更早的待处理事件时，它已经排好了一次 flush，这里不再重复创建 cron trigger
+        cr.execute("""
+            SELECT 1 FROM grab_order_state_event
+             WHERE status = 'pending' AND id < %s
+               AND create_date >= (now() at time zone 'UTC') - make_interval(secs => %s)
+             LIMIT 1
+        """, (event_id, window))
+        if cr.fetchone() or cr.postcommit.data.get(FLUSH_SCHEDULED):
+            return
+        cron = self.env.ref('odoo_grab_integration.ir_cron_grab_order_state_flush', raise_if_not_found=False)
+        if not cron:
+            return
+        cr.postcommit.data[FLUSH_SCHEDULED] = True
+        registry, cron_id = self.env.registry, cron.id
+
+        @cr.postcommit.add
+        def trigger():
+            # 事件提交后再排 flush，窗口从提交时刻算起；事务回滚则不排
+            with registry.cursor() as trigger_cr:
+                api.Environment(trigger_cr, SUPERUSER_ID, {})['ir.cron'].browse(cron_id)._trigger(
+                    at=fields.Datetime.now() + timedelta(seconds=window))
+
+    @api.model
+    def _apply_pending(self, grab_order_ids=None, limit=FLUSH_BATCH):
+        """
+        把等待中的、订单已落地的事件合并应用：每张订单只写最终值，所有订单一条 UPDATE，事件状态再一条 UPDATE。
+        直接写 SQL，不触发 ORM write 的重算；订单行按 id 顺序加锁，并发 flush 之间不会死锁。
+        grab_order_ids 为 None 时处理全部等待中的事件。返回 (applied, stale) 事件数
+        """
+        if grab_order_ids is not None and not grab_order_ids:
+            return 0, 0
+        self.env.flush_all()
+        cr = self.env.cr
+        where, params = '', []
+        if grab_order_ids is not None:
+            where, params = 'AND e.grab_order_id = ANY(%s)', [list(grab_order_ids)]
+        cr.execute("""
+            SELECT o.id, e.id, e.state, e.code, e.message, e.driver_eta, e.event_time
+              FROM grab_order_state_event e
+              JOIN grab_order o ON o.grab_order_id = e.grab_order_id
+             WHERE e.status = 'pending' """ + where + """
+             ORDER BY e.id
+             LIMIT %s
+               FOR UPDATE OF e SKIP LOCKED
+        """, params + [limit])
+        events = defaultdict(list)
+        for order_id, *event in cr.fetchall():
+            events[order_id].append(tuple(event))
+        if not events:
+            return 0, 0
+
+        cr.execute("""SELECT id, order_state, state_event_time FROM grab_order
+                       WHERE id = ANY(%s) ORDER BY id FOR UPDATE""", (sorted(events),))
+        current = {row[0]: row[1:] for row in cr.fetchall()}
+        updates = []
+        event_orders, stale_ids = [], []
+        for order_id, order_events in events.items():
+            vals, applied, stale = fold_state_events(*current[order_id], order_events)
+            event_orders += [(event_id, order_id) for event_id in applied + stale]
+            stale_ids += stale
+            if vals:
+                updates.append((order_id, vals.get('order_state'), vals.get('state_code'), vals.get('state_message'),
+                                vals.get('driver_eta'), vals.get('state_event_time')))
+
+        if updates:
+            cr.execute("""
+                UPDATE grab_order o
+                   SET order_state = COALESCE(v.state, o.order_state),
+                       state_code = COALESCE(v.code, o.state_code),
+                       state_message = COALESCE(v.message, o.state_message),
+                       driver_eta = COALESCE(v.eta, o.driver_eta),
+                       state_event_time = COALESCE(v.event_time, o.state_event_time),
+                       write_uid = %s,
+                       write_date = now() at time zone 'UTC'
+                  FROM unnest(%s::int[], %s::varchar[], %s::varchar[], %s::varchar[], %s::int[], %s::timestamp[])
+                       AS v(id, state, code, message, eta, event_time)
+                 WHERE o.id = v.id
+            """, (self.env.uid, *map(list, zip(*updates))))
+        cr.execute("""
+            UPDATE grab_order_state_event e
+               SET order_id = v.order_id,
+                   status = CASE WHEN e.id = ANY(%s) THEN 'stale' ELSE 'applied' END,
+                   write_date = now() at time zone 'UTC'
+              FROM unnest(%s::int[], %s::int[]) AS v(id, order_id)
+             WHERE e.id = v.id
+        """, (stale_ids, *map(list, zip(*event_orders))))
+
+        self.env['grab.order'].invalidate_model(list(ORDER_STATE_FIELDS) + ['state_event_ids'])
+        self.invalidate_model(['order_id', 'status'])
+        if stale_ids:
+            _logger.info("Grab order state events: ignored %s out-of-order push(es)", len(stale_ids))
+        return len(event_orders) - len(stale_ids), len(stale_ids)
+
+    @api.model
+    def _cron_flush(self, auto_commit=True):
+        """合并窗口结束后触发；也按分钟兜底运行"""
+        total = 0
+        while True:
+            applied, stale = self._apply_pending()
+            total += applied + stale
+            if auto_commit:
+                self.env.cr.commit()
+            if applied + stale < FLUSH_BATCH:
+                break
+        if total:
+            _logger.info("Grab order state events: flushed %s events", total)
+        return total
+
+    @api.model
+    def _cron_apply_pending(self):
+        """兜底：webhook 与 SubmitOrder 并发时两边都可能看不到对方未提交的数据，由 cron 补上"""
+        applied, _stale = self._apply_pending()
+        cr = self.env.cr
+        cr.execute("""
+            UPDATE grab_order_state_event SET status = 'orphan', write_date = now() at time zone 'UTC'
+             WHERE status = 'pending' AND create_date < (now() at time zone 'UTC') - make_interval(hours => %s)
+        """, (ORPHAN_AFTER_HOURS,))
+        orphans = cr.rowcount
+        cr.execute("""
+            DELETE FROM grab_order_state_event
+             WHERE status <> 'pending' AND create_date < (now() at time zone 'UTC') - make_interval(days => %s)
+        """, (RETENTION_DAYS,))
+        purged = cr.rowcount
+        if orphans or purged:
+            self.invalidate_model()
+        _logger.info("Grab order state events: applied=%s orphaned=%s purged=%s", applied, orphans, purged)
@@ -1,9 +1,7 @@
 # models/grab_order_sync.py
-import requests
 import logging
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-from datetime import date, timedelta
 
 _logger = logging.getLogger(__name__)
 
@@ -12,59 +10,57 @@ class GrabOrderSync(models.TransientModel):
     _description = 'Sync Grab Orders (List Orders)'
 
     sync_date = fields.Date(default=lambda self: fields.Date.context_today(self))
+    # 日期区间 × 商户交给 grab.order.backfill，并发拉取、可断点续跑
+    date_to = fields.Date('To')
+    merchant_ids = fields.Char('Merchant IDs', help='Comma separated; defaults to every active outlet in Grab Menus',
+                               default=lambda self: self.env['grab.order.backfill']._default_merchant_ids())
+    max_workers = fields.Integer('Parallel Requests', default=4)
+
+    def action_backfill(self):
+        self.ensure_one()
+        if not self.merchant_ids:
+            raise UserError(_("Missing merchant IDs for the backfill."))
+        job = self.env['grab.order.backfill'].create({
+            'date_from': self.sync_date,
+            'date_to': self.date_to or self.sync_date,
+            'merchant_ids': self.merchant_ids,
+            'max_workers': self.max_workers or 4,
+        })
+        job.action_start()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'grab.order.backfill',
+            'res_id': job.id,
+            'view_mode': 'form',
+        }
 
     def action_sync(self):
+        """同步 sync_date 这一天所有商户的订单：各商户并发拉取、共享限流，完成后按商户汇报吞吐"""
         self.ensure_one()
         ICP = self.env['ir.config_parameter'].sudo()
-        client_id = ICP.get_param('grab.client_id')
-        client_secret = ICP.get_param('grab.client_secret')
-        merchant_id = ICP.get_param('grab.merchant_id')
-        if not all([client_id, client_secret, merchant_id]):
-            raise UserError(_("Missing Grab config (client_id/secret/merchant_id)."))
-
-        # 1) 取 token（用你现有的 grab_get_access_token）
-        from ..utils.grab_oauth import grab_get_access_token
-        token = grab_get_access_token(client_id, client_secret)
+        if not all([ICP.get_param('grab.client_id'), ICP.get_param('grab.client_secret'), self.merchant_ids]):
+            raise UserError(_("Missing Grab config (client_id/secret) or no active merchant in Grab Menus."))
 
-        # 2) 翻页拉单
-        headers = {'Authorization': f'Bearer {token}'}
-        base = 'https://partner-api.grab.com/grabfood/partner/v1/orders'
-        page = 0
-        any_count = 0
-        while True:
-            params = {
-                'merchantID': merchant_id,
-                'date': self.sync_date.strftime('%Y-%m-%d'),
-                'page': page,
-            }
-            resp = requests.get(base, headers=headers, params=params, timeout=20)
-            if resp.status_code != 200:
-                raise UserError(_("Grab list orders failed: %s %s") % (resp.status_code, resp.text))
-            payload = resp.json() or {}
-            orders = payload.get('orders') or []
-            # 3) 复用"提交订单"解析逻辑，把单落地
-            for order_json in orders:
-                try:
-                    order_id = order_json.get('orderID')
-                    self.env['grab.order']._upsert_from_grab_json(order_json)
-                    _logger.debug("Processed order: %s", order_id)
-                except Exception as e:
-                    _logger.error("Failed to process order %s: %s", order_json.get('orderID', 'UNKNOWN'), e)
-            any_count += len(orders)
-            if not payload.get('more'):
-                break
-            page += 1
+        job = self.env['grab.order.backfill'].create({
+            'date_from': self.sync_date,
+            'date_to': self.sync_date,
+            'merchant_ids': self.merchant_ids,
+            'max_workers': self.max_workers or 4,
+            'state': 'running',
+        })
+        # 向导里同步执行，不中途提交；失败的页留在任务里，可以在 Order Backfills 中续跑
+        job._run(auto_commit=False)
 
-        # 提示
-        _logger.info("Grab order sync completed: Total orders=%s for date=%s", any_count, self.sync_date)
+        _logger.info("Grab order sync completed: Total orders=%s for date=%s\n%s",
+                     job.order_count, self.sync_date, job.throughput_summary)
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
-                'title': _("Grab Orders Sync Complete"),
-                'message': _("Successfully synced %s orders for %s") % (any_count, self.sync_date),
-                'type': 'success',
-                'sticky': False,
+                'title': _("Grab Orders Sync Complete") if job.state == 'done' else _("Grab Orders Sync Incomplete"),
+                'message': _("Synced %s orders for %s\n%s") % (job.order_count, self.sync_date, job.throughput_summary),
+                'type': 'success' if job.state == 'done' else 'warning',
+                'sticky': job.state != 'done',
             }
         }
 
@@ -0,0 +1,266 @@
+# models/grab_outbox.py
+# -*- coding: utf-8 -*-
+import json
+import logging
+from datetime import timedelta
+
+from psycopg2 import errors
+
+from odoo import models, fields, api
+
+from ..push_grab_order_ready import push_grab_order_ready
+from ..utils.push_grab_new_order_ready_time import push_grab_new_order_ready_time
+from ..utils.push_menu_notification import push_menu_notification
+
+_logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+RETRY_BASE_SECONDS = 30
+MENU_NOTIFICATION_COOLDOWN = 120  # Grab 对过于频繁的菜单通知返回 409，要求约 120 秒后再试
+
+# 每个端点的发送速率（次/秒），令牌桶存在 grab_outbox_rate 表里，所有 worker 共用；0 表示不限速
+ENDPOINT_RATES = {
+    'order_mark': 10,
+    'order_ready_time': 10,
+    'menu_notification': 1,
+}
+
+
+class GrabOutbox(models.Model):
+    """
+    出站 Grab 调用的发件箱：按钮只负责入队，cron 批量发送。
+
+    - idempotency_key 相同且仍在 pending 的操作只保留一条（部分唯一索引 + ON CONFLICT，并发点击也不会重复发）
+    - 同一商户待发的菜单通知合并为一条，payload 更新为最新的菜单哈希
+    - 按端点令牌桶限速（桶在数据库里，多 worker 合计不超过配置速率）；按端点分别认领，
+      一个端点被限速不会挡住其他端点
+    - 429 / 5xx / 网络异常指数退避重试，409 菜单通知按冷却时间顺延
+    """
+    _name = 'grab.outbox'
+    _description = 'Grab Outbound Call Outbox'
+    _order = 'id'
+
+    endpoint = fields.Selection([
+        ('order_mark', 'Mark Order'),
+        ('order_ready_time', 'Update Ready Time'),
+        ('menu_notification', 'Menu Notification'),
+    ], required=True, index=True, readonly=True)
+    idempotency_key = fields.Char('Idempotency Key', required=True, index=True, readonly=True)
+    payload = fields.Json('Payload', readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], default='pending', required=True, index=True, readonly=True)
+    attempts = fields.Integer('Attempts', default=0, readonly=True)
+    next_attempt_at = fields.Datetime('Next Attempt', index=True, readonly=True)
+    last_status = fields.Char('Last HTTP Status', readonly=True)
+    last_error = fields.Text('Last Error', readonly=True)
+    sent_at = fields.Datetime('Sent At', readonly=True)
+    order_id = fields.Many2one('grab.order', string='Order', readonly=True, ondelete='set null')
+    menu_id = fields.Many2one('grab.menu', string='Menu', readonly=True, ondelete='set null')
+
+    def init(self):
+        cr = self.env.cr
+        # 加唯一索引前，已有的重复待发记录只保留最早一条
+        cr.execute("""
+            UPDATE grab_outbox o
+               SET state = 'failed', last_error = 'Duplicate of #' || d.keep_id
+              FROM (SELECT idempotency_key, min(id) AS keep_id
+                      FROM grab_outbox
+                     WHERE state = 'pending'
+                  GROUP BY idempotency_key
+                    HAVING count(*) > 1) d
+             WHERE o.state = 'pending' AND o.idempotency_key = d.idempotency_key AND o.id <> d.keep_id
+        """)
+        cr.execute("""CREATE UNIQUE INDEX IF NOT EXISTS grab_outbox_pending_key_uniq
+                      ON grab_outbox (idempotency_key) WHERE state = 'pending'""")
+        cr.execute("""
+            CREATE TABLE IF NOT EXISTS grab_outbox_rate (
+                endpoint varchar PRIMARY KEY,
+                tokens double precision NOT NULL,
+                updated_at timestamp NOT NULL
+            )
+        """)
+        cr.execute("""
+            INSERT INTO grab_outbox_rate (endpoint, tokens, updated_at)
+            SELECT unnest(%s::varchar[]), 0, now() at time zone 'UTC'
+            ON CONFLICT (endpoint) DO NOTHING
+        """, (list(ENDPOINT_RATES),))
+
+    # ---- enqueue ----
+
+    @api.model
+    def _enqueue(self, endpoint, key, payload, order=None, menu=None):
+        """
+        同 key 已有待发记录时复用（payload 更新为最新），否则新建；新建时触发发送 cron。
+        一条 INSERT ... ON CONFLICT：并发的两次入队由部分唯一索引保证只留一条
+        """
+        self.flush_model()
+        self.env.cr.execute("""
+            INSERT INTO grab_outbox
+                (endpoint, idempotency_key, payload, state, attempts, order_id, menu_id,
+                 create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s::jsonb, 'pending', 0, %s, %s,
+                    %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            ON CONFLICT (idempotency_key) WHERE state = 'pending'
+            DO UPDATE SET payload = EXCLUDED.payload, write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+            RETURNING id, xmax = 0
+        """, (endpoint, key, json.dumps(payload), order.id if order else None, menu.id if menu else None,
+              self.env.uid, self.env.uid))
+        row_id, inserted = self.env.cr.fetchone()
+        row = self.browse(row_id)
+        row.invalidate_recordset()
+        if inserted:
+            cron = self.env.ref('odoo_grab_integration.ir_cron_grab_outbox', raise_if_not_found=False)
+            if cron:
+                cron.sudo()._trigger()
+        return row
+
+    @api.model
+    def _enqueue_order_mark(self, order, mark_status=1):
+        return self._enqueue('order_mark', 'order_mark:%s:%s' % (order.grab_order_id, mark_status),
+                             {'order_id': order.grab_order_id, 'mark_status': mark_status}, order=order)
+
+    @api.model
+    def _enqueue_ready_time(self, order, iso8601_str):
+        return self._enqueue('order_ready_time', 'order_ready_time:%s:%s' % (order.grab_order_id, iso8601_str),
+                             {'order_id': order.grab_order_id, 'ready_time': iso8601_str}, order=order)
+
+    @api.model
+    def _enqueue_menu_notification(self, menu):
+        # 同一商户只保留一条待发通知：key 不带菜单哈希
+        return self._enqueue('menu_notification', 'menu_notification:%s' % menu.merchant_id,
+                             {'merchant_id': menu.merchant_id, 'payload_hash': menu.payload_hash}, menu=menu)
+
+    # ---- send ----
+
+    def _call_endpoint(self):
+        """发出一次调用，返回 (status_code, text)"""
+        self.ensure_one()
+        p = self.payload or {}
+        if self.endpoint == 'order_mark':
+            return push_grab_order_ready(self.env, p['order_id'], p.get('mark_status', 1))
+        if self.endpoint == 'order_ready_time':
+            return push_grab_new_order_ready_time(self.env, p['order_id'], p['ready_time'])
+        if self.endpoint == 'menu_notification':
+            return push_menu_notification(self.env, p['merchant_id'])
+        raise ValueError("Unknown Grab outbox endpoint %s" % self.endpoint)
+
+    def _retry_later(self, error, status=None, delay=None):
+        attempts = self.attempts + 1
+        if attempts >= MAX_ATTEMPTS:
+            self.write({'state': 'failed', 'attempts': attempts, 'last_status': status, 'last_error': error})
+            return
+        delay = delay or RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+        self.write({
+            'attempts': attempts,
+            'last_status': status,
+            'last_error': error,
+            'next_attempt_at': fields.Datetime.now() + timedelta(seconds=delay),
+        })
+
+    def _apply_result(self, status, text):
+        self.ensure_one()
+        status_str = str(status)
+        if 200 <= status < 300:
+            self.write({'state': 'done', 'last_status': status_str, 'last_error': False,
+                        'sent_at': fields.Datetime.now()})
+            self._after_delivery()
+        elif status == 409 and self.endpoint == 'menu_notification':
+            # 冷却期内：顺延，不计入重试次数
+            self.write({'last_status': status_str, 'last_error': text,
+                        'next_attempt_at': fields.Datetime.now() + timedelta(seconds=MENU_NOTIFICATION_COOLDOWN)})
+        elif status == 429 or status >= 500:
+            self._retry_later(text, status_str)
+        else:
+            self.write({'state': 'failed', 'attempts': self.attempts + 1,
+                        'last_status': status_str, 'last_error': text})
+
+    def _after_delivery(self):
+        if self.endpoint == 'menu_notification' and self.menu_id:
+            hash_sent = (self.payload or {}).get('payload_hash')
+            if hash_sent:
+                self.menu_id.sudo().write({'last_pushed_payload_hash': hash_sent})
+
+    def _claim_endpoint(self, endpoint, limit):
+        """
+        从该端点的共享令牌桶取令牌，再认领不超过令牌数的待发记录。桶行加锁到本批提交：
+        另一个 worker 正在用这个端点的额度时本轮跳过（SKIP LOCKED）；REPEATABLE READ 下桶行或记录已被
+        别的事务改过时同样跳过，下一批再取。
+        """
+        cr = self.env.cr
+        rate = float(ENDPOINT_RATES.get(endpoint) or 0)
+        try:
+            with cr.savepoint(flush=False):
+                budget = limit
+                if rate > 0:
+                    cr.execute("""
+                        SELECT tokens, GREATEST(EXTRACT(EPOCH FROM (clock_timestamp() at time zone 'UTC') - updated_at), 0)
+                          FROM grab_outbox_rate
+                         WHERE endpoint = %s
+                           FOR UPDATE SKIP LOCKED
+                    """, (endpoint,))
+                    bucket = cr.fetchone()
+                    if not bucket:
+                        return []
+                    available = min(max(1.0, rate), bucket[0] + float(bucket[1]) * rate)
+                    budget = min(int(available), limit)
+                    if not budget:
+                        return []
+                cr.execute("""
+                    SELECT id
+                      FROM grab_outbox
+                     WHERE state = 'pending' AND endpoint = %s
+                       AND (next_attempt_at IS NULL OR next_attempt_at <= now() at time zone 'UTC')
+                     ORDER BY id
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                """, (endpoint, budget))
+                ids = [r[0] for r in cr.fetchall()]
+                if rate > 0:
+                    cr.execute("""
+                        UPDATE grab_outbox_rate SET tokens = %s, updated_at = clock_timestamp() at time zone 'UTC'
+                         WHERE endpoint = %s
+                    """, (available - len(ids), endpoint))
+                return ids
+        except errors.SerializationFailure:
+            _logger.debug("Grab outbox: %s claimed concurrently, retrying next batch", endpoint)
+            return []
+
+    def _claim(self, limit):
+        """按端点分别认领，每个端点最多 limit 条"""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT DISTINCT endpoint
+              FROM grab_outbox
+             WHERE state = 'pending'
+               AND (next_attempt_at IS NULL OR next_attempt_at <= now() at time zone 'UTC')
+        """)
+        ids = []
+        for (endpoint,) in sorted(self.env.cr.fetchall()):
+            ids += self._claim_endpoint(endpoint, limit)
+        return self.browse(sorted(ids))
+
+    @api.model
+    def _cron_drain(self, batch_size=100, max_batches=10, auto_commit=True):
+        """按批发送；认领时已经扣过令牌，认领到的记录全部发出，限速的端点留到下一批"""
+        for _i in range(max_batches):
+            rows = self._claim(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                try:
+                    status, text = row._call_endpoint()
+                except Exception as e:
+                    _logger.warning("Grab outbox #%s %s failed: %s", row.id, row.endpoint, e)
+                    row._retry_later(str(e))
+                    continue
+                row._apply_result(status, text)
+            if auto_commit:
+                self.env.cr.commit()
+        self.env.cr.execute("SELECT count(*) FROM grab_outbox WHERE state = 'pending'")
+        _logger.info("Grab outbox: backlog=%s", self.env.cr.fetchone()[0])
+
+    def action_retry(self):
+        self.filtered(lambda r: r.state == 'failed').write({'state': 'pending', 'attempts': 0, 'next_attempt_at': False})
@@ -0,0 +1,118 @@
+# models/grab_webhook_event.py
+# -*- coding: utf-8 -*-
+import logging
+import re
+from datetime import datetime, timedelta
+
+from odoo import models, fields, api
+
+from ..utils.grab_event_journal import TABLE, ensure_partitions
+
+_logger = logging.getLogger(__name__)
+
+PRECREATE_DAYS = 3  # 提前建好未来几天的分区，写入路径上基本不用再建
+PARTITION_RE = re.compile(r'^%s_p(\d{8})$' % TABLE)
+
+
+class GrabWebhookEvent(models.Model):
+    """
+    所有 Grab webhook 的统一事件日志（只追加）。
+
+    表由 init() 建成按 received_at 分区的表（每天一个分区），ORM 只用来查看；写入统一经
+    utils.grab_event_journal 的进程内缓冲批量 COPY。grab.webhook_event_retention_days 天前的分区
+    由 cron 直接 DROP，不做逐行 DELETE。
+    """
+    _name = 'grab.webhook.event'
+    _description = 'Grab Webhook Event Journal'
+    _auto = False
+    _log_access = False
+    _order = 'received_at desc, id desc'
+
+    received_at = fields.Datetime('Received At', readonly=True)
+    event_type = fields.Selection([
+        ('order_submit', 'Order Submit'),
+        ('order_state', 'Order State'),
+        ('menu_sync_state', 'Menu Sync State'),
+        ('integration_status', 'Integration Status'),
+        ('push_menu', 'Push Grab Menu'),
+    ], readonly=True)
+    grab_order_id = fields.Char('Order ID', readonly=True)
+    merchant_id = fields.Char('Merchant ID', readonly=True)
+    partner_merchant_id = fields.Char('Partner Merchant ID', readonly=True)
+    status = fields.Char('Status', readonly=True)
+    http_status = fields.Integer('HTTP Status', readonly=True)
+    payload = fields.Json('Payload', readonly=True)
+    request_id = fields.Char('Request ID', readonly=True, help="Grab requestID of a menu sync")
+    job_id = fields.Char('Job ID', readonly=True, help="Grab jobID of a menu sync")
+
+    def init(self):
+        cr = self.env.cr
+        cr.execute("""
+            CREATE TABLE IF NOT EXISTS grab_webhook_event (
+                id bigserial,
+                received_at timestamp NOT NULL,
+                event_type varchar NOT NULL,
+                grab_order_id varchar,
+                merchant_id varchar,
+                partner_merchant_id varchar,
+                status varchar,
+                http_status integer,
+                payload jsonb,
+                request_id varchar,
+                job_id varchar,
+                PRIMARY KEY (id, received_at)
+            ) PARTITION BY RANGE (received_at)
+        """)
+        # 早期建的表没有这两列；加在父表上，已有分区一起加
+        cr.execute("ALTER TABLE grab_webhook_event ADD COLUMN IF NOT EXISTS request_id varchar")
+        cr.execute("ALTER TABLE grab_webhook_event ADD COLUMN IF NOT EXISTS job_id varchar")
+        # 建在父表上的索引会自动建到每个分区
+        cr.execute("CREATE INDEX IF NOT EXISTS grab_webhook_event_received_idx ON grab_webhook_event (received_at)")
+        cr.execute("""CREATE INDEX IF NOT EXISTS grab_webhook_event_order_idx
+                      ON grab_webhook_event (grab_order_id) WHERE grab_order_id IS NOT NULL""")
+        cr.execute("""CREATE INDEX IF NOT EXISTS grab_webhook_event_request_idx
+                      ON grab_webhook_event (request_id) WHERE request_id IS NOT NULL""")
+        cr.execute("""CREATE INDEX IF NOT EXISTS grab_webhook_event_job_idx
+                      ON grab_webhook_event (job_id) WHERE job_id IS NOT NULL""")
+        self._ensure_upcoming_partitions()
+
+    @api.model
+    def _ensure_upcoming_partitions(self):
+        # received_at 为 UTC，分区边界同样按 UTC 日期
+        today = fields.Datetime.now().date()
+        ensure_partitions(self.env.cr, [today + timedelta(days=i) for i in range(-1, PRECREATE_DAYS + 1)])
+
+    @api.model
+    def _partitions(self):
+        """[(分区日期, 分区表名)]"""
+        self.env.cr.execute("""
+            SELECT c.relname
+              FROM pg_inherits i
+              JOIN pg_class c ON c.oid = i.inhrelid
+              JOIN pg_class p ON p.oid = i.inhparent
+             WHERE p.relname = %s
+        """, (TABLE,))
+        result = []
+        for (name,) in self.env.cr.fetchall():
+            match = PARTITION_RE.match(name)
+            if match:
+                result.append((datetime.strptime(match.group(1), '%Y%m%d').date(), name))
+        return sorted(result)
+
+    @api.model
+    def _cron_maintain_partitions(self):
+        """建好接下来几天的分区，并 DROP 超过保留期的分区"""
+        self._ensure_upcoming_partitions()
+        days = int(self.env['ir.config_parameter'].sudo().get_param('grab.webhook_event_retention_days', 30) or 0)
+        if days <= 0:
+            return []
+        cutoff = fields.Datetime.now().date() - timedelta(days=days)
+        dropped = []
+        for day, name in self._partitions():
+            if day < cutoff:
+                self.env.cr.execute('DROP TABLE IF EXISTS "%s"' % name)
+                dropped.append(name)
+        if dropped:
+            self.invalidate_model()
+            _logger.info("Grab webhook journal: dropped %s partitions older than %s days", len(dropped), days)
+        return dropped
@@ -0,0 +1,74 @@
+# models/grab_webhook_idempotency.py
+# -*- coding: utf-8 -*-
+import json
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+PURGE_BATCH = 5000
+
+
+class GrabWebhookIdempotency(models.Model):
+    """
+    已成功处理的 webhook 投递：payload 哈希 -> 当时的应答。进程内 LRU（utils.grab_idempotency）未命中时查这里，
+    不同 worker、重启之后的重投同样能识别。读写都走 SQL，不经过 ORM create。
+    """
+    _name = 'grab.webhook.idempotency'
+    _description = 'Grab Webhook Idempotency Key'
+    _order = 'id desc'
+
+    key = fields.Char('Key', required=True, readonly=True)
+    kind = fields.Selection([
+        ('order_submit', 'Order Submit'),
+        ('order_state', 'Order State'),
+    ], required=True, readonly=True)
+    grab_order_id = fields.Char('Order ID', index=True, readonly=True)
+    response = fields.Json('Response', readonly=True)
+    expires_at = fields.Datetime('Expires At', required=True, index=True, readonly=True)
+
+    _sql_constraints = [
+        ('key_uniq', 'unique(key)', 'Idempotency keys must be unique.'),
+    ]
+
+    @api.model
+    def _lookup(self, key):
+        """未过期时返回 (剩余秒数, 应答)，否则 None"""
+        self.env.cr.execute("""
+            SELECT EXTRACT(EPOCH FROM expires_at - (now() at time zone 'UTC')), response
+              FROM grab_webhook_idempotency
+             WHERE key = %s AND expires_at > (now() at time zone 'UTC')
+        """, (key,))
+        row = self.env.cr.fetchone()
+        return (float(row[0]), row[1]) if row else None
+
+    @api.model
+    def _remember(self, key, kind, grab_order_id, response, ttl):
+        # 并发的两次投递都处理成功时只延长有效期，应答保留先写入的一份
+        self.env.cr.execute("""
+            INSERT INTO grab_webhook_idempotency
+                (key, kind, grab_order_id, response, expires_at, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, %s::jsonb, (now() at time zone 'UTC') + make_interval(secs => %s),
+                    %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')
+            ON CONFLICT (key) DO UPDATE
+                SET expires_at = EXCLUDED.expires_at, write_date = EXCLUDED.write_date
+        """, (key, kind, grab_order_id or None, json.dumps(response), ttl, self.env.uid, self.env.uid))
+
+    @api.model
+    def _cron_purge(self, batch_size=PURGE_BATCH):
+        cr = self.env.cr
+        total = 0
+        while True:
+            cr.execute("""
+                DELETE FROM grab_webhook_idempotency
+                 WHERE id IN (SELECT id FROM grab_webhook_idempotency
+                               WHERE expires_at <= (now() at time zone 'UTC') LIMIT %s)
+            """, (batch_size,))
+            total += cr.rowcount
+            if cr.rowcount < batch_size:
+                break
+        if total:
+            self.invalidate_model()
+            _logger.info("Grab webhook idempotency: purged %s expired keys", total)
+        return total
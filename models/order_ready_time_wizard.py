@@ -1,6 +1,5 @@
 from odoo import models, fields
 from odoo.exceptions import UserError
-from ..utils.push_grab_new_order_ready_time import push_grab_new_order_ready_time
 import logging
 import pytz
 
@@ -19,9 +18,6 @@ class GrabOrderReadyTimeWizard(models.TransientModel):
         if not order:
             raise UserError("No order selected.")
 
-        client_id = self.env['ir.config_parameter'].sudo().get_param('grab.client_id')
-        client_secret = self.env['ir.config_parameter'].sudo().get_param('grab.client_secret')
-
         value = self.new_order_ready_time
         if not value:
             raise UserError("Please provide the new ready time.")
@@ -35,17 +31,9 @@ class GrabOrderReadyTimeWizard(models.TransientModel):
 
         _logger.info("Pushing new order ready time %s for Grab order %s", iso8601_str, order.grab_order_id)
 
-        status_code, resp_text = push_grab_new_order_ready_time(
-            order.grab_order_id, iso8601_str, client_id, client_secret
-        )
-        if status_code == 204:
-            msg = "Ready time updated successfully (204 No Content)"
-            level = 'success'
-            _logger.info(msg)
-        else:
-            msg = f"Failed: {status_code} {resp_text}"
-            level = 'danger'
-            _logger.error(msg)
+        self.env['grab.outbox'].sudo()._enqueue_ready_time(order, iso8601_str)
+        msg = "Queued: new ready time will be sent to Grab shortly."
+        level = 'success'
 
         return {
             'type': 'ir.actions.client',
@@ -1,8 +1,41 @@
 # models/product_template_grab.py
 # -*- coding: utf-8 -*-
+from collections import defaultdict
+
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 
+from .grab_menu import VARIANT_INDEX_FIELDS, VARIANT_PAYLOAD_FIELDS
+
+# 会进入 GetMenu payload 的产品字段：变更后需要让对应 grab.menu 的快照失效
+GRAB_PAYLOAD_FIELDS = {
+    'name', 'list_price', 'taxes_id', 'currency_id',
+    'website_description', 'description_ecommerce', 'public_description', 'description_sale', 'description',
+    'image_1920', 'use_grab_price', 'grab_price', 'gst_rate', 'grab_available',
+}
+
+# precommit.data 里待同步的 grab.menu.item：{item id: 合并后的 grab_vals}
+PENDING_ITEM_SYNC = 'grab.menu.item.sync'
+
+
+def _grab_item_vals(vals):
+    """产品 write 的 vals 中需要同步到关联 grab.menu.item 的部分（与具体产品无关）"""
+    grab_vals = {}
+    for fname in ('use_grab_price', 'grab_price', 'gst_rate'):
+        if fname in vals:
+            grab_vals[fname] = vals[fname]
+    if 'grab_available' in vals:
+        grab_vals['available_status'] = 'AVAILABLE' if vals['grab_available'] else 'UNAVAILABLE'
+    return grab_vals
+
+
+def _write_changed(items, grab_vals):
+    """只写值确实不同的 menu item，一次 write；重复导入相同价格时不产生写入和重算"""
+    items = items.filtered(lambda item: any(item[f] != v for f, v in grab_vals.items()))
+    if items:
+        items.write(grab_vals)
+    return items
+
 
 class ProductTemplateGrab(models.Model):
     _inherit = 'product.template'
@@ -119,29 +152,79 @@ class ProductTemplateGrab(models.Model):
             }
         }
 
-    @api.model
     def write(self, vals):
-        """Override write to auto-sync changes to Grab menu items if sync is enabled"""
+        """
+        Override write to auto-sync changes to Grab menu items if sync is enabled.
+
+        所有产品的 grab_vals 相同，关联的 menu item 合并成一次 write。context grab_defer_item_sync=True
+        （批量导入）时推迟到事务提交前统一刷新：同一 item 的多次变更按字段合并，再按相同的值分组，每组一次 write。
+        """
         result = super().write(vals)
+
+        grab_vals = _grab_item_vals(vals)
+        if grab_vals:
+            items = self.filtered('grab_sync_enabled').grab_menu_item_ids
+            if items and self.env.context.get('grab_defer_item_sync'):
+                self._defer_grab_item_sync(items, grab_vals)
+            elif items:
+                _write_changed(items, grab_vals)
+
+        # 菜单只在第一次变更时打标记（_mark_payload_dirty 跳过已过期的菜单），快照重建和推送仍各一次
+        if GRAB_PAYLOAD_FIELDS.intersection(vals):
+            self.grab_menu_item_ids._get_grab_menus()._mark_payload_dirty()
         
-        # Fields that should trigger sync to Grab items
-        sync_fields = ['name', 'list_price', 'use_grab_price', 'grab_price', 'gst_rate', 'grab_available']
-        
-        if any(field in vals for field in sync_fields):
-            for product in self:
-                if product.grab_sync_enabled and product.grab_menu_item_ids:
-                    # Sync relevant changes to Grab menu items
-                    grab_vals = {}
-                    if 'use_grab_price' in vals:
-                        grab_vals['use_grab_price'] = vals['use_grab_price']
-                    if 'grab_price' in vals:
-                        grab_vals['grab_price'] = vals['grab_price']
-                    if 'gst_rate' in vals:
-                        grab_vals['gst_rate'] = vals['gst_rate']
-                    if 'grab_available' in vals:
-                        grab_vals['available_status'] = 'AVAILABLE' if vals['grab_available'] else 'UNAVAILABLE'
-                    
-                    if grab_vals:
-                        product.grab_menu_item_ids.write(grab_vals)
-        
-        return result
\ No newline at end of file
+        return result
+
+    def _defer_grab_item_sync(self, items, grab_vals):
+        precommit = self.env.cr.precommit
+        pending = precommit.data.get(PENDING_ITEM_SYNC)
+        if pending is None:
+            pending = precommit.data[PENDING_ITEM_SYNC] = {}
+            precommit.add(self.env['product.template']._flush_grab_item_sync)
+        for item_id in items.ids:
+            pending.setdefault(item_id, {}).update(grab_vals)
+
+    @api.model
+    def _flush_grab_item_sync(self):
+        """precommit：把本事务推迟的 menu item 同步按相同的值分组写入"""
+        pending = self.env.cr.precommit.data.pop(PENDING_ITEM_SYNC, None) or {}
+        groups = defaultdict(list)
+        for item_id, grab_vals in pending.items():
+            groups[tuple(sorted(grab_vals.items()))].append(item_id)
+        Item = self.env['grab.menu.item']
+        for grab_vals, item_ids in groups.items():
+            _write_changed(Item.browse(item_ids).exists(), dict(grab_vals))
+        # 不依赖 commit 在回调之后是否再 flush：这里写入的值自己落库
+        self.env.flush_all()
+        return len(groups)
+
+class ProductProductGrab(models.Model):
+    _inherit = 'product.product'
+
+    # default_code / barcode 参与 Grab 订单明细匹配，变更后让 grab.menu.item 的匹配索引失效；
+    # 首个变体与变体图片进入 GetMenu payload，变更后让相关菜单快照过期
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        if any(VARIANT_INDEX_FIELDS.intersection(vals) for vals in vals_list):
+            self.env['grab.menu.item']._invalidate_grab_item_index()
+        self.env['grab.menu']._mark_payload_dirty_for_templates(records.product_tmpl_id.ids)
+        return records
+
+    def write(self, vals):
+        templates = self.product_tmpl_id
+        res = super().write(vals)
+        if VARIANT_INDEX_FIELDS.intersection(vals):
+            self.env['grab.menu.item']._invalidate_grab_item_index()
+        if VARIANT_PAYLOAD_FIELDS.intersection(vals):
+            self.env['grab.menu']._mark_payload_dirty_for_templates((templates | self.product_tmpl_id).ids)
+        return res
+
+    def unlink(self):
+        template_ids = self.product_tmpl_id.ids
+        indexed = any(v.default_code or v.barcode for v in self)
+        res = super().unlink()
+        if indexed:
+            self.env['grab.menu.item']._invalidate_grab_item_index()
+        self.env['grab.menu']._mark_payload_dirty_for_templates(template_ids)
+        return res
@@ -1,8 +1,8 @@
 from .utils.grab_oauth import grab_get_access_token
-import requests
+from .utils.grab_http import grab_request
 
-def push_grab_menu_notification(merchant_id, client_id, client_secret):
-    access_token = grab_get_access_token(client_id, client_secret)
+def push_grab_menu_notification(env, merchant_id):
+    access_token = grab_get_access_token(env)
     url = 'https://partner-api.grab.com/grabfood/partner/v1/merchant/menu/notification'
     headers = {
         'Authorization': f'Bearer {access_token}',
@@ -11,5 +11,5 @@ def push_grab_menu_notification(merchant_id, client_id, client_secret):
     data = {
         "merchantID": merchant_id
     }
-    resp = requests.post(url, headers=headers, json=data, timeout=10)
+    resp = grab_request('POST', url, 'menu_notification', env=env, headers=headers, json=data)
     return resp.status_code, resp.text
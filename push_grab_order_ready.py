@@ -1,14 +1,21 @@
 from .utils.grab_oauth import grab_get_access_token
-import requests
+from .utils.grab_http import grab_request
 
-def push_grab_order_ready(order_id, client_id, client_secret, mark_status=1):
+def push_grab_order_ready(env, order_id, mark_status=1):
     """
     Push order ready/completed to Grab.
     mark_status:
         1 - Mark as ready
         2 - Mark as completed (dine-in only)
     """
-    access_token = grab_get_access_token(client_id, client_secret)
+    return post_order_mark(grab_get_access_token(env), order_id, mark_status, env=env)
+
+
+def post_order_mark(access_token, order_id, mark_status=1, env=None, timeout=None):
+    """
+    Send one mark call with an already fetched token.
+    Safe to call from worker threads when env is None and timeout is given.
+    """
     url = 'https://partner-api.grab.com/grabfood/partner/v1/orders/mark'
     headers = {
         'Authorization': f'Bearer {access_token}',
@@ -18,5 +25,5 @@ def push_grab_order_ready(order_id, client_id, client_secret, mark_status=1):
         "orderID": order_id,
         "markStatus": mark_status
     }
-    resp = requests.post(url, headers=headers, json=data, timeout=10)
+    resp = grab_request('POST', url, 'order_mark', env=env, timeout=timeout, headers=headers, json=data)
     return resp.status_code, resp.text
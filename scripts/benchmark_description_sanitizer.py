@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: utils/description_sanitizer vs. the old per-item cleaning code
+(re/html imported inside the loop, js_patterns rebuilt, ~10 re.sub passes per field).
+
+Run from the module root:
+    python3 scripts/benchmark_description_sanitizer.py [rounds]
+
+The corpus mimics what website_sale stores in product descriptions: snippet
+HTML with inline styles, entities, nested tags, and the occasional pasted
+<script> block. Each round cleans the whole menu once, as one GetMenu fetch does.
+"""
+
+import importlib.util
+import os
+import sys
+import timeit
+
+# Load the sanitizer directly so the benchmark does not need an Odoo install
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_spec = importlib.util.spec_from_file_location(
+    'description_sanitizer', os.path.join(project_root, 'utils', 'description_sanitizer.py'))
+sanitizer = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(sanitizer)
+
+CORPUS = [
+    '<p>Refreshing jasmine-scented green tea with delicate floral aroma</p>',
+    '<section class="s_text_block pt16 pb16" data-snippet="s_text_block"><div class="container">'
+    '<p style="margin-bottom: 0px;"><span style="font-size: 14px;">Hand-pulled Teh Tarik with '
+    'condensed milk&nbsp;&amp; a frothy top.</span></p><p><br></p></div></section>',
+    '<p><b>Signature Nasi Lemak</b></p><ul><li>Coconut rice</li><li>Sambal &amp; ikan bilis</li>'
+    '<li>Fried egg</li></ul><p>Spicy level: <font color="#ff0000">&#9733;&#9733;</font></p>',
+    '<div data-oe-version="1.0"><p>Kopi O Kosong &ndash; black coffee, no sugar. '
+    'Brewed with Robusta beans roasted in margarine.</p></div>',
+    '<p>Iced Milo Dinosaur</p><script>document.querySelectorAll(".oe_product").forEach(e => '
+    '{ e.innerText = e.innerText.trim(); });</script>',
+    'Chicken Rice (Roasted) &lt;Halal&gt;',
+    '<p>Kaya toast with butter, served with 2 soft-boiled eggs &amp; dark soy sauce</p>',
+    '<h3 class="o_default_snippet_text">Seasonal Special</h3><p class="o_default_snippet_text">'
+    'Durian chendol with gula melaka, red bean and pandan jelly.</p>',
+    '<p>Short</p>',
+    'Plain text description without any markup at all, just words.',
+    '<p>Laksa with prawns, fishcake, tau pok and cockles in a rich coconut curry broth.'
+    '<img src="/web/image/product.template/12/image_1024" alt="Laksa"/></p>',
+    '<p>Contains nuts; may contain traces of dairy {allergen info}</p>',
+    'Spicy level <3 and <b>extra hot</b> sambal on the side',
+    'Serves 2 > 10cm wide <i>sharing plate</i>',
+    '<p>Nasi lemak with sambal and fried chicken</p><span class="x',
+    '',
+    False,
+]
+
+ITEMS_PER_MENU = 300
+FIELD_ROWS = [
+    {
+        'website_description': CORPUS[i % len(CORPUS)],
+        'description_sale': CORPUS[(i * 7 + 3) % len(CORPUS)],
+        'description': 'Fallback main description for item %d' % (i % 40),
+    }
+    for i in range(ITEMS_PER_MENU)
+]
+
+
+def legacy_pick_description(values):
+    """The loop body of the old _compute_website_description, verbatim."""
+    for field_name in sanitizer.DESCRIPTION_FIELDS:
+        field_value = values.get(field_name)
+        if field_value and field_value.strip():
+            candidate_desc = field_value.strip()
+
+            import re
+            import html
+
+            js_patterns = [
+                r'document\.',
+                r'addEventListener',
+                r'querySelector',
+                r'function\s*\(',
+                r'const\s+\w+\s*=',
+                r'let\s+\w+\s*=',
+                r'var\s+\w+\s*=',
+                r'=>',
+                r'\.forEach\(',
+                r'\.trim\(\)',
+                r'innerText',
+                r'innerHTML'
+            ]
+            is_javascript = any(re.search(pattern, candidate_desc, re.IGNORECASE) for pattern in js_patterns)
+            if is_javascript:
+                continue
+
+            candidate_desc = re.sub(r'<[^<>]*>', '', candidate_desc)
+            candidate_desc = re.sub(r'<[^>]*$', '', candidate_desc)
+            candidate_desc = re.sub(r'^[^<]*>', '', candidate_desc)
+            candidate_desc = re.sub(r'</?[a-zA-Z][^>]*/?>', '', candidate_desc)
+            candidate_desc = re.sub(r'[<>]', '', candidate_desc)
+            candidate_desc = html.unescape(candidate_desc)
+            candidate_desc = re.sub(r'\s+', ' ', candidate_desc).strip()
+            candidate_desc = re.sub(r'&nbsp;', ' ', candidate_desc)
+            candidate_desc = re.sub(r'&[a-zA-Z]+;', '', candidate_desc)
+            candidate_desc = candidate_desc.strip()
+
+            if len(candidate_desc) < 10 or any(char in candidate_desc for char in ['{', '}', ';', '()', '=>']):
+                continue
+            return candidate_desc
+    return ""
+
+
+def run_legacy():
+    return [legacy_pick_description(row) for row in FIELD_ROWS]
+
+
+def run_cold():
+    sanitizer.cache_clear()
+    return [sanitizer.pick_description(row) for row in FIELD_ROWS]
+
+
+def run_warm():
+    return [sanitizer.pick_description(row) for row in FIELD_ROWS]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    legacy, new = run_legacy(), run_cold()
+    mismatches = [(row, a, b) for row, a, b in zip(FIELD_ROWS, legacy, new) if a != b]
+    print(f"=== Description sanitizer benchmark: {ITEMS_PER_MENU} items x {rounds} rounds ===")
+    print(f"Output mismatches vs. legacy: {len(mismatches)}")
+    for row, a, b in mismatches[:5]:
+        print(f"  legacy={a!r}\n  new   ={b!r}")
+
+    results = {}
+    for label, fn in (('legacy', run_legacy), ('sanitizer (cold cache)', run_cold),
+                      ('sanitizer (warm cache)', run_warm)):
+        run_warm()  # warm-up / keep the cache populated for the warm case
+        results[label] = min(timeit.repeat(fn, number=rounds, repeat=3)) / rounds
+    base = results['legacy']
+    for label, seconds in results.items():
+        print(f"{label:<24} {seconds * 1000:8.3f} ms/menu   x{base / seconds:5.1f}")
+    print(f"cache: {sanitizer.cache_info()}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: order ingestion with one create() per line / campaign / promo (old path)
+vs. one multi-row create([...]) per child model (grab.order._upsert_prepared_orders).
+
+Needs a database with the module installed; run through the Odoo shell:
+    odoo-bin shell -d <db> --no-http < scripts/benchmark_order_ingest.py
+
+For 1 / 20 / 100-line orders it prints the INSERT count, total query count and the
+median latency of ingesting a fresh order. Everything is rolled back at the end.
+"""
+
+import statistics
+import time
+from contextlib import contextmanager
+
+from odoo.addons.odoo_grab_integration.utils.grab_order_pipeline import GrabOrderPipeline
+from odoo.sql_db import Cursor
+
+ROUNDS = 5
+SIZES = (1, 20, 100)
+
+
+def make_order(order_id, n_lines):
+    return {
+        'orderID': order_id,
+        'shortOrderNumber': order_id[-6:],
+        'merchantID': 'BENCH-MEX',
+        'currency': {'code': 'SGD', 'symbol': 'S$', 'exponent': 2},
+        'featureFlags': {},
+        'items': [
+            {'id': 'BENCH-ITEM-%d' % i, 'grabItemID': 'G-%d' % i, 'name': 'Item %d' % i,
+             'quantity': 1 + i % 3, 'price': 250 + i, 'tax': 0,
+             'modifiers': [{'id': 'MOD-1', 'name': 'Less sugar', 'price': 0, 'quantity': 1}]}
+            for i in range(n_lines)
+        ],
+        'campaigns': [{'id': 'CMP-%d' % i, 'name': 'Campaign %d' % i, 'deductedAmount': 50} for i in range(2)],
+        'promos': [{'code': 'PROMO-%d' % i, 'name': 'Promo %d' % i, 'promoAmount': 100} for i in range(2)],
+    }
+
+
+@contextmanager
+def count_queries():
+    counts = {'insert': 0, 'total': 0}
+    original = Cursor.execute
+
+    def execute(cr, query, params=None, log_exceptions=True):
+        counts['total'] += 1
+        if str(query).lstrip().upper().startswith('INSERT'):
+            counts['insert'] += 1
+        return original(cr, query, params, log_exceptions)
+
+    Cursor.execute = execute
+    try:
+        yield counts
+    finally:
+        Cursor.execute = original
+
+
+def ingest_per_row(env, data):
+    """The pre-batching path: header create, then one create() per child row."""
+    Order = env['grab.order'].sudo()
+    pipeline = GrabOrderPipeline(env)
+    [(vals, children)] = pipeline.resolve([pipeline.normalize(data)])
+    rec = Order.create(vals)
+    for field_name, vals_list in children.items():
+        Child = env[Order._fields[field_name].comodel_name].sudo()
+        for child_vals in vals_list:
+            Child.create(dict(child_vals, order_id=rec.id))
+    return rec
+
+
+def ingest_batched(env, data):
+    return env['grab.order'].sudo()._upsert_many_from_grab_json([data])
+
+
+def run(env):
+    seq = 0
+    print('%-8s %6s %8s %8s %10s' % ('mode', 'lines', 'inserts', 'queries', 'median ms'))
+    for n_lines in SIZES:
+        for label, ingest in (('per-row', ingest_per_row), ('batched', ingest_batched)):
+            timings, counts = [], None
+            for _r in range(ROUNDS):
+                seq += 1
+                data = make_order('BENCH-%06d' % seq, n_lines)
+                with count_queries() as counts:
+                    start = time.perf_counter()
+                    ingest(env, data)
+                    env.flush_all()
+                    timings.append((time.perf_counter() - start) * 1000)
+                env.invalidate_all()
+            print('%-8s %6d %8d %8d %10.2f' % (label, n_lines, counts['insert'], counts['total'],
+                                                statistics.median(timings)))
+    env.cr.rollback()
+
+
+run(env)  # noqa: F821  (provided by odoo-bin shell)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: grab_order dashboard queries with raw_json inline and only grab_order_id indexed
+(old layout) vs. raw payload in a side table plus composite indexes on the hot filters (new layout).
+
+Needs PostgreSQL and psycopg2; works on throw-away tables in a scratch schema, no Odoo required:
+    python3 scripts/benchmark_order_storage.py "dbname=bench" [rows]
+
+rows defaults to 1,000,000. Prints table / index sizes and the median execution time of each
+dashboard query (EXPLAIN ANALYZE), then drops the scratch schema.
+"""
+
+import statistics
+import sys
+
+import psycopg2
+
+ROWS = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000_000
+ROUNDS = 5
+SCHEMA = 'grab_bench'
+
+# ~3 KB per order, close to a real SubmitOrder payload with a handful of items
+RAW_JSON = """jsonb_build_object(
+    'orderID', 'GF-' || g,
+    'items', (SELECT jsonb_agg(jsonb_build_object('id', 'ITEM-' || i, 'name', repeat('x', 40),
+                                                  'quantity', 1, 'price', 500, 'modifiers', '[]'::jsonb))
+                FROM generate_series(1, 12) i),
+    'receiver', jsonb_build_object('name', 'Customer ' || g, 'address', repeat('addr ', 30)),
+    'price', jsonb_build_object('subtotal', 6000, 'deliveryFee', 300))"""
+
+COMMON_COLUMNS = """
+    id serial PRIMARY KEY,
+    grab_order_id varchar NOT NULL,
+    merchant_id varchar,
+    order_state varchar,
+    order_time timestamp,
+    receiver jsonb,
+    price_info jsonb,
+    feature_flags jsonb"""
+
+HOT_COLUMNS = 'grab_order_id, merchant_id, order_state, order_time, receiver, price_info, feature_flags'
+HOT_VALUES = """
+    'GF-' || g,
+    'MEX-' || (g %% 30),
+    (ARRAY['DELIVERED','COLLECTED','DRIVER_ALLOCATED','CANCELLED','FAILED'])[1 + g %% 5],
+    timestamp '2025-01-01' + (g * interval '10 seconds'),
+    jsonb_build_object('name', 'Customer ' || g),
+    jsonb_build_object('subtotal', 6000),
+    '{}'::jsonb"""
+
+QUERIES = {
+    'merchant + last 7 days': """
+        SELECT id, grab_order_id, order_state, order_time FROM {t}
+         WHERE merchant_id = 'MEX-7' AND order_time >= timestamp '2025-04-01' - interval '7 days'
+           AND order_time < timestamp '2025-04-01'
+         ORDER BY order_time DESC LIMIT 80""",
+    'state count per merchant (1 day)': """
+        SELECT merchant_id, order_state, count(*) FROM {t}
+         WHERE order_time >= timestamp '2025-03-01' AND order_time < timestamp '2025-03-02'
+         GROUP BY merchant_id, order_state""",
+    'open orders by state': """
+        SELECT id, grab_order_id, order_time FROM {t}
+         WHERE order_state = 'DRIVER_ALLOCATED' ORDER BY order_time DESC LIMIT 80""",
+    'merchant + state + time': """
+        SELECT id FROM {t}
+         WHERE merchant_id = 'MEX-3' AND order_state = 'COLLECTED'
+         ORDER BY order_time DESC LIMIT 80""",
+}
+
+
+def setup(cr):
+    cr.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+    # old layout: raw_json inline, only grab_order_id indexed
+    cr.execute(f"CREATE TABLE {SCHEMA}.order_old ({COMMON_COLUMNS}, raw_json jsonb)")
+    cr.execute(f"""INSERT INTO {SCHEMA}.order_old ({HOT_COLUMNS}, raw_json)
+                   SELECT {HOT_VALUES}, {RAW_JSON} FROM generate_series(1, %s) g""", (ROWS,))
+    cr.execute(f"CREATE INDEX ON {SCHEMA}.order_old (grab_order_id)")
+
+    # new layout: hot columns only + composite indexes, raw payload in a side table
+    cr.execute(f"CREATE TABLE {SCHEMA}.order_new ({COMMON_COLUMNS})")
+    cr.execute(f"""INSERT INTO {SCHEMA}.order_new ({HOT_COLUMNS})
+                   SELECT {HOT_VALUES} FROM generate_series(1, %s) g""", (ROWS,))
+    cr.execute(f"CREATE TABLE {SCHEMA}.order_raw (order_id int PRIMARY KEY, payload jsonb)")
+    cr.execute(f"INSERT INTO {SCHEMA}.order_raw SELECT id, raw_json FROM {SCHEMA}.order_old")
+    for cols in ('grab_order_id', 'order_time', 'merchant_id, order_time DESC',
+                 'order_state, order_time DESC', 'merchant_id, order_state, order_time DESC'):
+        cr.execute(f"CREATE INDEX ON {SCHEMA}.order_new ({cols})")
+    cr.execute(f"VACUUM ANALYZE {SCHEMA}.order_old")
+    cr.execute(f"VACUUM ANALYZE {SCHEMA}.order_new")
+
+
+def size(cr, table):
+    cr.execute("SELECT pg_size_pretty(pg_table_size(%s)), pg_size_pretty(pg_indexes_size(%s))",
+               (f'{SCHEMA}.{table}', f'{SCHEMA}.{table}'))
+    return cr.fetchone()
+
+
+def timed(cr, sql):
+    runs = []
+    for _r in range(ROUNDS):
+        cr.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql)
+        runs.append(cr.fetchone()[0][0]['Execution Time'])
+    return statistics.median(runs)
+
+
+def main():
+    conn = psycopg2.connect(sys.argv[1] if len(sys.argv) > 1 else '')
+    conn.autocommit = True
+    cr = conn.cursor()
+    try:
+        print(f"Building {ROWS:,} orders per layout ...")
+        setup(cr)
+        for table in ('order_old', 'order_new', 'order_raw'):
+            print('%-10s table %10s  indexes %10s' % ((table,) + size(cr, table)))
+        print()
+        print('%-36s %12s %12s' % ('query', 'old ms', 'new ms'))
+        for label, sql in QUERIES.items():
+            old = timed(cr, sql.format(t=f'{SCHEMA}.order_old'))
+            new = timed(cr, sql.format(t=f'{SCHEMA}.order_new'))
+            print('%-36s %12.2f %12.2f' % (label, old, new))
+    finally:
+        cr.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+from . import test_menu_fixes
+from . import test_menu_payload
+from . import test_description_sanitizer
+from . import test_grab_pricing
+from . import test_order_queue
+from . import test_order_item_index
+from . import test_order_upsert
+from . import test_order_pipeline
+from . import test_order_backfill
+from . import test_rate_limit
+from . import test_grab_oauth
+from . import test_grab_http
+from . import test_outbox
+from . import test_order_mark_bulk
+from . import test_order_raw
+from . import test_order_state_events
+from . import test_webhook_journal
+from . import test_webhook_idempotency
+from . import test_product_grab_sync
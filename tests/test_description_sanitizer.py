@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Description sanitizer shared by grab.menu.item.website_description and GetMenu
+"""
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.odoo_grab_integration.utils import description_sanitizer as sanitizer
+
+
+class TestDescriptionSanitizer(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        sanitizer.cache_clear()
+
+    def test_strip_html(self):
+        self.assertEqual(
+            sanitizer.strip_html('<p style="x">Teh&nbsp;Tarik &amp;\n <b>Kaya</b> toast</p>'),
+            'Teh Tarik & Kaya toast')
+        self.assertEqual(sanitizer.strip_html('junk> Plain text <br'), 'Plain text')
+        self.assertEqual(sanitizer.strip_html(''), '')
+
+    def test_stray_brackets_match_legacy(self):
+        # 与旧的 5 次 re.sub 逐字一致
+        self.assertEqual(sanitizer.strip_html('Spicy level <3 and <b>hot</b>'), 'Spicy level')
+        self.assertEqual(sanitizer.strip_html('Serves 2 > 10cm wide <i>plate</i>'), '10cm wide plate')
+        self.assertEqual(sanitizer.strip_html('<p>Nasi lemak with sambal</p><span class="x'),
+                         'Nasi lemak with sambal')
+        self.assertEqual(sanitizer.strip_html('a<b<c>d'), 'a')
+
+    def test_javascript_and_code_are_dropped(self):
+        self.assertEqual(sanitizer.clean_description('<script>document.title = "x"</script>'), '')
+        self.assertEqual(sanitizer.clean_description('<p>Contains nuts; may contain dairy</p>'), '')
+        self.assertEqual(sanitizer.clean_description('<p>Short</p>'), '')
+
+    def test_pick_description_priority(self):
+        values = {
+            'website_description': '<p>Short</p>',
+            'description_sale': '<p>Sales description for customers</p>',
+            'description': 'Main product description',
+        }
+        self.assertEqual(sanitizer.pick_description(values), 'Sales description for customers')
+
+    def test_identical_text_cleaned_once(self):
+        for _i in range(5):
+            sanitizer.clean_description('<p>Kopi O Kosong, black coffee</p>')
+        info = sanitizer.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.hits, 4)
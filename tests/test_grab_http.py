@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Shared outbound HTTP layer: per-endpoint timeouts and latency histograms
+"""
+
+import json
+from unittest.mock import Mock, patch
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils import grab_http
+
+
+class TestGrabHttp(TransactionCase):
+
+    def test_latency_histogram(self):
+        stats = grab_http.LatencyStats(buckets=(100, 1000))
+        stats.observe('order_mark', 40, 204)
+        stats.observe('order_mark', 400, 204)
+        stats.observe('order_mark', 4000, 503)
+        snap = stats.snapshot()['order_mark']
+        self.assertEqual(snap['count'], 3)
+        self.assertEqual(snap['histogram_ms'], {'<=100': 1, '<=1000': 1, '>1000': 1})
+        self.assertEqual(snap['status'], {'204': 2, '503': 1})
+        self.assertEqual(snap['max_ms'], 4000)
+
+    def test_timeouts(self):
+        self.assertEqual(grab_http._timeout_for('order_mark'), grab_http.DEFAULT_TIMEOUTS['order_mark'])
+        self.assertEqual(grab_http._timeout_for('unknown'), grab_http.FALLBACK_TIMEOUT)
+        self.env['ir.config_parameter'].sudo().set_param(
+            'grab.http_timeouts', json.dumps({'order_mark': 3, 'list_orders': [2, 30]}))
+        self.assertEqual(grab_http._timeout_for('order_mark', self.env), (5, 3.0))
+        self.assertEqual(grab_http._timeout_for('list_orders', self.env), (2, 30))
+
+    def test_shared_session(self):
+        session = grab_http.get_session()
+        self.assertIs(session, grab_http.get_session())
+        adapter = session.get_adapter('https://partner-api.grab.com/')
+        self.assertEqual(adapter._pool_maxsize, grab_http.POOL_MAXSIZE)
+        retry = adapter.max_retries
+        self.assertIn(429, retry.status_forcelist)
+        # 非幂等的 POST / PUT 不按状态码或读超时重试，交给发件箱
+        self.assertTrue(retry.is_retry('GET', 503))
+        self.assertFalse(retry.is_retry('POST', 503))
+        self.assertFalse(retry.is_retry('PUT', 429, has_retry_after=True))
+
+    def test_retry_wait_capped(self):
+        retry = grab_http.CappedRetry(total=10, backoff_factor=10)
+        for _i in range(6):
+            retry = retry.increment('GET', '/x')
+        self.assertEqual(retry.get_backoff_time(), grab_http.MAX_RETRY_WAIT)
+        response = Mock(headers={'Retry-After': '3600'})
+        response.getheader.return_value = '3600'    # urllib3 1.26
+        with patch.object(grab_http.time, 'sleep') as sleep:
+            self.assertTrue(retry.sleep_for_retry(response))
+        sleep.assert_called_once_with(grab_http.MAX_RETRY_WAIT)
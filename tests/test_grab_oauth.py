@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Process-wide Grab token cache: cache hits, single-flight refresh, refresh ahead of expiry, refresh on 401
+"""
+
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from odoo.exceptions import UserError
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils import grab_http, grab_oauth
+from odoo.addons.odoo_grab_integration.utils.grab_oauth import TokenCache
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenCache(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+        self.cache = TokenCache(refresh_ahead=300, min_ttl=60, clock=self.clock)
+        self.loads = 0
+
+    def _load(self, key):
+        self.loads += 1
+        return 'tok-%s' % self.loads, self.clock.now + 3600
+
+    def test_hits_after_first_load(self):
+        for _i in range(10):
+            self.assertEqual(self.cache.get('k', self._load)[0], 'tok-1')
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.cache.stats['refreshes'], 1)
+        self.assertEqual(self.cache.stats['hits'], 9)
+
+    def test_expired_token_reloads(self):
+        self.cache.get('k', self._load)
+        self.clock.now += 3600 - 30
+        self.assertEqual(self.cache.get('k', self._load)[0], 'tok-2')
+
+    def test_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_load(key):
+            started.set()
+            release.wait(5)
+            return self._load(key)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.cache.get('k', slow_load)[0]))
+                   for _i in range(8)]
+        for t in threads:
+            t.start()
+        started.wait(5)
+        time.sleep(0.05)
+        release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(results, ['tok-1'] * 8)
+
+    def test_refresh_ahead_in_background(self):
+        self.cache.get('k', self._load)
+        self.clock.now += 3600 - 200
+        done = threading.Event()
+
+        def load(key):
+            result = self._load(key)
+            done.set()
+            return result
+
+        # 仍在有效期内：立即返回旧 token，后台刷新
+        self.assertEqual(self.cache.get('k', load)[0], 'tok-1')
+        self.assertTrue(done.wait(5))
+        for _i in range(50):
+            if self.cache.get('k', load)[0] == 'tok-2':
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.get('k', load)[0], 'tok-2')
+        self.assertEqual(self.cache.stats['background_refreshes'], 1)
+
+    def test_seed_and_invalidate(self):
+        self.cache.seed('k', 'stored', self.clock.now + 3600)
+        self.assertEqual(self.cache.get('k', self._load)[0], 'stored')
+        self.assertEqual(self.loads, 0)
+        self.cache.invalidate('k')
+        self.assertEqual(self.cache.get('k', self._load)[0], 'tok-1')
+
+    def test_invalidate_only_rejected_token(self):
+        self.cache.get('k', self._load)
+        # 别的线程已经换上了新 token：作废旧 token 不影响它
+        self.cache.invalidate('k', 'tok-0')
+        self.assertEqual(self.cache.get('k', self._load)[0], 'tok-1')
+        self.cache.invalidate('k', 'tok-1')
+        self.assertEqual(self.cache.get('k', self._load)[0], 'tok-2')
+        self.assertEqual(self.cache.stats['invalidations'], 1)
+
+
+class TestTokenRejected(TransactionCase):
+
+    def test_request_retried_once_with_new_token(self):
+        session = Mock()
+        session.request.side_effect = [Mock(status_code=401), Mock(status_code=204)]
+        with patch.object(grab_http, 'get_session', return_value=session), \
+                patch.object(grab_oauth, 'grab_invalidate_access_token') as invalidate, \
+                patch.object(grab_oauth, 'grab_get_access_token', return_value='fresh'):
+            resp = grab_http.grab_request('POST', 'https://example.test/mark', 'order_mark', env=self.env,
+                                          headers={'Authorization': 'Bearer stale'}, json={})
+        self.assertEqual(resp.status_code, 204)
+        invalidate.assert_called_once_with(self.env, 'stale')
+        self.assertEqual(session.request.call_args.kwargs['headers']['Authorization'], 'Bearer fresh')
+
+    def test_no_retry_without_env(self):
+        session = Mock()
+        session.request.return_value = Mock(status_code=401)
+        with patch.object(grab_http, 'get_session', return_value=session):
+            resp = grab_http.grab_request('GET', 'https://example.test/orders', 'list_orders',
+                                          headers={'Authorization': 'Bearer stale'})
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(session.request.call_count, 1)
+
+    def test_token_response_checked(self):
+        for body in ({'expires_in': 3600}, {'access_token': 'tok'}, {}):
+            resp = Mock(status_code=200)
+            resp.json.return_value = body
+            with patch.object(grab_oauth, 'grab_request', return_value=resp), \
+                    self.assertRaises(UserError):
+                grab_oauth._request_token('cid', 'secret', 'scope', 'https://example.test/token')
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk tax-inclusive pricing: known cent values per tax setup, and GetMenu uses them when
+grab.price_tax_included is on and the item has no Grab-specific price
+"""
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils.grab_menu_payload import _build_payload
+from odoo.addons.odoo_grab_integration.utils.grab_pricing import tax_included_cents
+
+
+class TestGrabPricing(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        Tax = self.env['account.tax']
+        self.tax_9 = Tax.create({'name': 'GST 9%', 'amount': 9.0, 'amount_type': 'percent', 'type_tax_use': 'sale'})
+        self.tax_7_incl = Tax.create({
+            'name': 'GST 7% incl', 'amount': 7.0, 'amount_type': 'percent', 'type_tax_use': 'sale',
+            'price_include_override': 'tax_included',
+        })
+        self.tax_fixed = Tax.create({'name': 'Bag fee', 'amount': 0.05, 'amount_type': 'fixed', 'type_tax_use': 'sale'})
+
+    def _products(self, rows):
+        return self.env['product.template'].create([{
+            'name': name, 'list_price': price, 'taxes_id': [(6, 0, taxes.ids)],
+        } for name, price, taxes in rows])
+
+    def test_known_cents(self):
+        no_tax = self.env['account.tax']
+        # (名称, 标价, 税, 含税价：分)
+        cases = [
+            ('excl 4.99', 4.99, self.tax_9, 544),
+            ('excl 4.99 again', 4.99, self.tax_9, 544),    # 同组同价只算一次，结果相同
+            ('excl 1.00', 1.0, self.tax_9, 109),
+            ('excl 0.01', 0.01, self.tax_9, 1),
+            ('incl 4.99', 4.99, self.tax_7_incl, 499),
+            ('excl + fixed', 10.0, self.tax_9 | self.tax_fixed, 1095),
+            ('no tax', 3.35, no_tax, 335),
+            ('zero', 0.0, self.tax_9, 0),
+        ]
+        products = self._products([(name, price, taxes) for name, price, taxes, _cents in cases])
+        cents = tax_included_cents(products)
+        for pt, (name, _price, _taxes, expected) in zip(products, cases):
+            self.assertEqual(cents[pt.id], expected, name)
+
+    def test_get_menu_uses_tax_included_price(self):
+        menu = self.env['grab.menu'].create({'name': 'Tax Menu', 'merchant_id': 'MEX-TAX'})
+        section = self.env['grab.menu.section'].create({'name': 'Section', 'menu_id': menu.id})
+        category = self.env['grab.menu.category'].create({'name': 'Category', 'section_id': section.id})
+        products = self._products([
+            ('Taxed', 4.99, self.tax_9),
+            ('Bagged', 10.0, self.tax_9 | self.tax_fixed),
+            ('Grab priced', 4.99, self.tax_9),
+        ])
+        self.env['grab.menu.item'].create([{'product_id': p.id, 'category_id': category.id} for p in products])
+        products[2].grab_menu_item_ids.write({'use_grab_price': True, 'grab_price': 5.0, 'gst_rate': 9.0})
+
+        def prices():
+            items = _build_payload(menu, "", "")['categories'][0]['items']
+            return {it['name']: it['price'] for it in items}
+
+        icp = self.env['ir.config_parameter'].sudo()
+        icp.set_param('grab.price_tax_included', '0')
+        self.assertEqual(prices(), {'Taxed': 499, 'Bagged': 1000, 'Grab priced': 545})
+
+        icp.set_param('grab.price_tax_included', '1')
+        self.assertEqual(prices(), {'Taxed': 544, 'Bagged': 1095, 'Grab priced': 545})
@@ -80,6 +80,17 @@ class TestGrabMenuFixes(TransactionCase):
         # Should clean HTML tags
         self.assertEqual(self.grab_item.website_description, 'Sales description with HTML tags')
     
+    def test_stored_fields_follow_product_changes(self):
+        """Test that the stored website_description and photo_url are recomputed when the product changes"""
+        self.product.write({'website_description': '<p>Stored <b>website</b> description</p>'})
+        self.assertEqual(self.grab_item.website_description, 'Stored website description')
+
+        self.assertEqual(self.grab_item.photo_url, '')
+        self.product.image_1920 = (
+            'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+        )
+        self.assertEqual(self.grab_item.photo_url, f'/web/image/product.template/{self.product.id}/image_1920')
+
     @patch('odoo.http.request')
     def test_tax_inclusion_parameter(self, mock_request):
         """Test that the system parameter for tax inclusion is set correctly"""
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+GetMenu payload builder: batch loading keeps the SQL count independent of menu size,
+streamed output matches the in-memory payload
+"""
+
+from odoo.tests.common import TransactionCase
+
+import gzip
+import json
+from unittest.mock import patch
+
+from odoo.addons.odoo_grab_integration.utils.grab_http_stream import encode_chunks, negotiate_encoding
+from odoo.addons.odoo_grab_integration.utils.grab_menu_payload import _build_payload, _iter_payload_json
+
+
+class TestGrabMenuPayload(TransactionCase):
+
+    def _create_menu(self, item_count):
+        menu = self.env['grab.menu'].create({
+            'name': f'Menu {item_count}',
+            'merchant_id': f'MERCHANT-{item_count}',
+        })
+        section = self.env['grab.menu.section'].create({'name': 'Section', 'menu_id': menu.id})
+        category = self.env['grab.menu.category'].create({'name': 'Category', 'section_id': section.id})
+        products = self.env['product.template'].create([{
+            'name': f'Product {i}',
+            'list_price': 1.0 + i,
+            'description_sale': f'Sales description number {i}',
+        } for i in range(item_count)])
+        items = self.env['grab.menu.item'].create([{
+            'product_id': p.id,
+            'category_id': category.id,
+        } for p in products])
+        groups = self.env['grab.menu.modifier.group'].create([{
+            'name': 'Size',
+            'item_id': it.id,
+        } for it in items])
+        self.env['grab.menu.modifier'].create([{
+            'name': 'Large',
+            'group_id': g.id,
+            'price': 0.5,
+        } for g in groups])
+        return menu
+
+    def test_payload_content(self):
+        menu = self._create_menu(3)
+        payload = _build_payload(menu, "", "")
+
+        self.assertEqual(payload['merchantID'], 'MERCHANT-3')
+        items = payload['categories'][0]['items']
+        self.assertEqual(len(items), 3)
+        self.assertEqual(items[0]['name'], 'Product 0')
+        self.assertEqual(items[0]['price'], 100)
+        self.assertEqual(items[0]['description'], 'Sales description number 0')
+        modifier_group = items[0]['modifierGroups'][0]
+        self.assertEqual(modifier_group['selectionRangeMax'], 1)
+        self.assertEqual(modifier_group['modifiers'][0]['price'], 50)
+
+    def test_query_count_independent_of_menu_size(self):
+        small, large = self._create_menu(5), self._create_menu(50)
+        # warm up ormcaches (config parameters, access rules) so both builds start equal
+        _build_payload(small, "", "")
+        small_stats, large_stats = {}, {}
+        _build_payload(small, "", "", stats=small_stats)
+        _build_payload(large, "", "", stats=large_stats)
+
+        self.assertEqual(large_stats['items'], 50)
+        self.assertEqual(small_stats['queries'], large_stats['queries'])
+
+    def test_image_url_from_attachment_metadata(self):
+        menu = self._create_menu(2)
+        product = menu.section_ids.category_ids.item_ids[0].product_id
+        product.image_1920 = (
+            'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+        )
+        self.env['ir.config_parameter'].sudo().set_param('web.base.url', 'https://shop.example.com')
+
+        payload = _build_payload(menu, "", "")
+        urls = {it['name']: it['imageUrl'] for it in payload['categories'][0]['items']}
+        self.assertTrue(urls[product.name].startswith(
+            f'https://shop.example.com/web/image/product.template/{product.id}/image_1920/product.jpg?unique='))
+        self.assertEqual(urls['Product 1'], '')
+
+    def test_streamed_json_matches_payload(self):
+        menu = self._create_menu(4)
+        expected = json.dumps(_build_payload(menu, "M", "P"), ensure_ascii=False)
+        chunks = list(_iter_payload_json(menu, "M", "P"))
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(''.join(chunks), expected)
+
+        empty = self.env['grab.menu'].create({'name': 'Empty', 'merchant_id': 'EMPTY'})
+        self.assertEqual(''.join(_iter_payload_json(empty, "", "")),
+                         json.dumps(_build_payload(empty, "", ""), ensure_ascii=False))
+
+        compressed = b''.join(encode_chunks(chunks, 'gzip'))
+        self.assertEqual(gzip.decompress(compressed).decode('utf-8'), expected)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(negotiate_encoding('gzip;q=0, identity'))
+        self.assertIsNone(negotiate_encoding(''))
+
+    def test_content_hash_only_changes_with_content(self):
+        menu = self._create_menu(2)
+        menu._rebuild_payload_snapshot()
+        etag, version, content_hash = menu.payload_etag, menu.payload_version, menu.payload_hash
+        self.assertEqual(etag, f'"{content_hash[:32]}"')
+
+        menu._mark_payload_dirty()
+        menu._rebuild_payload_snapshot()
+        self.assertEqual((menu.payload_etag, menu.payload_version), (etag, version))
+
+        menu.section_ids.category_ids.item_ids[0].product_id.list_price = 42.0
+        menu._get_payload_snapshot()
+        self.assertNotEqual(menu.payload_hash, content_hash)
+        self.assertEqual(menu.payload_version, version + 1)
+
+    def test_dirty_snapshot_served_without_write(self):
+        menu = self._create_menu(2)
+        menu._rebuild_payload_snapshot()
+        snapshot, version = menu.payload_snapshot, menu.payload_version
+        Cron = type(self.env['ir.cron'])
+        with patch.object(Cron, '_trigger', autospec=True) as trigger:
+            # 内容没变：现算的与快照一致，可以继续用原来的 ETag
+            menu._mark_payload_dirty()
+            body, current = menu._get_payload_body()
+            self.assertEqual(body.decode('utf-8'), snapshot)
+            self.assertTrue(current)
+
+            menu.section_ids.category_ids.item_ids[0].product_id.list_price = 42.0
+            body, current = menu._get_payload_body()
+            self.assertFalse(current)
+            self.assertEqual(body.decode('utf-8'),
+                             json.dumps(_build_payload(menu, "", ""), ensure_ascii=False))
+            # 请求里不写菜单行，提交后只排一次重建
+            self.assertEqual((menu.payload_snapshot, menu.payload_version), (snapshot, version))
+            self.assertTrue(menu.payload_dirty)
+            trigger.assert_not_called()
+            self.env.cr.postcommit.run()
+        self.assertEqual([call.args[0] for call in trigger.call_args_list],
+                         [self.env.ref('odoo_grab_integration.ir_cron_grab_menu_payload_snapshot')])
+
+    def test_push_skipped_when_unchanged(self):
+        menu = self._create_menu(1)
+        Outbox = self.env['grab.outbox']
+        target = 'odoo.addons.odoo_grab_integration.models.grab_outbox.push_menu_notification'
+        rates = 'odoo.addons.odoo_grab_integration.models.grab_outbox.ENDPOINT_RATES'
+        with patch(target, return_value=(204, '')) as push, \
+                patch.dict(rates, {'menu_notification': 0}):
+            menu.push_menu_to_grab()
+            Outbox._cron_drain(auto_commit=False)
+            self.assertEqual(menu.last_pushed_payload_hash, menu.payload_hash)
+            menu.push_menu_to_grab()
+            Outbox._cron_drain(auto_commit=False)
+            self.assertEqual(push.call_count, 1)
+            menu.with_context(force_push=True).push_menu_to_grab()
+            Outbox._cron_drain(auto_commit=False)
+            self.assertEqual(push.call_count, 2)
+
+    def test_snapshot_outdated_by_related_data(self):
+        menu = self._create_menu(1)
+        product = menu.section_ids.category_ids.item_ids.product_id
+
+        def rebuilt():
+            menu._rebuild_payload_snapshot()
+            self.assertFalse(menu.payload_dirty)
+
+        # 影响整份 payload 的系统参数
+        rebuilt()
+        self.env['ir.config_parameter'].sudo().set_param('grab.price_tax_included', '1')
+        self.assertTrue(menu.payload_dirty)
+
+        # 产品用到的税
+        tax = self.env['account.tax'].create({'name': 'GST 9%', 'amount': 9.0, 'type_tax_use': 'sale'})
+        product.taxes_id = tax
+        rebuilt()
+        tax.amount = 10.0
+        self.assertTrue(menu.payload_dirty)
+
+        # 变体图片（写在 product.product 上，经由 ir.attachment）
+        rebuilt()
+        product.product_variant_id.image_variant_1920 = (
+            'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+        )
+        self.assertTrue(menu.payload_dirty)
+
+        # 与菜单无关的参数不影响快照
+        rebuilt()
+        self.env['ir.config_parameter'].sudo().set_param('grab.unrelated_param', 'x')
+        self.assertFalse(menu.payload_dirty)
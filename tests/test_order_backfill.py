@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+List Orders backfill: concurrent page fetches, per-page checkpoints, resume after failure
+"""
+
+import time
+from datetime import date
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils import grab_oauth
+
+
+class TestGrabOrderBackfill(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        # 有效的缓存 token，_run 不会去请求 Grab IdP
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('grab.oauth.token', 'test-token')
+        ICP.set_param('grab.oauth.token_exp', str(int(time.time()) + 3600))
+        ICP.set_param('grab.list_orders_rate', '0')
+        self.job = self.env['grab.order.backfill'].create({
+            'date_from': date(2025, 6, 1),
+            'date_to': date(2025, 6, 2),
+            'merchant_ids': 'MEX-1, MEX-2',
+            'max_workers': 3,
+        })
+        self.calls = []
+        self.fail_once = set()
+
+    def _fetch(self, token, merchant_id, day, page):
+        self.calls.append((merchant_id, day, page))
+        if (merchant_id, day, page) in self.fail_once:
+            self.fail_once.discard((merchant_id, day, page))
+            raise ConnectionError('boom')
+        orders = [{'orderID': '%s-%s-%s' % (merchant_id, day, page), 'merchantID': merchant_id, 'items': []}]
+        return orders, page < 1  # 每个（商户, 日期）两页
+
+    def test_backfill_and_resume(self):
+        self.fail_once.add(('MEX-2', date(2025, 6, 2), 1))
+        self.job._run(auto_commit=False, fetch=self._fetch)
+        self.assertEqual(self.job.state, 'running')
+        self.assertEqual(self.job.page_count, 7)
+        self.assertEqual(len(self.job.page_ids.filtered(lambda p: p.state == 'failed')), 1)
+
+        self.calls.clear()
+        self.job._run(auto_commit=False, fetch=self._fetch)
+        self.assertEqual(self.calls, [('MEX-2', date(2025, 6, 2), 1)])
+        self.assertEqual(self.job.state, 'done')
+        self.assertEqual(self.job.order_count, 8)
+        self.assertEqual(self.env['grab.order'].search_count([('grab_order_id', '=like', 'MEX-%')]), 8)
+
+    def test_persistently_failing_page_fails_job(self):
+        self.env['ir.config_parameter'].sudo().set_param('grab.backfill_max_page_failures', '3')
+        bad = ('MEX-1', date(2025, 6, 1), 1)
+
+        def fetch(token, merchant_id, day, page):
+            if (merchant_id, day, page) == bad:
+                self.calls.append(bad)
+                raise ConnectionError('400 bad date')
+            return self._fetch(token, merchant_id, day, page)
+
+        for _i in range(5):
+            if self.job.state != 'running':
+                break
+            self.job._run(auto_commit=False, fetch=fetch)
+        # 第三次失败后不再调度这一页，任务失败，错误里写明是哪一页
+        self.assertEqual(self.calls.count(bad), 3)
+        self.assertEqual(len(self.job.page_ids.filtered(lambda p: p.state == 'failed')), 3)
+        self.assertEqual(self.job.state, 'failed')
+        self.assertIn('MEX-1 2025-06-01 page 1', self.job.error)
+        self.assertNotIn(bad, self.job._next_pages())
+        self.assertEqual(self.job.page_count, 7)
+
+        # 手动重新开始：失败次数清零
+        self.job.action_start()
+        self.assertIn(bad, self.job._next_pages())
+
+    def test_rejected_token_refreshed_once(self):
+        def fetch(token, merchant_id, day, page):
+            if token == 'test-token':
+                raise grab_oauth.TokenRejected(token, '401 unauthorized')
+            return self._fetch(token, merchant_id, day, page)
+
+        with patch.object(grab_oauth, 'grab_invalidate_access_token') as invalidate, \
+                patch.object(grab_oauth, 'grab_get_access_token', side_effect=['test-token', 'fresh']):
+            self.job._run(auto_commit=False, fetch=fetch)
+        invalidate.assert_called_once_with(self.job.env, 'test-token')
+        self.assertEqual(self.job.state, 'done')
+        self.assertEqual(self.job.page_count, 8)
+        self.assertFalse(self.job.page_ids.filtered(lambda p: p.state == 'failed'))
+
+    def test_wizard_creates_job(self):
+        wizard = self.env['grab.order.sync.wizard'].create({
+            'sync_date': date(2025, 6, 1), 'date_to': date(2025, 6, 3), 'merchant_ids': 'MEX-9',
+        })
+        action = wizard.action_backfill()
+        job = self.env['grab.order.backfill'].browse(action['res_id'])
+        self.assertEqual(job.state, 'running')
+        self.assertEqual(len(job._next_pages()), 3)
+
+    def test_active_merchants_and_throughput(self):
+        Menu = self.env['grab.menu']
+        Menu.search([]).write({'integration_status': 'INACTIVE'})
+        Menu.create({'name': 'Outlet A', 'merchant_id': 'MEX-A', 'integration_status': 'ACTIVE'})
+        Menu.create({'name': 'Outlet A (2)', 'merchant_id': 'MEX-A', 'integration_status': 'ACTIVE'})
+        Menu.create({'name': 'Outlet B', 'merchant_id': 'MEX-B'})
+        Menu.create({'name': 'Outlet C', 'merchant_id': 'MEX-C', 'integration_status': 'SUSPENDED'})
+        self.assertEqual(Menu._active_merchant_ids(), ['MEX-A', 'MEX-B'])
+
+        job = self.env['grab.order.backfill'].create({'date_from': date(2025, 6, 1), 'date_to': date(2025, 6, 1)})
+        self.assertEqual(job.merchant_ids, 'MEX-A,MEX-B')
+        job._run(auto_commit=False, fetch=self._fetch)
+        stats = job._merchant_stats()
+        self.assertEqual(set(stats), {'MEX-A', 'MEX-B'})
+        self.assertEqual(stats['MEX-A']['pages'], 2)
+        self.assertEqual(stats['MEX-A']['orders'], 2)
+        self.assertIn('MEX-B: 2 pages, 2 orders', job.throughput_summary)
+
+    def test_job_locked_by_another_worker_is_skipped(self):
+        lock = "SELECT pg_try_advisory_lock(hashtext('grab.order.backfill'), %s)"
+        unlock = "SELECT pg_advisory_unlock(hashtext('grab.order.backfill'), %s)"
+        self.job.write({'state': 'running'})
+        Backfill = type(self.job)
+        with self.env.registry.cursor() as other, \
+                patch.object(Backfill, '_run', autospec=True) as run:
+            # 另一个 worker 正在跑（会话级锁跨越它的中间提交）
+            other.execute(lock, (self.job.id,))
+            self.assertTrue(other.fetchone()[0])
+            self.env['grab.order.backfill']._cron_run_backfills(auto_commit=False)
+            run.assert_not_called()
+
+            other.execute(unlock, (self.job.id,))
+            self.env['grab.order.backfill']._cron_run_backfills(auto_commit=False)
+            self.assertEqual([call.args[0] for call in run.call_args_list], [self.job])
+
+            # 跑完后锁已释放，其他 worker 可以接手
+            other.execute(lock, (self.job.id,))
+            self.assertTrue(other.fetchone()[0])
+            other.execute(unlock, (self.job.id,))
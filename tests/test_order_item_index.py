@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Order line matching goes through an in-memory grab.menu.item index
+"""
+
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.odoo_grab_integration.models.grab_menu import (
+    ITEM_INDEX_DIRTY, ITEM_INDEX_LOCAL, ITEM_INDEX_VERSION,
+)
+
+
+class TestGrabItemIndex(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tea = self.env['product.template'].create({'name': 'Teh Tarik', 'default_code': 'TEH-01'})
+        self.kopi = self.env['product.template'].create({'name': 'Kopi O', 'barcode': '8888000000017'})
+        MenuItem = self.env['grab.menu.item']
+        self.tea_item = MenuItem.create({'product_id': self.tea.id})
+        self.kopi_item = MenuItem.create({'product_id': self.kopi.id, 'grab_item_code': 'ITEM-KOPI'})
+
+    def test_resolution_order(self):
+        MenuItem = self.env['grab.menu.item']
+        self.assertEqual(MenuItem._resolve_grab_item('ITEM-KOPI', ''), self.kopi_item)
+        self.assertEqual(MenuItem._resolve_grab_item('TEH-01', ''), self.tea_item)
+        self.assertEqual(MenuItem._resolve_grab_item('', 'TEH-01'), self.tea_item)
+        self.assertEqual(MenuItem._resolve_grab_item('UNKNOWN', '', '8888000000017'), self.kopi_item)
+        self.assertFalse(MenuItem._resolve_grab_item('UNKNOWN', ''))
+
+    def test_no_queries_once_built(self):
+        MenuItem = self.env['grab.menu.item']
+        MenuItem._resolve_grab_item('ITEM-KOPI', '')
+        before = MenuItem._grab_item_index_stats()
+        with self.assertQueryCount(0):
+            for _i in range(20):
+                MenuItem._resolve_grab_item('TEH-01', 'GRAB-1')
+        after = MenuItem._grab_item_index_stats()
+        self.assertEqual(after['hits'] - before['hits'], 20)
+        self.assertEqual(after['builds'], before['builds'])
+
+    def test_invalidated_on_write(self):
+        MenuItem = self.env['grab.menu.item']
+        self.assertEqual(MenuItem._resolve_grab_item('TEH-02', ''), MenuItem)
+        self.tea.product_variant_id.default_code = 'TEH-02'
+        self.assertEqual(MenuItem._resolve_grab_item('TEH-02', ''), self.tea_item)
+        self.tea_item.grab_item_code = 'ITEM-TEH'
+        self.assertEqual(MenuItem._resolve_grab_item('ITEM-TEH', ''), self.tea_item)
+
+    def test_invalidation_scoped_to_index(self):
+        MenuItem = self.env['grab.menu.item']
+        MenuItem._resolve_grab_item('ITEM-KOPI', '')
+        builds = MenuItem._grab_item_index_stats()['builds']
+        registry = type(self.env.registry)
+        with patch.object(registry, 'clear_cache') as clear_cache:
+            # 不涉及索引字段的变更：不失效，也不清 ormcache
+            self.tea.product_variant_id.write({'weight': 2.0})
+            self.tea_item.write({'sequence': 5})
+            MenuItem._resolve_grab_item('TEH-01', '')
+            self.assertEqual(MenuItem._grab_item_index_stats()['builds'], builds)
+
+            self.tea_item.grab_item_code = 'ITEM-TEH'
+            self.assertEqual(MenuItem._resolve_grab_item('ITEM-TEH', ''), self.tea_item)
+        clear_cache.assert_not_called()
+
+    def test_other_worker_change_picked_up_by_version(self):
+        MenuItem = self.env['grab.menu.item']
+        data = self.env.cr.precommit.data
+        data.pop(ITEM_INDEX_DIRTY, None)
+        data.pop(ITEM_INDEX_LOCAL, None)
+        MenuItem._resolve_grab_item('ITEM-KOPI', '')
+        builds = MenuItem._grab_item_index_stats()['builds']
+        MenuItem._resolve_grab_item('ITEM-KOPI', '')
+        self.assertEqual(MenuItem._grab_item_index_stats()['builds'], builds)
+
+        # 其他 worker 提交的变更：下一个事务读到新版本后重建
+        self.env.cr.execute("INSERT INTO grab_menu_item_index_change DEFAULT VALUES")
+        data.pop(ITEM_INDEX_VERSION, None)
+        MenuItem._resolve_grab_item('ITEM-KOPI', '')
+        self.assertEqual(MenuItem._grab_item_index_stats()['builds'], builds + 1)
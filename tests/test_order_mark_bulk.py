@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk mark ready: concurrent sends, per-order results, retryable failures go to the outbox
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+GRAB_ORDER = 'odoo.addons.odoo_grab_integration.models.grab_order'
+
+
+class TestGrabOrderMarkBulk(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('grab.oauth.token', 'test-token')
+        ICP.set_param('grab.oauth.token_exp', str(int(time.time()) + 3600))
+        Order = self.env['grab.order']
+        self.orders = Order.create([{'grab_order_id': 'GF-MARK-%02d' % i} for i in range(40)])
+
+    def test_concurrent_and_per_order_results(self):
+        active = []
+        peak = [0]
+        lock = threading.Lock()
+
+        def send(token, order_id, mark_status, env, timeout):
+            with lock:
+                active.append(order_id)
+                peak[0] = max(peak[0], len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(order_id)
+            if order_id == 'GF-MARK-03':
+                return 400, 'already completed'
+            if order_id == 'GF-MARK-07':
+                return 503, 'unavailable'
+            return 204, ''
+
+        start = time.perf_counter()
+        results = self.orders._push_marks(max_workers=16, send=send)
+        elapsed = time.perf_counter() - start
+
+        self.assertGreater(peak[0], 1)
+        self.assertLess(elapsed, 40 * 0.05)
+        self.assertEqual([r['id'] for r in results], self.orders.ids)
+        by_code = {r['grab_order_id']: r for r in results}
+        self.assertEqual(sum(r['ok'] for r in results), 38)
+        self.assertEqual((by_code['GF-MARK-03']['status'], by_code['GF-MARK-03']['queued']), (400, False))
+        self.assertEqual((by_code['GF-MARK-07']['status'], by_code['GF-MARK-07']['queued']), (503, True))
+        queued = self.env['grab.outbox'].search([('order_id', 'in', self.orders.ids)])
+        self.assertEqual(queued.idempotency_key, 'order_mark:GF-MARK-07:1')
+
+    def test_rejected_token_resent_once(self):
+        tokens = []
+
+        def send(token, order_id, mark_status, env, timeout):
+            tokens.append(token)
+            return (401, 'unauthorized') if token == 'test-token' else (204, '')
+
+        orders = self.orders[:3]
+        with patch(GRAB_ORDER + '.grab_invalidate_access_token') as invalidate, \
+                patch(GRAB_ORDER + '.grab_get_access_token', side_effect=['test-token', 'fresh']):
+            results = orders._push_marks(send=send)
+        invalidate.assert_called_once_with(orders.env, 'test-token')
+        self.assertEqual(sorted(tokens), ['fresh'] * 3 + ['test-token'] * 3)
+        self.assertTrue(all(r['ok'] for r in results))
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Shared order-ingestion pipeline (webhook, List Orders sync, queue consumer)
+"""
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils.grab_order_pipeline import (
+    GrabOrderPipeline, STAGES, SUBMIT_REQUIRED_FIELDS, dt_iso_to_odoo,
+)
+
+
+def _order(order_id, **extra):
+    data = {
+        'orderID': order_id,
+        'shortOrderNumber': order_id[-3:],
+        'merchantID': 'MEX-1',
+        'paymentType': 'CASHLESS',
+        'cutlery': False,
+        'orderTime': '2025-06-01T10:00:00.000Z',
+        'currency': {'code': 'SGD', 'symbol': 'S$', 'exponent': 2},
+        'featureFlags': {},
+        'price': {'subtotal': 500},
+        'items': [{'id': 'ITEM-KOPI', 'quantity': 2, 'price': 250,
+                   'modifiers': [{'id': 'M1', 'price': 50}]}],
+    }
+    data.update(extra)
+    return data
+
+
+class TestGrabOrderPipeline(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        kopi = self.env['product.template'].create({'name': 'Kopi O'})
+        self.kopi_item = self.env['grab.menu.item'].create({'product_id': kopi.id, 'grab_item_code': 'ITEM-KOPI'})
+
+    def test_dt_iso_to_odoo(self):
+        self.assertEqual(dt_iso_to_odoo('2025-06-01T10:00:00.123Z'), '2025-06-01 10:00:00')
+        self.assertEqual(dt_iso_to_odoo('2025-06-01T10:00:00'), '2025-06-01 10:00:00')
+        self.assertFalse(dt_iso_to_odoo(''))
+        self.assertFalse(dt_iso_to_odoo('yesterday'))
+
+    def test_normalize_and_resolve(self):
+        order = GrabOrderPipeline(self.env).run(_order('GF-PIPE-1')).orders
+        line = order.line_ids
+        self.assertEqual(line.product_id, self.kopi_item)
+        self.assertEqual(line.name, 'Kopi O')
+        self.assertEqual(line.price, 2.5)
+        self.assertEqual(line.modifiers[0]['price'], 0.5)
+        self.assertEqual(order.order_time.strftime('%H:%M'), '10:00')
+
+    def test_bulk_rejects_invalid_orders(self):
+        bad = _order('GF-PIPE-BAD')
+        del bad['paymentType']
+        hooked = []
+        pipeline = GrabOrderPipeline(self.env, required=SUBMIT_REQUIRED_FIELDS, post_hooks=[hooked.append])
+        result = pipeline.run(iter([_order('GF-PIPE-2'), bad, _order('GF-PIPE-3')]))
+        self.assertEqual(result.orders.mapped('grab_order_id'), ['GF-PIPE-2', 'GF-PIPE-3'])
+        self.assertEqual(result.errors, [('GF-PIPE-BAD', 'missing_fields', ['paymentType'])])
+        self.assertEqual(hooked, [result.orders])
+        self.assertEqual(set(result.timings), set(STAGES))
+
+    def test_model_entry_points(self):
+        Order = self.env['grab.order']
+        self.assertIsNone(Order._upsert_from_grab_json({'items': []}))
+        order = Order._upsert_from_grab_json({'orderID': 'GF-PIPE-4', 'items': [{'id': 'ITEM-KOPI'}]})
+        self.assertEqual(order.line_ids.product_id, self.kopi_item)
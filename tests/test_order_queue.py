@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Queue-backed order ingestion: enqueue is one INSERT, consumers land the newest payload per order
+"""
+
+import json
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+
+def _order_json(order_id, quantity):
+    return {
+        'orderID': order_id,
+        'shortOrderNumber': 'GF-1',
+        'merchantID': 'MERCHANT',
+        'paymentType': 'CASHLESS',
+        'cutlery': False,
+        'orderTime': '2026-10-17T04:00:00Z',
+        'currency': {'code': 'SGD', 'symbol': 'S$', 'exponent': 2},
+        'featureFlags': {},
+        'items': [{'id': 'ITEM-1', 'quantity': quantity, 'price': 350}],
+        'price': {'subtotal': 350 * quantity},
+    }
+
+
+class TestGrabOrderQueue(TransactionCase):
+
+    def test_enqueue_and_process(self):
+        Queue = self.env['grab.order.queue']
+        Queue._enqueue('Q-1', json.dumps(_order_json('Q-1', 1)))
+        Queue._enqueue('Q-2', json.dumps(_order_json('Q-2', 1)))
+        Queue._enqueue('Q-1', json.dumps(_order_json('Q-1', 3)))
+        self.assertEqual(Queue._backlog_depth(), 3)
+
+        Queue._cron_process_queue(auto_commit=False)
+
+        self.assertEqual(Queue._backlog_depth(), 0)
+        order = self.env['grab.order'].search([('grab_order_id', '=', 'Q-1')])
+        self.assertEqual(order.line_ids.quantity, 3)
+        self.assertEqual(set(Queue.search([('grab_order_id', '=', 'Q-1')]).mapped('order_id')), {order})
+
+    def test_failed_payload_is_retried_then_parked(self):
+        Queue = self.env['grab.order.queue']
+        Queue._enqueue('Q-BAD', 'not json')
+        for _i in range(5):
+            Queue._cron_process_queue(auto_commit=False)
+        row = Queue.search([('grab_order_id', '=', 'Q-BAD')])
+        self.assertEqual((row.state, row.attempts), ('failed', 5))
+
+    def test_claim_locks_every_pending_row(self):
+        Queue = self.env['grab.order.queue']
+        first = Queue._enqueue('Q-3', json.dumps(_order_json('Q-3', 1)))
+        second = Queue._enqueue('Q-3', json.dumps(_order_json('Q-3', 2)))
+        Queue.browse(first).write({'state': 'done'})
+        self.assertEqual(Queue._claim_orders(10), [('Q-3', [second])])
+        self.assertEqual(Queue._claim_orders(10, exclude=['Q-3']), [])
+
+    def test_enqueue_wakes_every_consumer(self):
+        Cron = type(self.env['ir.cron'])
+        with patch.object(Cron, '_trigger', autospec=True) as trigger:
+            Queue = self.env['grab.order.queue']
+            Queue._trigger_consumers()
+            Queue._trigger_consumers()
+            # 提交后才唤醒，同一事务只排一次
+            trigger.assert_not_called()
+            self.env.cr.postcommit.run()
+        self.assertEqual(trigger.call_count, 1)
+        woken = {cron.id for call in trigger.call_args_list for cron in call.args[0]}
+        self.assertEqual(woken, {
+            self.env.ref('odoo_grab_integration.ir_cron_grab_order_queue').id,
+            self.env.ref('odoo_grab_integration.ir_cron_grab_order_queue_2').id,
+        })
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Raw order JSON lives in grab.order.raw (optionally zlib-compressed) and is purged after the retention period
+"""
+
+import copy
+
+from odoo.tests.common import TransactionCase
+
+
+ORDER = {
+    'orderID': 'GF-RAW-1',
+    'shortOrderNumber': 'GF-301',
+    'merchantID': 'MEX-1',
+    'currency': {'code': 'SGD', 'symbol': 'S$', 'exponent': 2},
+    'featureFlags': {},
+    'items': [{'id': 'ITEM-A', 'grabItemID': 'G-A', 'name': 'Kopi', 'quantity': 1, 'price': 250, 'tax': 0}],
+}
+
+
+class TestGrabOrderRaw(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Order = self.env['grab.order']
+        self.Raw = self.env['grab.order.raw']
+        self.params = self.env['ir.config_parameter'].sudo()
+
+    def test_raw_json_round_trip(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        raw = self.Raw.search([('order_id', '=', order.id)])
+        self.assertEqual(len(raw), 1)
+        self.assertEqual(raw.payload['orderID'], 'GF-RAW-1')
+        self.assertFalse(raw.payload_z)
+        order.invalidate_recordset(['raw_json'])
+        self.assertEqual(order.raw_json['orderID'], 'GF-RAW-1')
+
+        # 重复提交只更新同一行归档
+        data = copy.deepcopy(ORDER)
+        data['items'][0]['quantity'] = 2
+        self.Order._upsert_from_grab_json(data)
+        self.assertEqual(self.Raw.search_count([('order_id', '=', order.id)]), 1)
+        order.invalidate_recordset(['raw_json'])
+        self.assertEqual(order.raw_json['items'][0]['quantity'], 2)
+
+    def test_compressed_payload(self):
+        self.params.set_param('grab.order_raw_compress', '1')
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        raw = self.Raw.search([('order_id', '=', order.id)])
+        self.assertFalse(raw.payload)
+        self.assertTrue(raw.payload_z)
+        self.assertGreater(raw.size, 0)
+        order.invalidate_recordset(['raw_json'])
+        self.assertEqual(order.raw_json, ORDER)
+
+    def test_purge_old_payloads(self):
+        self.params.set_param('grab.order_raw_retention_days', '30')
+        old = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        fresh = self.Order._upsert_from_grab_json(dict(copy.deepcopy(ORDER), orderID='GF-RAW-2'))
+        self.env.flush_all()
+        self.env.cr.execute("""UPDATE grab_order_raw SET write_date = now() - interval '31 days'
+                                WHERE order_id = %s""", (old.id,))
+        self.assertEqual(self.Raw._cron_purge(), 1)
+        self.assertTrue(old.exists())
+        self.assertFalse(self.Raw.search([('order_id', '=', old.id)]))
+        self.assertTrue(self.Raw.search([('order_id', '=', fresh.id)]))
+
+    def test_purge_disabled(self):
+        self.params.set_param('grab.order_raw_retention_days', '0')
+        self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.env.flush_all()
+        self.env.cr.execute("UPDATE grab_order_raw SET write_date = now() - interval '3650 days'")
+        self.assertEqual(self.Raw._cron_purge(), 0)
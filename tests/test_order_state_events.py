@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Order state pushes: buffered until the order lands, applied in Grab timestamp order, late events ignored,
+ETA bursts coalesced into one write per order
+"""
+
+import copy
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+
+
+ORDER = {
+    'orderID': 'GF-STATE-1',
+    'shortOrderNumber': 'GF-401',
+    'merchantID': 'MEX-1',
+    'currency': {'code': 'SGD', 'symbol': 'S$', 'exponent': 2},
+    'featureFlags': {},
+    'items': [{'id': 'ITEM-A', 'grabItemID': 'G-A', 'name': 'Kopi', 'quantity': 1, 'price': 250, 'tax': 0}],
+}
+
+
+def push(state, ts, **extra):
+    data = dict({'orderID': 'GF-STATE-1', 'merchantID': 'MEX-1', 'state': state, 'updatedAt': ts}, **extra)
+    if ts is None:
+        del data['updatedAt']
+    return data
+
+
+class TestOrderStateEvents(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Order = self.env['grab.order']
+        self.Event = self.env['grab.order.state.event']
+        self.env['ir.config_parameter'].sudo().set_param('grab.order_state_coalesce_seconds', '0')
+
+    def test_buffered_until_order_lands(self):
+        first = self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:00:00Z', driverETA=600))
+        second = self.Event._record(push('COLLECTED', '2025-03-01T10:20:00Z'))
+        self.assertEqual((first.status, second.status), ('pending', 'pending'))
+
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.assertEqual(order.order_state, 'COLLECTED')
+        self.assertEqual(order.driver_eta, 600)
+        self.assertEqual(set((first | second).mapped('status')), {'applied'})
+        self.assertEqual(order.state_event_ids, first | second)
+
+    def test_late_event_does_not_overwrite(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.Event._record(push('COLLECTED', '2025-03-01T10:20:00Z'))
+        late = self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:00:00Z'))
+        self.assertEqual(late.status, 'stale')
+        self.assertEqual(order.order_state, 'COLLECTED')
+
+        self.Event._record(push('DELIVERED', '2025-03-01T10:45:00Z'))
+        self.assertEqual(order.order_state, 'DELIVERED')
+
+    def test_untimestamped_out_of_order_delivery(self):
+        # Grab 没给事件时间：按 STATE_RANK 比较，不用接收时间
+        self.Event._record(push('COLLECTED', None))
+        self.Event._record(push('DRIVER_ALLOCATED', None, driverETA=600))
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.assertEqual(order.order_state, 'COLLECTED')
+        self.assertFalse(order.state_event_time)
+
+        delivered = self.Event._record(push('DELIVERED', None))
+        late = self.Event._record(push('DRIVER_ARRIVED', None))
+        self.assertFalse(delivered.event_time)
+        self.assertEqual((delivered.status, late.status), ('applied', 'stale'))
+        self.assertEqual(order.order_state, 'DELIVERED')
+
+    def test_terminal_state_not_regressed(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.Event._record(push('DELIVERED', '2025-03-01T10:45:00Z'))
+        # 时间更晚但状态倒退的推送也不能覆盖终态
+        late = self.Event._record(push('DRIVER_ARRIVED', '2025-03-01T10:50:00Z'))
+        untimed = self.Event._record(push('COLLECTED', None))
+        self.assertEqual((late.status, untimed.status), ('stale', 'stale'))
+        self.assertEqual(order.order_state, 'DELIVERED')
+        self.assertEqual(order.state_event_time.minute, 45)
+
+    def test_terminal_state_not_replaced_by_other_terminal(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.Event._record(push('DELIVERED', '2025-03-01T10:45:00Z'))
+        later = self.Event._record(push('CANCELLED', '2025-03-01T10:50:00Z'))
+        untimed = self.Event._record(push('CANCELLED', None))
+        self.assertEqual((later.status, untimed.status), ('stale', 'stale'))
+        self.assertEqual(order.order_state, 'DELIVERED')
+        # 同一终态的重投不算倒退
+        self.assertEqual(self.Event._record(push('DELIVERED', '2025-03-01T10:46:00Z')).status, 'applied')
+
+    def test_eta_after_terminal_state_ignored(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:00:00Z', driverETA=600))
+        self.Event._record(push('DELIVERED', '2025-03-01T10:45:00Z'))
+        eta = self.Event._record(push(None, '2025-03-01T10:50:00Z', driverETA=120))
+        untimed = self.Event._record(push(None, None, driverETA=60))
+        self.assertEqual((eta.status, untimed.status), ('stale', 'stale'))
+        self.assertEqual(order.driver_eta, 600)
+
+    def test_terminal_state_in_one_batch(self):
+        # 同一批里 DELIVERED 之后的 CANCELLED / ETA 也不生效
+        self.Event._record(push('DELIVERED', '2025-03-01T10:45:00Z'))
+        cancelled = self.Event._record(push('CANCELLED', '2025-03-01T10:50:00Z'))
+        eta = self.Event._record(push(None, '2025-03-01T10:55:00Z', driverETA=30))
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.assertEqual(order.order_state, 'DELIVERED')
+        self.assertFalse(order.driver_eta)
+        self.assertEqual((cancelled.status, eta.status), ('stale', 'stale'))
+
+    def test_buffered_events_applied_in_timestamp_order(self):
+        # 到达顺序与发生顺序相反
+        self.Event._record(push('COLLECTED', '2025-03-01T10:20:00Z'))
+        self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:00:00Z'))
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.assertEqual(order.order_state, 'COLLECTED')
+        self.assertEqual(self.Event.search([('state', '=', 'DRIVER_ALLOCATED')]).status, 'applied')
+
+    def test_same_timestamp_uses_flow_order(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.Event._record(push('COLLECTED', '2025-03-01T10:20:00Z'))
+        self.Event._record(push('DRIVER_ARRIVED', '2025-03-01T10:20:00Z'))
+        self.assertEqual(order.order_state, 'COLLECTED')
+
+    def test_resubmit_keeps_pushed_state(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.Event._record(push('COLLECTED', '2025-03-01T10:20:00Z'))
+        data = copy.deepcopy(ORDER)
+        data['items'][0]['quantity'] = 2
+        self.Order._upsert_from_grab_json(data)
+        self.assertEqual(order.order_state, 'COLLECTED')
+
+    def test_cron_applies_pending_for_existing_order(self):
+        order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        # webhook 与 SubmitOrder 并发时事件可能以 pending 留下
+        event = self.Event.create(self.Event._prepare_vals(push('DRIVER_ARRIVED', '2025-03-01T10:10:00Z')))
+        self.Event._cron_apply_pending()
+        self.assertEqual(event.status, 'applied')
+        self.assertEqual(event.order_id, order)
+        self.assertEqual(order.order_state, 'DRIVER_ARRIVED')
+
+
+class TestOrderStateCoalescing(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Order = self.env['grab.order']
+        self.Event = self.env['grab.order.state.event']
+        self.env['ir.config_parameter'].sudo().set_param('grab.order_state_coalesce_seconds', '5')
+        self.order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.cron = self.env.ref('odoo_grab_integration.ir_cron_grab_order_state_flush')
+
+    def test_single_push_applied_immediately(self):
+        with patch.object(type(self.cron), '_trigger') as trigger:
+            event = self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:00:00Z', driverETA=900))
+            self.env.cr.postcommit.run()
+        self.assertEqual(event.status, 'applied')
+        self.assertEqual(self.order.driver_eta, 900)
+        trigger.assert_not_called()
+
+    def test_eta_burst_flushed_once(self):
+        with patch.object(type(self.cron), '_trigger') as trigger:
+            events = self.Event.browse()
+            for minute, eta in enumerate((900, 840, 780, 720, 660)):
+                events |= self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:%02d:00Z' % minute,
+                                                  driverETA=eta))
+            # flush 在提交后才排
+            trigger.assert_not_called()
+            before = fields.Datetime.now()
+            self.env.cr.postcommit.run()
+        # 第一条立即应用，其余的只落事件；窗口内只排一次 flush
+        self.assertEqual(trigger.call_count, 1)
+        self.assertGreaterEqual(trigger.call_args.kwargs['at'], before + timedelta(seconds=5))
+        self.assertEqual(events.mapped('status'), ['applied'] + ['pending'] * 4)
+        self.assertEqual(self.order.driver_eta, 900)
+
+        self.assertEqual(self.Event._cron_flush(auto_commit=False), 4)
+        self.assertEqual(self.order.driver_eta, 660)
+        self.assertEqual(self.order.order_state, 'DRIVER_ALLOCATED')
+        self.assertEqual(set(events.mapped('status')), {'applied'})
+        # 完整历史仍在事件表里
+        self.assertEqual(sorted(self.order.state_event_ids.mapped('driver_eta')), [660, 720, 780, 840, 900])
+
+    def test_flush_keeps_timestamp_order(self):
+        with patch.object(type(self.cron), '_trigger'):
+            collected = self.Event._record(push('COLLECTED', '2025-03-01T10:20:00Z'))
+            late = self.Event._record(push('DRIVER_ALLOCATED', '2025-03-01T10:00:00Z', driverETA=600))
+        self.assertEqual((collected.status, late.status), ('applied', 'pending'))
+        self.Event._cron_flush(auto_commit=False)
+        self.assertEqual(self.order.order_state, 'COLLECTED')
+        self.assertEqual(late.status, 'stale')
+
+        with patch.object(type(self.cron), '_trigger'):
+            stale = self.Event._record(push('DRIVER_ARRIVED', '2025-03-01T10:10:00Z'))
+        self.Event._cron_flush(auto_commit=False)
+        self.assertEqual(stale.status, 'stale')
+        self.assertEqual(self.order.order_state, 'COLLECTED')
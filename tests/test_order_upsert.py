@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Repeat submits / MEX edits update order children in place instead of deleting and recreating them
+"""
+
+import copy
+
+from odoo.tests.common import TransactionCase
+
+
+ORDER = {
+    'orderID': 'GF-UPSERT-1',
+    'shortOrderNumber': 'GF-101',
+    'merchantID': 'MEX-1',
+    'currency': {'code': 'SGD', 'symbol': 'S$', 'exponent': 2},
+    'featureFlags': {},
+    'items': [
+        {'id': 'ITEM-A', 'grabItemID': 'G-A', 'name': 'Kopi', 'quantity': 1, 'price': 250, 'tax': 0},
+        {'id': 'ITEM-B', 'grabItemID': 'G-B', 'name': 'Teh', 'quantity': 2, 'price': 300, 'tax': 0},
+        {'id': 'ITEM-B', 'grabItemID': 'G-B', 'name': 'Teh', 'quantity': 1, 'price': 150, 'tax': 0},
+    ],
+    'campaigns': [{'id': 'CMP-1', 'name': '10% off', 'deductedAmount': 50}],
+    'promos': [{'code': 'PROMO1', 'name': 'Promo', 'promoAmount': 100}],
+}
+
+
+class TestGrabOrderUpsert(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Order = self.env['grab.order']
+        self.order = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+
+    def test_unchanged_resubmit_keeps_rows(self):
+        line_ids = self.order.line_ids.ids
+        campaign_ids = self.order.campaign_ids.ids
+        rec = self.Order._upsert_from_grab_json(copy.deepcopy(ORDER))
+        self.assertEqual(rec, self.order)
+        self.assertEqual(rec.line_ids.ids, line_ids)
+        self.assertEqual(rec.campaign_ids.ids, campaign_ids)
+        for diff in rec.last_sync_diff.values():
+            self.assertEqual(diff, {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_edit_diff(self):
+        kept = self.order.line_ids.filtered(lambda l: l.grab_item_code == 'ITEM-A')
+        data = copy.deepcopy(ORDER)
+        data['items'][0]['quantity'] = 3                    # updated
+        del data['items'][2]                                # second ITEM-B row removed
+        data['items'].append({'id': 'ITEM-C', 'grabItemID': 'G-C', 'name': 'Milo', 'quantity': 1, 'price': 200})
+        data['promos'] = []
+        rec = self.Order._upsert_from_grab_json(data)
+
+        self.assertEqual(rec.last_sync_diff['lines'], {'created': 1, 'updated': 1, 'deleted': 1})
+        self.assertEqual(rec.last_sync_diff['campaigns'], {'created': 0, 'updated': 0, 'deleted': 0})
+        self.assertEqual(rec.last_sync_diff['promos'], {'created': 0, 'updated': 0, 'deleted': 1})
+        self.assertTrue(kept.exists())
+        self.assertEqual(kept.quantity, 3)
+        self.assertEqual(sorted(rec.line_ids.mapped('grab_item_code')), ['ITEM-A', 'ITEM-B', 'ITEM-C'])
+        self.assertFalse(rec.promo_ids)
+
+    def test_batch_upsert(self):
+        second = copy.deepcopy(ORDER)
+        second['orderID'] = 'GF-UPSERT-2'
+        second['items'] = second['items'][:1]
+        edited = copy.deepcopy(ORDER)
+        edited['promos'] = []
+        orders = self.Order._upsert_many_from_grab_json([edited, second, {'items': []}])
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(orders[0], self.order)
+        self.assertFalse(self.order.promo_ids)
+        self.assertEqual(len(self.order.line_ids), 3)
+        self.assertEqual(orders[1].grab_order_id, 'GF-UPSERT-2')
+        self.assertEqual(orders[1].line_ids.mapped('grab_item_code'), ['ITEM-A'])
+        self.assertEqual(len(orders[1].campaign_ids), 1)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Outbound call outbox: idempotent enqueue, collapsed menu notifications, retry / cooldown handling
+"""
+
+from unittest.mock import patch
+
+from psycopg2 import IntegrityError
+
+from odoo import fields
+from odoo.tests.common import TransactionCase
+from odoo.tools import mute_logger
+
+from odoo.addons.odoo_grab_integration.models import grab_outbox
+
+UNLIMITED = {endpoint: 0 for endpoint in grab_outbox.ENDPOINT_RATES}
+
+
+class TestGrabOutbox(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.Outbox = self.env['grab.outbox']
+        self.order = self.env['grab.order'].create({'grab_order_id': 'GF-OUTBOX-1'})
+        self.menu = self.env['grab.menu'].create({'name': 'Outlet', 'merchant_id': 'MEX-OUT'})
+
+    def test_duplicate_clicks_enqueue_once(self):
+        self.order.action_push_order_ready()
+        self.order.action_push_order_ready()
+        rows = self.Outbox.search([('order_id', '=', self.order.id)])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows.idempotency_key, 'order_mark:GF-OUTBOX-1:1')
+
+    def test_pending_key_unique(self):
+        row = self.Outbox._enqueue_order_mark(self.order)
+        with self.assertRaises(IntegrityError), mute_logger('odoo.sql_db'), self.env.cr.savepoint():
+            self.Outbox.create({'endpoint': 'order_mark', 'idempotency_key': row.idempotency_key})
+        # 已发出的记录不占用 key，同一操作可以再次入队
+        row.state = 'done'
+        self.assertNotEqual(self.Outbox._enqueue_order_mark(self.order), row)
+
+    def test_menu_notifications_collapse_per_merchant(self):
+        self.menu.payload_hash = 'a' * 64
+        row = self.Outbox._enqueue_menu_notification(self.menu)
+        self.menu.payload_hash = 'b' * 64
+        self.assertEqual(self.Outbox._enqueue_menu_notification(self.menu), row)
+        self.assertEqual(row.payload['payload_hash'], 'b' * 64)
+
+    def test_drain_results(self):
+        ok = self.Outbox._enqueue_order_mark(self.order)
+        busy = self.Outbox._enqueue_menu_notification(self.menu)
+        flaky = self.Outbox._enqueue_ready_time(self.order, '2025-06-01T10:30:00Z')
+        responses = {'order_mark': (204, ''), 'menu_notification': (409, 'too frequent'),
+                     'order_ready_time': (503, 'unavailable')}
+
+        def call(row):
+            return responses[row.endpoint]
+
+        with patch.object(type(self.Outbox), '_call_endpoint', call), \
+                patch.dict(grab_outbox.ENDPOINT_RATES, UNLIMITED):
+            self.Outbox._cron_drain(auto_commit=False)
+
+        self.assertEqual(ok.state, 'done')
+        # 409 冷却：顺延，不计入重试次数
+        self.assertEqual((busy.state, busy.attempts), ('pending', 0))
+        self.assertGreater(busy.next_attempt_at, fields.Datetime.now())
+        # 503：指数退避重试
+        self.assertEqual((flaky.state, flaky.attempts, flaky.last_status), ('pending', 1, '503'))
+        self.assertTrue(flaky.next_attempt_at)
+
+    def test_client_error_fails_and_retry_resets(self):
+        row = self.Outbox._enqueue_order_mark(self.order)
+        row._apply_result(400, 'bad request')
+        self.assertEqual(row.state, 'failed')
+        row.action_retry()
+        self.assertEqual((row.state, row.attempts), ('pending', 0))
+
+    def test_throttled_endpoint_does_not_block_others(self):
+        # 队首是额度已用完的菜单通知，后面的订单标记照样发出
+        busy = self.Outbox._enqueue_menu_notification(self.menu)
+        ok = self.Outbox._enqueue_order_mark(self.order)
+        self.env.cr.execute("""
+            UPDATE grab_outbox_rate SET tokens = 0, updated_at = now() at time zone 'UTC' + interval '1 hour'
+             WHERE endpoint = 'menu_notification'
+        """)
+        with patch.object(type(self.Outbox), '_call_endpoint', return_value=(204, '')) as call:
+            self.Outbox._cron_drain(max_batches=1, auto_commit=False)
+        self.assertEqual(call.call_count, 1)
+        self.assertEqual((ok.state, busy.state), ('done', 'pending'))
+
+    def test_rate_shared_through_database(self):
+        orders = self.env['grab.order'].create([{'grab_order_id': 'GF-RATE-%s' % i} for i in range(5)])
+        for order in orders:
+            self.Outbox._enqueue_order_mark(order)
+        self.env.cr.execute("""
+            UPDATE grab_outbox_rate SET tokens = 2, updated_at = clock_timestamp() at time zone 'UTC'
+             WHERE endpoint = 'order_mark'
+        """)
+        claimed = self.Outbox._claim(100)
+        self.assertEqual(len(claimed), 2)
+        # 令牌扣在表里：其他 worker 看到的是同一个桶
+        self.env.cr.execute("SELECT tokens FROM grab_outbox_rate WHERE endpoint = 'order_mark'")
+        self.assertLess(self.env.cr.fetchone()[0], 1)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Product → Grab menu item propagation: one write for all products, unchanged items skipped,
+deferred mode grouped by identical values and flushed once before commit
+"""
+
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+
+class TestProductGrabSync(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        self.menu = self.env['grab.menu'].create({'name': 'Sync Menu', 'merchant_id': 'MEX-SYNC'})
+        section = self.env['grab.menu.section'].create({'name': 'Section', 'menu_id': self.menu.id})
+        category = self.env['grab.menu.category'].create({'name': 'Category', 'section_id': section.id})
+        self.products = self.env['product.template'].create([
+            {'name': 'Sync %s' % i, 'list_price': 2.0 + i} for i in range(20)])
+        self.items = self.env['grab.menu.item'].create([
+            {'product_id': p.id, 'category_id': category.id} for p in self.products])
+        self.Item = type(self.env['grab.menu.item'])
+
+    def _count_item_writes(self):
+        return patch.object(self.Item, 'write', side_effect=self.Item.write, autospec=True)
+
+    def test_single_write_for_all_products(self):
+        with self._count_item_writes() as write:
+            self.products.write({'grab_price': 3.5, 'use_grab_price': True})
+        self.assertEqual(write.call_count, 1)
+        self.assertEqual(set(self.items.mapped('grab_price')), {3.5})
+        self.assertTrue(all(self.items.mapped('use_grab_price')))
+
+    def test_unchanged_items_not_written(self):
+        self.products.write({'grab_available': False})
+        with self._count_item_writes() as write:
+            self.products.write({'grab_available': False})
+        write.assert_not_called()
+        self.assertEqual(set(self.items.mapped('available_status')), {'UNAVAILABLE'})
+
+    def test_sync_disabled_products_skipped(self):
+        self.products[0].grab_sync_enabled = False
+        self.products.write({'gst_rate': 9.0})
+        self.assertEqual(self.items[0].gst_rate, 7.0)
+        self.assertEqual(set(self.items[1:].mapped('gst_rate')), {9.0})
+
+    def test_deferred_sync_grouped_by_values(self):
+        products = self.products.with_context(grab_defer_item_sync=True)
+        with self._count_item_writes() as write:
+            # 类似逐行导入：每个产品单独 write，只有两种不同的价格
+            for i, product in enumerate(products):
+                product.write({'grab_price': 5.0 if i % 2 else 6.0})
+            products[:3].write({'grab_available': False})
+            self.assertEqual(write.call_count, 0)
+            self.assertEqual(set(self.items.mapped('grab_price')), {0.0})
+
+            self.env.cr.precommit.run()
+        # (5.0) / (6.0) / (6.0, UNAVAILABLE) / (5.0, UNAVAILABLE) 四组
+        self.assertEqual(write.call_count, 4)
+        self.assertEqual(self.items[0].grab_price, 6.0)
+        self.assertEqual(self.items[1].grab_price, 5.0)
+        self.assertEqual(self.items[:3].mapped('available_status'), ['UNAVAILABLE'] * 3)
+        self.assertEqual(set(self.items[3:].mapped('available_status')), {'AVAILABLE'})
+
+    def test_menu_marked_dirty_once(self):
+        self.menu._rebuild_payload_snapshot()
+        self.assertFalse(self.menu.payload_dirty)
+        Menu = type(self.menu)
+        with patch.object(Menu, 'write', side_effect=Menu.write, autospec=True) as write:
+            for product in self.products:
+                product.write({'list_price': product.list_price + 1})
+        self.assertTrue(self.menu.payload_dirty)
+        self.assertEqual(write.call_count, 1)
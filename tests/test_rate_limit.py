@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Token-bucket rate limiter shared by the List Orders fetch threads
+"""
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.odoo_grab_integration.utils.grab_rate_limit import RateLimiter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestRateLimiter(BaseCase):
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2, burst=2, clock=clock, sleep=clock.sleep)
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        self.assertAlmostEqual(limiter.acquire(), 0.5)
+        clock.now += 10
+        # 桶容量封顶，空闲再久也只能突发 burst 个
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+
+    def test_unlimited(self):
+        limiter = RateLimiter(0)
+        for _i in range(100):
+            self.assertEqual(limiter.acquire(), 0.0)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Duplicate Grab webhook deliveries: payload hash keys, in-memory LRU with TTL in front of the DB table
+"""
+
+from odoo.tests.common import BaseCase, TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils import grab_idempotency
+from odoo.addons.odoo_grab_integration.utils.grab_idempotency import IdempotencyCache, payload_key
+
+
+STATE_PUSH = {'orderID': 'GF-IDEM-1', 'merchantID': 'MEX-1', 'state': 'DRIVER_ALLOCATED', 'driverETA': 600}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestIdempotencyCache(BaseCase):
+
+    def test_payload_key(self):
+        reordered = dict(reversed(list(STATE_PUSH.items())))
+        self.assertEqual(payload_key('order_state', STATE_PUSH), payload_key('order_state', reordered))
+        self.assertNotEqual(payload_key('order_state', STATE_PUSH),
+                            payload_key('order_state', dict(STATE_PUSH, driverETA=540)))
+        self.assertNotEqual(payload_key('order_state', STATE_PUSH), payload_key('order_submit', STATE_PUSH))
+        # body 不是 JSON 对象时也能算 key
+        self.assertNotEqual(payload_key('order_state', ['GF-IDEM-1']), payload_key('order_state', 'GF-IDEM-1'))
+
+    def test_lru_eviction_and_ttl(self):
+        clock = FakeClock()
+        cache = IdempotencyCache(max_entries=2, clock=clock)
+        cache.put('db', 'a', {'n': 1}, 60)
+        cache.put('db', 'b', {'n': 2}, 60)
+        self.assertEqual(cache.get('db', 'a'), {'n': 1})   # a 变为最近使用
+        cache.put('db', 'c', {'n': 3}, 60)
+        self.assertIsNone(cache.get('db', 'b'))
+        self.assertEqual(cache.stats['evicted'], 1)
+        self.assertIsNone(cache.get('other_db', 'a'))
+
+        clock.now += 61
+        self.assertIsNone(cache.get('db', 'a'))
+        self.assertEqual(len(cache), 1)
+
+
+class TestWebhookIdempotency(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        grab_idempotency._cache.clear()
+        self.addCleanup(grab_idempotency._cache.clear)
+        self.stats = dict(grab_idempotency._cache.stats)
+
+    def _delta(self, name):
+        return grab_idempotency._cache.stats[name] - self.stats.get(name, 0)
+
+    def test_duplicate_short_circuited(self):
+        key, cached = grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)
+        self.assertIsNone(cached)
+        body = {'success': True, 'message': 'state_updated'}
+        grab_idempotency.remember(self.env, key, 'order_state', STATE_PUSH, body)
+        # 事务提交前不进 LRU：回滚的处理不能被当成已处理
+        self.assertEqual(len(grab_idempotency._cache), 0)
+        self.env.cr.postcommit.run()
+
+        self.assertEqual(grab_idempotency.lookup(self.env, 'order_state', dict(STATE_PUSH))[1], body)
+        self.assertEqual(self._delta('memory_hits'), 1)
+
+        # 其他 worker / 重启后：内存里没有，查库命中后回填 LRU
+        grab_idempotency._cache.clear()
+        self.assertEqual(grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)[1], body)
+        self.assertEqual(grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)[1], body)
+        self.assertEqual(self._delta('db_hits'), 1)
+        self.assertEqual(self._delta('memory_hits'), 2)
+        duplicates_before = self.stats.get('memory_hits', 0) + self.stats.get('db_hits', 0)
+        self.assertEqual(grab_idempotency.idempotency_stats()['duplicates'] - duplicates_before, 3)
+
+    def test_changed_payload_is_processed(self):
+        key, _cached = grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)
+        grab_idempotency.remember(self.env, key, 'order_state', STATE_PUSH, {'success': True})
+        self.assertIsNone(grab_idempotency.lookup(self.env, 'order_state', dict(STATE_PUSH, state='COLLECTED'))[1])
+
+    def test_expired_keys(self):
+        key, _cached = grab_idempotency.lookup(self.env, 'order_submit', STATE_PUSH)
+        grab_idempotency.remember(self.env, key, 'order_submit', STATE_PUSH, {'success': True})
+        grab_idempotency._cache.clear()
+        self.env.cr.execute("""UPDATE grab_webhook_idempotency SET expires_at = now() - interval '1 minute'
+                                WHERE key = %s""", (key,))
+        self.assertIsNone(grab_idempotency.lookup(self.env, 'order_submit', STATE_PUSH)[1])
+        self.assertEqual(self.env['grab.webhook.idempotency']._cron_purge(), 1)
+
+    def test_rollback_not_cached(self):
+        key, _cached = grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)
+        grab_idempotency.remember(self.env, key, 'order_state', STATE_PUSH, {'success': True})
+        # 模拟请求事务回滚：postcommit 回调被丢弃，库里的行也不在了
+        self.env.cr.postcommit.clear()
+        self.env['grab.webhook.idempotency'].search([('key', '=', key)]).unlink()
+        self.env.cr.postcommit.run()
+        self.assertIsNone(grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)[1])
+
+    def test_non_object_body(self):
+        data = ['GF-IDEM-1']
+        key, cached = grab_idempotency.lookup(self.env, 'order_state', data)
+        self.assertIsNone(cached)
+        grab_idempotency.remember(self.env, key, 'order_state', data, {'success': False})
+        self.assertEqual(grab_idempotency.lookup(self.env, 'order_state', data)[1], {'success': False})
+
+    def test_disabled_with_zero_ttl(self):
+        self.env['ir.config_parameter'].sudo().set_param('grab.webhook_idempotency_ttl', '0')
+        key, _cached = grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)
+        grab_idempotency.remember(self.env, key, 'order_state', STATE_PUSH, {'success': True})
+        self.assertIsNone(grab_idempotency.lookup(self.env, 'order_state', STATE_PUSH)[1])
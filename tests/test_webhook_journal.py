@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Webhook event journal: in-process buffer, one COPY per flush, daily partitions dropped after retention
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from odoo.tests.common import TransactionCase
+
+from odoo.addons.odoo_grab_integration.utils import grab_event_journal
+from odoo.addons.odoo_grab_integration.utils.grab_event_journal import EventJournal, partition_name
+
+
+class TestWebhookJournal(TransactionCase):
+
+    def setUp(self):
+        super().setUp()
+        # 测试里只手动 flush，不启动后台线程
+        patcher = patch.object(EventJournal, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.Event = self.env['grab.webhook.event']
+
+    def test_buffer_then_copy(self):
+        journal = EventJournal(max_batch=1000)
+        for i in range(3):
+            journal.record(self.env, 'order_state', {'orderID': 'GF-J-1', 'state': 'DRIVER_ALLOCATED', 'n': i},
+                           grab_order_id='GF-J-1', merchant_id='MEX-1', status='DRIVER_ALLOCATED', http_status=200)
+        self.assertEqual(journal.pending(), 3)
+        self.assertFalse(self.Event.search([('grab_order_id', '=', 'GF-J-1')]))
+
+        self.assertEqual(journal.flush(cr=self.env.cr), 3)
+        self.assertEqual(journal.pending(), 0)
+        events = self.Event.search([('grab_order_id', '=', 'GF-J-1')])
+        self.assertEqual(len(events), 3)
+        self.assertEqual(set(events.mapped('event_type')), {'order_state'})
+        self.assertEqual(sorted(e.payload['n'] for e in events), [0, 1, 2])
+
+    def test_full_buffer_flushes(self):
+        journal = EventJournal(max_batch=2)
+        with patch.object(EventJournal, 'flush') as flush:
+            journal.record(self.env, 'push_menu', {})
+            flush.assert_not_called()
+            journal.record(self.env, 'push_menu', {})
+            flush.assert_called_once_with(self.env.cr.dbname)
+
+    def test_failed_flush_requeues_up_to_cap(self):
+        journal = EventJournal(max_batch=1000, max_buffer=3)
+        with patch.object(grab_event_journal, 'write_rows', side_effect=RuntimeError('db down')):
+            journal.record(self.env, 'integration_status', {'n': 1})
+            journal.record(self.env, 'integration_status', {'n': 2})
+            self.assertEqual(journal.flush(cr=self.env.cr), 0)
+            self.assertEqual(journal.pending(), 2)
+            journal.record(self.env, 'integration_status', {'n': 3})
+            journal.record(self.env, 'integration_status', {'n': 4})
+            journal.flush(cr=self.env.cr)
+        self.assertEqual(journal.pending(), 3)
+        self.assertEqual(journal.stats['dropped'], 1)
+        self.assertEqual(journal.stats['errors'], 2)
+
+    def test_old_partitions_dropped(self):
+        old_time = datetime.utcnow() - timedelta(days=40)
+        journal = EventJournal(clock=lambda: old_time)
+        journal.record(self.env, 'menu_sync_state', {'status': 'SUCCESS'}, merchant_id='MEX-OLD')
+        journal.flush(cr=self.env.cr)
+        name = partition_name(old_time.date())
+        self.assertIn(name, [n for _d, n in self.Event._partitions()])
+        self.assertTrue(self.Event.search([('merchant_id', '=', 'MEX-OLD')]))
+
+        self.env['ir.config_parameter'].sudo().set_param('grab.webhook_event_retention_days', '30')
+        dropped = self.Event._cron_maintain_partitions()
+        self.assertIn(name, dropped)
+        self.assertFalse(self.Event.search([('merchant_id', '=', 'MEX-OLD')]))
+        # 今天和接下来几天的分区都在
+        today = datetime.utcnow().date()
+        self.assertIn(partition_name(today + timedelta(days=1)), [n for _d, n in self.Event._partitions()])
+
+    def test_menu_sync_tracking(self):
+        menu = self.env['grab.menu'].create({'name': 'Sync Menu', 'merchant_id': 'MEX-SYNC'})
+        journal = EventJournal()
+        journal.record(self.env, 'menu_sync_state', {'requestID': 'REQ-1', 'status': 'SUCCESS'},
+                       merchant_id='MEX-SYNC', status='SUCCESS', request_id='REQ-1', job_id='JOB-1')
+        journal.flush(cr=self.env.cr)
+        event = self.Event.search([('request_id', '=', 'REQ-1')])
+        self.assertEqual((event.job_id, event.merchant_id), ('JOB-1', 'MEX-SYNC'))
+
+        self.env['grab.menu']._record_menu_sync('MEX-SYNC', 'REQ-1', 'JOB-1')
+        self.assertEqual((menu.last_menu_request_id, menu.last_menu_job_id), ('REQ-1', 'JOB-1'))
+        # 只带 jobID 的推送不清掉上一次的 requestID
+        self.env['grab.menu']._record_menu_sync('MEX-SYNC', job_id='JOB-2')
+        self.assertEqual((menu.last_menu_request_id, menu.last_menu_job_id), ('REQ-1', 'JOB-2'))
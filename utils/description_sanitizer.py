@@ -0,0 +1,134 @@
+# utils/description_sanitizer.py
+# -*- coding: utf-8 -*-
+"""
+产品描述清洗：去 HTML 标签 / 实体、过滤混进描述里的 JS 代码。
+
+grab.menu.item.website_description 与 GetMenu payload 共用这一份实现：
+- 所有正则在导入时编译一次；
+- 去标签的 5 个正则与旧实现逐条一致、顺序不变，不含尖括号的文本直接跳过；
+- 12 个 JS 特征合并成一个正则，一次 search；
+- clean_description 带 LRU 缓存，同一段描述在进程内只清洗一次。
+"""
+import html
+import re
+from functools import lru_cache
+
+# Priority order for description fields
+DESCRIPTION_FIELDS = [
+    'website_description',      # Website-specific description (highest priority)
+    'description_ecommerce',    # Ecommerce description
+    'public_description',       # Public description
+    'description_sale',         # Sales description
+    'description',              # Main description (fallback)
+]
+
+# 内容像 JavaScript 时整段丢弃
+JS_PATTERNS = [
+    r'document\.',
+    r'addEventListener',
+    r'querySelector',
+    r'function\s*\(',
+    r'const\s+\w+\s*=',
+    r'let\s+\w+\s*=',
+    r'var\s+\w+\s*=',
+    r'=>',
+    r'\.forEach\(',
+    r'\.trim\(\)',
+    r'innerText',
+    r'innerHTML'
+]
+_JS_RE = re.compile('|'.join(f'(?:{p})' for p in JS_PATTERNS), re.IGNORECASE)
+
+# 去标签，按顺序执行；结果须与旧实现逐字一致（文本里的 "<3"、"> 10cm" 这类游离尖括号也一样处理）
+_MARKUP_RES = [
+    (re.compile(r'<[^<>]*>'), ''),              # Standard tags
+    (re.compile(r'<[^>]*$'), ''),               # Unclosed tags at end
+    (re.compile(r'^[^<]*>'), ''),               # Unopened tags at start
+    (re.compile(r'</?[a-zA-Z][^>]*/?>'), ''),   # Any remaining HTML-like tags
+    (re.compile(r'[<>]'), ''),                  # Stray brackets
+]
+# 清洗后仍残留的（双重转义的）实体
+_NBSP_RE = re.compile(r'&nbsp;')
+_ENTITY_RE = re.compile(r'&[a-zA-Z]+;')
+
+# 清洗后仍含这些字符的描述视为代码
+CODE_MARKERS = ('{', '}', ';', '()', '=>')
+MIN_LENGTH = 10
+
+CACHE_SIZE = 4096
+
+
+def looks_like_js(text):
+    return bool(_JS_RE.search(text))
+
+
+def _strip_markup(text):
+    """
+    去掉标签与尖括号。沿用旧实现的规则：结尾没有 > 的 < 连同其后的文字、开头没有 < 的 > 连同其前的文字
+    都会被去掉，所以 "Spicy level <3 and <b>hot</b>" 清洗后是 "Spicy level"。
+    """
+    if '<' not in text and '>' not in text:
+        return text
+    for pattern, repl in _MARKUP_RES:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def strip_html(text):
+    """HTML → 纯文本：去标签、解码实体、合并空白。"""
+    if not text:
+        return ""
+    text = _strip_markup(text)
+    if '&' in text:
+        text = html.unescape(text)
+    text = ' '.join(text.split())
+    if '&' in text:
+        text = _NBSP_RE.sub(' ', text)
+        text = _ENTITY_RE.sub('', text)
+        text = text.strip()
+    return text
+
+
+def is_code_like(text):
+    """清洗后过短或仍像代码的描述不发给 Grab。"""
+    return len(text) < MIN_LENGTH or any(marker in text for marker in CODE_MARKERS)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _clean_cached(text):
+    if looks_like_js(text):
+        return ""
+    desc = strip_html(text)
+    if is_code_like(desc):
+        return ""
+    return desc
+
+
+def clean_description(value):
+    """
+    清洗单个描述字段；内容为空、像 JS、或清洗后像代码时返回 ""。
+    结果按原文缓存，相同的产品描述在进程内只清洗一次。
+    """
+    if not value:
+        return ""
+    text = str(value).strip()
+    if not text:
+        return ""
+    return _clean_cached(text)
+
+
+def pick_description(values, field_names=DESCRIPTION_FIELDS):
+    """按优先级从描述字段（dict 或 record）里取第一个清洗后可用的描述。"""
+    for field_name in field_names:
+        desc = clean_description(values.get(field_name) if isinstance(values, dict) else values[field_name])
+        if desc:
+            return desc
+    return ""
+
+
+def cache_info():
+    return _clean_cached.cache_info()
+
+
+def cache_clear():
+    _clean_cached.cache_clear()
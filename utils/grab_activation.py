@@ -1,6 +1,7 @@
 # odoo_grab_integration/utils/grab_activation.py
 import logging
-import requests
+
+from .grab_http import grab_request
 
 _logger = logging.getLogger(__name__)
 
@@ -32,7 +33,7 @@ def create_self_serve_activation(partner_merchant_id: str, access_token: str, ba
     payload = {"partner": {"merchantID": partner_merchant_id}}
 
     _logger.info("[Grab] Activation request -> %s, payload=%s", url, payload)
-    r = requests.post(url, json=payload, headers=headers, timeout=15)
+    r = grab_request('POST', url, 'self_serve_activation', json=payload, headers=headers)
     _logger.info("[Grab] Activation response <- status=%s, body=%s", r.status_code, r.text)
 
     # 非 2xx 抛错（上层会拦截并转成友好提示）
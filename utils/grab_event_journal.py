@@ -0,0 +1,164 @@
+# utils/grab_event_journal.py
+# -*- coding: utf-8 -*-
+"""
+所有 Grab webhook 共用的事件日志（grab_webhook_event）写入层。
+
+- webhook 只把事件追加到进程内缓冲，不在请求里 INSERT
+- 缓冲攒够 MAX_BATCH 条，或后台线程每 FLUSH_INTERVAL 秒，用一条 COPY 批量写入（独立 cursor）
+- 表按天分区（grab_webhook_event_pYYYYMMDD），写入前按需建分区；过期分区由 cron 整个 DROP
+- 写库失败时事件放回缓冲下次再试，缓冲最多 MAX_BUFFER 条，超出丢弃最旧的（只是日志，不阻塞 webhook）
+- 进程异常退出时最多丢失最近 FLUSH_INTERVAL 秒的日志
+"""
+import atexit
+import csv
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+_logger = logging.getLogger(__name__)
+
+TABLE = 'grab_webhook_event'
+COLUMNS = ('received_at', 'event_type', 'grab_order_id', 'merchant_id', 'partner_merchant_id',
+           'status', 'http_status', 'payload', 'request_id', 'job_id')
+
+MAX_BATCH = 500
+FLUSH_INTERVAL = 2.0
+MAX_BUFFER = 50000
+
+
+def partition_name(day):
+    return '%s_p%s' % (TABLE, day.strftime('%Y%m%d'))
+
+
+def ensure_partitions(cr, days):
+    """建好这些日期的日分区（已存在则跳过）"""
+    for day in sorted(set(days)):
+        cr.execute("CREATE TABLE IF NOT EXISTS %s PARTITION OF %s FOR VALUES FROM (%%s) TO (%%s)"
+                   % (partition_name(day), TABLE), (day, day + timedelta(days=1)))
+
+
+def write_rows(cr, rows):
+    """rows 为 COLUMNS 顺序的元组；按需建分区后一条 COPY 写入"""
+    ensure_partitions(cr, {row[0].date() for row in rows})
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        # CSV 里未加引号的空字段即 NULL
+        writer.writerow(['' if v is None else v for v in row])
+    buf.seek(0)
+    cr._obj.copy_expert("COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (TABLE, ', '.join(COLUMNS)), buf)
+
+
+class EventJournal:
+    """dbname -> 待写入事件的线程安全缓冲；flush 时每个数据库一条 COPY"""
+
+    def __init__(self, max_batch=MAX_BATCH, interval=FLUSH_INTERVAL, max_buffer=MAX_BUFFER, clock=datetime.utcnow):
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.clock = clock
+        self.stats = Counter()
+        self._buffers = {}
+        self._registries = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread_pid = None
+
+    def record(self, env, event_type, payload=None, grab_order_id=None, merchant_id=None,
+               partner_merchant_id=None, status=None, http_status=None, request_id=None, job_id=None):
+        dbname = env.cr.dbname
+        row = (self.clock(), event_type, grab_order_id or None, merchant_id or None, partner_merchant_id or None,
+               None if status is None else str(status), http_status,
+               json.dumps(payload, ensure_ascii=False, default=str) if payload is not None else None,
+               request_id or None, job_id or None)
+        with self._lock:
+            self._registries.setdefault(dbname, env.registry)
+            buf = self._buffers.setdefault(dbname, [])
+            buf.append(row)
+            self.stats['recorded'] += 1
+            full = len(buf) >= self.max_batch
+        self._ensure_thread()
+        if full:
+            self.flush(dbname)
+
+    def pending(self, dbname=None):
+        with self._lock:
+            if dbname:
+                return len(self._buffers.get(dbname, ()))
+            return sum(len(b) for b in self._buffers.values())
+
+    def _take(self, dbname):
+        with self._lock:
+            return self._buffers.pop(dbname, [])
+
+    def _requeue(self, dbname, rows):
+        with self._lock:
+            buf = rows + self._buffers.get(dbname, [])
+            overflow = len(buf) - self.max_buffer
+            if overflow > 0:
+                self.stats['dropped'] += overflow
+                buf = buf[overflow:]
+            self._buffers[dbname] = buf
+
+    def flush(self, dbname=None, cr=None):
+        """写入缓冲中的事件；传入 cr 时在调用方事务里写（测试用），否则每个数据库开一个独立 cursor 提交"""
+        with self._flush_lock:
+            if cr is not None:
+                dbnames = [cr.dbname]
+            else:
+                with self._lock:
+                    dbnames = [dbname] if dbname else list(self._buffers)
+            written = 0
+            for db in dbnames:
+                rows = self._take(db)
+                if not rows:
+                    continue
+                try:
+                    if cr is not None:
+                        write_rows(cr, rows)
+                    else:
+                        with self._registries[db].cursor() as db_cr:
+                            write_rows(db_cr, rows)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    _logger.warning("Grab webhook journal: flushing %s events to %s failed: %s", len(rows), db, e)
+                    self._requeue(db, rows)
+                    continue
+                written += len(rows)
+                self.stats['flushed'] += len(rows)
+            return written
+
+    def _ensure_thread(self):
+        # prefork 模式下每个 worker 进程各自启动一个后台线程
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        threading.Thread(target=self._run, name='grab-webhook-journal', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                _logger.exception("Grab webhook journal: background flush crashed")
+
+
+journal = EventJournal()
+atexit.register(journal.flush)
+
+
+def journal_event(env, event_type, payload=None, **columns):
+    """webhook 调用入口：只追加到进程内缓冲，不访问数据库"""
+    try:
+        journal.record(env, event_type, payload, **columns)
+    except Exception:
+        _logger.exception("Grab webhook journal: dropping %s event", event_type)
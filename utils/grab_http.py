@@ -0,0 +1,181 @@
+# utils/grab_http.py
+# -*- coding: utf-8 -*-
+"""
+所有出站 Grab API 调用共用的 HTTP 层。
+
+- 进程内共享一个 requests.Session：连接池 + keep-alive，不再每次都重新 TCP/TLS 握手
+- 每个端点单独的超时（DEFAULT_TIMEOUTS，可用 grab.http_timeouts 参数按端点覆盖，JSON：{"order_mark": 8}）
+- 只有幂等的 GET / HEAD 在 429 / 5xx 时自动重试（指数退避，遵守 Retry-After，单次等待不超过 MAX_RETRY_WAIT 秒）；
+  POST / PUT（订单标记、出餐时间、菜单通知、激活）只重试连接失败——请求没发出去才重发，
+  其余失败原样返回，由发件箱（grab.outbox）按自己的退避重试
+- 带 env 的调用收到 401 时作废这个 Bearer token，用新 token 重发一次（401 说明请求没被处理，POST 也可以重发）
+- 按端点统计延迟直方图和状态码，latency_stats() 返回快照
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_logger = logging.getLogger(__name__)
+
+# 端点名 -> (connect, read) 秒
+DEFAULT_TIMEOUTS = {
+    'oauth_token': (5, 20),
+    'order_mark': (5, 10),
+    'order_ready_time': (5, 10),
+    'list_orders': (5, 20),
+    'menu_notification': (5, 20),
+    'menu_trace': (5, 20),
+    'self_serve_activation': (5, 15),
+}
+FALLBACK_TIMEOUT = (5, 20)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = frozenset(['GET', 'HEAD'])
+MAX_RETRY_WAIT = 5  # 秒：退避与 Retry-After 的单次等待上限，不让 HTTP worker 长时间阻塞
+POOL_MAXSIZE = 32
+
+# 直方图桶上界（毫秒），最后一个桶为 +inf
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class CappedRetry(Retry):
+    """退避与 Retry-After 的等待都不超过 MAX_RETRY_WAIT 秒（兼容 urllib3 1.26 / 2.x）"""
+
+    def get_backoff_time(self):
+        return min(super().get_backoff_time(), MAX_RETRY_WAIT)
+
+    def sleep_for_retry(self, response=None):
+        retry_after = self.get_retry_after(response) if response is not None else None
+        if retry_after:
+            time.sleep(min(retry_after, MAX_RETRY_WAIT))
+            return True
+        return False
+
+
+def _build_session():
+    retry = CappedRetry(
+        total=3,
+        connect=2,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        # 连接失败对任何方法都会重试（请求未发出）；读超时和状态码重试只对幂等方法
+        allowed_methods=RETRY_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+class LatencyStats:
+    """端点 -> 直方图 / 次数 / 总耗时 / 状态码计数，线程安全"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, elapsed_ms, status):
+        with self._lock:
+            st = self._data.get(endpoint)
+            if st is None:
+                st = self._data[endpoint] = {
+                    'count': 0, 'sum_ms': 0.0, 'max_ms': 0.0,
+                    'histogram': [0] * (len(self.buckets) + 1), 'status': {},
+                }
+            st['count'] += 1
+            st['sum_ms'] += elapsed_ms
+            st['max_ms'] = max(st['max_ms'], elapsed_ms)
+            st['histogram'][bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+            st['status'][str(status)] = st['status'].get(str(status), 0) + 1
+
+    def snapshot(self):
+        labels = ['<=%s' % b for b in self.buckets] + ['>%s' % self.buckets[-1]]
+        with self._lock:
+            return {
+                endpoint: {
+                    'count': st['count'],
+                    'avg_ms': round(st['sum_ms'] / st['count'], 1) if st['count'] else 0.0,
+                    'max_ms': round(st['max_ms'], 1),
+                    'histogram_ms': dict(zip(labels, st['histogram'])),
+                    'status': dict(st['status']),
+                }
+                for endpoint, st in self._data.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._data.clear()
+
+
+_stats = LatencyStats()
+
+
+def _timeout_for(endpoint, env=None):
+    if env is not None:
+        raw = env['ir.config_parameter'].sudo().get_param('grab.http_timeouts')
+        if raw:
+            try:
+                override = json.loads(raw).get(endpoint)
+                if override:
+                    return tuple(override) if isinstance(override, (list, tuple)) else (5, float(override))
+            except (ValueError, AttributeError, TypeError):
+                _logger.warning("Ignoring invalid grab.http_timeouts: %s", raw)
+    return DEFAULT_TIMEOUTS.get(endpoint, FALLBACK_TIMEOUT)
+
+
+def grab_request(method, url, endpoint, env=None, timeout=None, **kwargs):
+    """
+    经共享 Session 发请求，返回 requests.Response（不对非 2xx 抛错，与原来的 requests.post/get 一致）。
+    endpoint 用来选超时、记延迟；连接失败等异常同样计入统计（status='error'）后原样抛出。
+    传入 env 时，401 会作废 token 并用新 token 重试一次。
+    """
+    if timeout is None:
+        timeout = _timeout_for(endpoint, env)
+    resp = _send(method, url, endpoint, timeout, **kwargs)
+    auth = (kwargs.get('headers') or {}).get('Authorization') or ''
+    if resp.status_code == 401 and env is not None and auth.startswith('Bearer '):
+        from .grab_oauth import grab_get_access_token, grab_invalidate_access_token
+        _logger.warning("Grab %s: access token rejected (401), refreshing and retrying once", endpoint)
+        grab_invalidate_access_token(env, auth[len('Bearer '):])
+        kwargs['headers'] = dict(kwargs['headers'], Authorization='Bearer %s' % grab_get_access_token(env))
+        resp = _send(method, url, endpoint, timeout, **kwargs)
+    return resp
+
+
+def _send(method, url, endpoint, timeout, **kwargs):
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        resp = get_session().request(method, url, timeout=timeout, **kwargs)
+        status = resp.status_code
+        return resp
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _stats.observe(endpoint, elapsed_ms, status)
+        _logger.debug("Grab %s %s %s -> %s in %.0fms", endpoint, method, url, status, elapsed_ms)
+
+
+def latency_stats():
+    return _stats.snapshot()
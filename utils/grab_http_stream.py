@@ -0,0 +1,67 @@
+# utils/grab_http_stream.py
+# -*- coding: utf-8 -*-
+"""
+GetMenu 流式响应的内容编码：按 Accept-Encoding 协商 br / gzip，逐块压缩生成器产出的文本。
+brotli 为可选依赖，未安装时只协商 gzip。
+"""
+import zlib
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encoding):
+    """返回 'br' / 'gzip' / None（不压缩）。q=0 视为明确拒绝。"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        token, _sep, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+
+    def _ok(name):
+        return accepted.get(name, accepted.get('*', 0.0)) > 0
+
+    if brotli is not None and _ok('br'):
+        return 'br'
+    if _ok('gzip'):
+        return 'gzip'
+    return None
+
+
+def encode_chunks(chunks, encoding=None):
+    """把 str/bytes 块编码成 bytes 块；encoding 为 'br' / 'gzip' 时边读边压缩。"""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    elif encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        process = finish = None
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if not chunk:
+            continue
+        out = process(chunk) if process else chunk
+        if out:
+            yield out
+    if finish:
+        out = finish()
+        if out:
+            yield out
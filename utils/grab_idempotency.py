@@ -0,0 +1,117 @@
+# utils/grab_idempotency.py
+# -*- coding: utf-8 -*-
+"""
+Grab webhook 重投的幂等层。
+
+Grab 在超时后会把 SubmitOrder / 订单状态推送原样重投。key = sha256(类型, orderID, 规范化后的整个 payload)：
+- 进程内 LRU（最多 MAX_ENTRIES 条，带过期时间）命中：直接返回第一次处理时的应答，不查库、不碰 grab.order
+- LRU 未命中再查 grab.webhook.idempotency 表（跨 worker / 重启后仍有效），命中后回填 LRU
+- 只有处理成功的投递才会 remember；失败的投递下次重投会重新处理。数据库行随请求事务写入，
+  LRU 等事务提交后才写入，回滚的处理不会被当成已处理
+- 有效期由 grab.webhook_idempotency_ttl（秒）控制，过期行由 cron 清理
+- idempotency_stats() 返回内存命中 / 数据库命中 / 未命中 / 记录次数
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+
+MAX_ENTRIES = 10000
+DEFAULT_TTL = 86400
+
+
+def _order_id(data):
+    # body 不一定是 JSON 对象（列表 / 字符串），这时没有 orderID
+    return data.get('orderID') if isinstance(data, dict) else None
+
+
+def payload_key(kind, data):
+    body = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    raw = '%s|%s|%s' % (kind, _order_id(data) or '', body)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class IdempotencyCache:
+    """(dbname, key) -> (expires_at, response) 的线程安全 LRU"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, dbname, key):
+        with self._lock:
+            entry = self._entries.get((dbname, key))
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[(dbname, key)]
+                return None
+            self._entries.move_to_end((dbname, key))
+            return entry[1]
+
+    def put(self, dbname, key, response, ttl):
+        with self._lock:
+            self._entries[(dbname, key)] = (self.clock() + ttl, response)
+            self._entries.move_to_end((dbname, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = IdempotencyCache()
+
+
+def _ttl(env):
+    value = env['ir.config_parameter'].sudo().get_param('grab.webhook_idempotency_ttl', DEFAULT_TTL)
+    try:
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        return DEFAULT_TTL
+
+
+def lookup(env, kind, data):
+    """返回 (key, 第一次处理时的应答)；不是重复投递时应答为 None"""
+    key = payload_key(kind, data)
+    dbname = env.cr.dbname
+    response = _cache.get(dbname, key)
+    if response is not None:
+        _cache.stats['memory_hits'] += 1
+        return key, response
+    row = env['grab.webhook.idempotency'].sudo()._lookup(key)
+    if row is not None:
+        expires_in, response = row
+        _cache.stats['db_hits'] += 1
+        _cache.put(dbname, key, response, expires_in)
+        return key, response
+    _cache.stats['misses'] += 1
+    return key, None
+
+
+def remember(env, key, kind, data, response):
+    """处理成功后调用：数据库行在当前事务里写入，进程内 LRU 等事务提交后再写"""
+    ttl = _ttl(env)
+    if not ttl:
+        return
+    env['grab.webhook.idempotency'].sudo()._remember(key, kind, _order_id(data), response, ttl)
+    dbname = env.cr.dbname
+
+    @env.cr.postcommit.add
+    def cache_response():
+        _cache.put(dbname, key, response, ttl)
+        _cache.stats['stored'] += 1
+
+
+def idempotency_stats():
+    return dict(_cache.stats, entries=len(_cache),
+                duplicates=_cache.stats['memory_hits'] + _cache.stats['db_hits'])
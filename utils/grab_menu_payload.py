@@ -0,0 +1,449 @@
+# utils/grab_menu_payload.py
+# -*- coding: utf-8 -*-
+"""
+GetMenu payload 构造（section → category → item → modifier group → modifier）。
+不依赖 http.request，只用传入记录的 env，所以 controller 与 grab.menu 的快照重建可以共用。
+"""
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from .description_sanitizer import DESCRIPTION_FIELDS, pick_description
+from .grab_pricing import _int_cents, tax_included_cents, tax_included_prices
+
+_logger = logging.getLogger(__name__)
+
+SELLING_TIME_ID = "SELLINGTIME-01"
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+def _icp_get(env, key, default=None):
+    return env['ir.config_parameter'].sudo().get_param(key, default)
+
+def _normalize_base(u: str) -> str:
+    """修正常见手误并去除末尾斜杠，确保是 https://domain"""
+    u = (u or '').strip().rstrip('/')
+    u = u.replace('https//', 'https://').replace('http//', 'http://')
+    if u and '://' not in u:
+        u = 'https://' + u
+    return u
+
+def _product_image_url(product):
+    """
+    返回公开可访问的图片 URL：
+    1) 优先 product.template 的图片（image_1920 → image_256 依次回退）
+    2) 回退第一个 product.product 的变体图片
+    3) 再回退外链 URL 字段（系统参数 grab.external_image_field 或常见字段名）
+    对 /web/image URL：追加一个“伪文件名” .jpg，并带 unique=xxx 缓存戳，方便第三方正确识别与刷新。
+    图片是否存在只看 ir.attachment 元数据，不读取图片内容。
+    """
+    if not product:
+        return ""
+    env = product.env
+    base = _normalize_base(_icp_get(env, 'web.base.url', ''))
+    if not base:
+        return ""
+    external_fields = _external_image_fields(env)
+    tmpl = product.read(['product_variant_ids'] + external_fields, load=None)[0]
+    tree = {
+        'images': _load_image_index(env, product.ids, tmpl['product_variant_ids'][:1]),
+        'external_fields': external_fields,
+    }
+    return _image_url_from_values(base, tree, tmpl)
+
+def _price_with_tax(pt):
+    """
+    返回含税价格（float），用 product.template 的税来计算。
+    没税时回退 list_price。批量场景请直接用 grab_pricing.tax_included_cents。
+    """
+    return tax_included_prices(pt).get(pt.id, pt.list_price or 0.0)
+
+# ---- status 规范化：统一四个大写枚举 ----
+ALLOWED_STATUS = {"AVAILABLE", "UNAVAILABLE", "UNAVAILABLETODAY", "HIDE"}
+
+def _norm_status(val, default="AVAILABLE"):
+    """将 availableStatus 统一规范成官方枚举，避免 Menu Simulator 报错。"""
+    if val in (None, "", True, False):
+        return default
+    v = str(val).upper().strip()
+    # 常见错误写法容错：空格、下划线、连字符
+    v = v.replace(" ", "").replace("_", "").replace("-", "")
+    # 只接受四个值
+    return v if v in ALLOWED_STATUS else default
+
+# ---- 整棵菜单树批量读取 ----
+IMAGE_FIELDS = ['image_1920', 'image_1024', 'image_512', 'image_256']
+VARIANT_IMAGE_FIELDS = ['image_variant_1920', 'image_variant_1024', 'image_variant_512', 'image_variant_256']
+EXTERNAL_IMAGE_FIELDS = ['image_url', 'photo_url', 'website_image_url', 'external_image_url', 'url_image']
+
+def _existing_fields(Model, names):
+    return [n for n in names if n and n in Model._fields]
+
+def _external_image_fields(env):
+    fname = (_icp_get(env, 'grab.external_image_field') or '').strip()
+    return _existing_fields(env['product.template'], [fname] + EXTERNAL_IMAGE_FIELDS)
+
+def _image_stamp(att):
+    """unique= 缓存戳：图片内容或附件被重写时才变化。"""
+    raw = f"{att['checksum'] or ''}-{att['file_size'] or 0}-{att['write_date'] or ''}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def _load_image_index(env, template_ids, variant_ids):
+    """
+    一次 ir.attachment 查询拿到所有模板 / 变体图片字段的元数据：
+    {(model, res_id): {image_XXX: unique 戳}}，变体的 image_variant_XXX 以 image_XXX 为键。
+    不读取 datas，也不碰 filestore。
+    """
+    template_ids, variant_ids = list(template_ids), list(variant_ids)
+    if not template_ids and not variant_ids:
+        return {}
+    domain = ['|',
+              '&', ('res_model', '=', 'product.template'), ('res_id', 'in', template_ids),
+              '&', ('res_model', '=', 'product.product'), ('res_id', 'in', variant_ids)]
+    attachments = env['ir.attachment'].sudo().search_read(
+        [('res_field', 'in', IMAGE_FIELDS + VARIANT_IMAGE_FIELDS)] + domain,
+        ['res_model', 'res_id', 'res_field', 'checksum', 'file_size', 'write_date'])
+    variant_to_image = dict(zip(VARIANT_IMAGE_FIELDS, IMAGE_FIELDS))
+    index = defaultdict(dict)
+    for att in attachments:
+        if att['res_model'] == 'product.template' and att['res_field'] in IMAGE_FIELDS:
+            index[('product.template', att['res_id'])][att['res_field']] = _image_stamp(att)
+        elif att['res_model'] == 'product.product' and att['res_field'] in variant_to_image:
+            index[('product.product', att['res_id'])][variant_to_image[att['res_field']]] = _image_stamp(att)
+    return index
+
+def _load_menu_tree(menu):
+    """
+    用固定次数的 search_read / read 把 section → category → item → modifier group → modifier
+    以及关联的 product.template / 首个变体一次性读成 dict，查询次数与菜单大小无关。
+    图片只查 ir.attachment 元数据（_load_image_index），不会读 filestore。
+    """
+    env = menu.env
+    Section = env['grab.menu.section']
+    Category = env['grab.menu.category']
+    Item = env['grab.menu.item']
+    Group = env['grab.menu.modifier.group']
+    Modifier = env['grab.menu.modifier']
+    Template = env['product.template']
+
+    sections = Section.search_read([('menu_id', '=', menu.id)], ['id'], order='id', load=None)
+    categories = Category.search_read(
+        [('section_id', 'in', [s['id'] for s in sections])],
+        ['section_id', 'name', 'sequence'], order='id', load=None)
+    items = Item.search_read(
+        [('category_id', 'in', [c['id'] for c in categories])],
+        ['category_id', 'product_id', 'sequence', 'available_status', 'use_grab_price', 'grab_price', 'gst_rate'],
+        order='id', load=None)
+    groups = Group.search_read(
+        [('item_id', 'in', [i['id'] for i in items])],
+        ['item_id', 'name', 'group_code', 'selection_range_min', 'selection_range_max', 'available_status'],
+        order='id', load=None)
+    modifiers = Modifier.search_read(
+        [('group_id', 'in', [g['id'] for g in groups])],
+        ['group_id', 'name', 'modifier_code', 'price', 'available_status'],
+        order='id', load=None)
+
+    external_fields = _external_image_fields(env)
+    template_fields = ['name', 'list_price', 'product_variant_ids'] \
+        + _existing_fields(Template, DESCRIPTION_FIELDS) + external_fields
+    template_ids = list({i['product_id'] for i in items if i['product_id']})
+    templates = {t['id']: t for t in Template.browse(template_ids).read(template_fields, load=None)}
+
+    # 首个变体一并查询：模板本身没有图片时回退到它
+    variant_ids = [t['product_variant_ids'][0] for t in templates.values() if t['product_variant_ids']]
+    images = _load_image_index(env, template_ids, variant_ids)
+
+    items_by_category = defaultdict(list)
+    for it in items:
+        items_by_category[it['category_id']].append(it)
+    groups_by_item = defaultdict(list)
+    for g in groups:
+        groups_by_item[g['item_id']].append(g)
+    modifiers_by_group = defaultdict(list)
+    for m in modifiers:
+        modifiers_by_group[m['group_id']].append(m)
+    categories_by_section = defaultdict(list)
+    for c in categories:
+        categories_by_section[c['section_id']].append(c)
+
+    return {
+        'sections': sections,
+        'categories_by_section': categories_by_section,
+        'items_by_category': items_by_category,
+        'groups_by_item': groups_by_item,
+        'modifiers_by_group': modifiers_by_group,
+        'templates': templates,
+        'images': images,
+        'external_fields': external_fields,
+    }
+
+def _image_url_from_values(base, tree, tmpl):
+    """模板图 → 首个变体图 → 外链字段，只用 _load_menu_tree 读好的 dict 与图片索引。"""
+    if not base or not tmpl:
+        return ""
+
+    def _mk_url(model, res_id):
+        stamps = tree['images'].get((model, res_id)) or {}
+        # Use the first available image field, with a descriptive filename
+        # Example: /web/image/product.template/1784/image_1024/product.jpg?unique=3f2a9c...
+        for field in IMAGE_FIELDS:
+            if field in stamps:
+                return f"{base}/web/image/{model}/{res_id}/{field}/product.jpg?unique={stamps[field]}"
+        return ""
+
+    # 1) 模板图
+    url = _mk_url('product.template', tmpl['id'])
+    if url:
+        return url
+
+    # 2) 变体图（模板无图时，变体的 image_XXX 就是 image_variant_XXX）
+    if tmpl['product_variant_ids']:
+        url = _mk_url('product.product', tmpl['product_variant_ids'][0])
+        if url:
+            return url
+
+    # 3) 外链 URL 字段兜底
+    for f in tree['external_fields']:
+        val = tmpl.get(f) or ""
+        if isinstance(val, str) and val.strip().lower().startswith('http'):
+            return val.strip()
+    return ""
+
+def _as_int(v, default=0):
+    try:
+        return int(v)
+    except Exception:
+        return int(default)
+
+def _build_modifier_groups(item_name, groups, modifiers_by_group):
+    """
+    构造 Grab 期望的 modifierGroups：
+    - selectionRangeMin: 取模型值，默认 0
+    - selectionRangeMax:
+        * 若模型值 > 0：使用该值（明确的业务上限，例如 2）
+        * 若模型值 <= 0 或未填：显式回落为组内 modifier 数量上限（允许选择全部可用）
+    - availableStatus：规范成官方四个枚举
+    """
+    mgs_payload = []
+    for mg in groups:
+        mods = modifiers_by_group.get(mg['id'], [])
+
+        # 1) 读取并规范化 min/max
+        sel_min = _as_int(mg.get('selection_range_min'), 0)
+        sel_max = _as_int(mg.get('selection_range_max'), 0)  # 0/None 认为是未指定
+
+        # 2) 未指定/<=0 时，按组内数量上限（显式给出具体整数）
+        total_mods = len(mods)
+        if sel_max <= 0:
+            sel_max = total_mods
+
+        # 3) 防呆：max 至少要 >= min 且 >=1（与 Grab 前端期望对齐）
+        floor = max(sel_min, 1)
+        if sel_max < floor:
+            sel_max = floor
+
+        # 4) 组装 modifiers（含 availableStatus 规范化）
+        modifiers_payload = []
+        for m in mods:
+            modifiers_payload.append({
+                "id": m['modifier_code'] or f"MODI-{m['id']}",
+                "name": m['name'],
+                "price": int(round((m.get('price') or 0.0) * 100)),
+                "availableStatus": _norm_status(m.get('available_status'), "AVAILABLE"),
+            })
+
+        # 5) 打日志方便核对
+        _logger.debug(
+            "GRAB MG | item=%s mg=%s min=%s max=%s mods=%s",
+            item_name, mg['name'], sel_min, sel_max, total_mods
+        )
+
+        # 6) 产出 payload（group 状态也规范）
+        mgs_payload.append({
+            "id": mg['group_code'] or f"MG-{mg['id']}",
+            "name": mg['name'],
+            "selectionRangeMin": sel_min,
+            "selectionRangeMax": sel_max,
+            "availableStatus": _norm_status(mg.get('available_status'), "AVAILABLE"),
+            "modifiers": modifiers_payload,
+        })
+
+    return mgs_payload
+
+def _iter_categories_from_db(menu, stats=None):
+    """
+    把现有 section → category → item 扁平成 selling-time-based categories，逐个 category 产出。
+    数据全部来自 _load_menu_tree 的批量读取；传入 stats dict 时在迭代结束后回填本次构造用掉的 SQL 次数。
+    """
+    env = menu.env
+    env.flush_all()
+    cr = env.cr
+    queries_before = cr.sql_log_count
+
+    tree = _load_menu_tree(menu)
+    base = _normalize_base(_icp_get(env, 'web.base.url', ''))
+    want_tax = str(_icp_get(env, 'grab.price_tax_included', '0') or '0').strip().lower() in ('1', 'true', 'yes')
+    templates = tree['templates']
+    tax_cents = None
+
+    category_count = 0
+    seen_cat = set()
+    item_count = 0
+    for section in tree['sections']:
+        for cat in tree['categories_by_section'].get(section['id'], []):
+            cat_id = f"CATEGORY-{cat['id']}"
+            if cat_id in seen_cat:
+                continue
+            seen_cat.add(cat_id)
+
+            items = []
+            seen_item = set()
+            for it in tree['items_by_category'].get(cat['id'], []):
+                it_id = f"ITEM-{it['id']}"
+                if it_id in seen_item:
+                    continue
+                seen_item.add(it_id)
+
+                pt = templates.get(it['product_id'])
+                name = (pt and pt['name']) or "Unnamed"
+
+                # 描述：同 grab.menu.item.website_description 的优先级与清洗规则
+                desc = pick_description(pt) if pt else ""
+
+                # 价格：优先使用 Grab 专用价格（含 GST），否则回退到产品价格
+                price_cents = 0
+
+                # 1. 首先检查是否有 Grab 专用价格设置（与 _compute_grab_price_with_gst 同一公式）
+                if it['use_grab_price']:
+                    grab_base = it['grab_price'] if it['grab_price'] else ((pt and pt['list_price']) or 0.0)
+                    price_cents = _int_cents(grab_base + grab_base * ((it['gst_rate'] or 0.0) / 100.0))
+
+                # 2. 回退到产品模板价格：grab.price_tax_included 开启时用含税价（整张菜单一次算好），否则 list_price
+                elif pt:
+                    if want_tax and tax_cents is None:
+                        tax_cents = tax_included_cents(env['product.template'].browse(list(templates)))
+                    price_cents = tax_cents[pt['id']] if want_tax else _int_cents(pt['list_price'])
+
+                img_url = _image_url_from_values(base, tree, pt)
+                # 每个 item 一行，仅 debug 级别；数量汇总见迭代结束时的 GRAB MENU BUILD
+                _logger.debug(
+                    "GRAB MENU ITEM | tmpl_id=%s name=%s price_cents=%s grab_price=%s tax_included=%s img=%s desc=%.200r",
+                    pt['id'] if pt else None, name, price_cents, it['use_grab_price'], want_tax, img_url, desc
+                )
+
+                items.append({
+                    "id": it_id,
+                    "name": name,
+                    "sequence": it['sequence'] or 1,
+                    "availableStatus": _norm_status(it['available_status'], "AVAILABLE"),
+                    "price": price_cents,
+                    "description": desc,
+                    # 双保险：同时输出 imageUrl 与 photos（部分实现只看其一）
+                    "imageUrl": img_url or "",
+                    "photos": [img_url] if img_url else [],
+                    "modifierGroups": _build_modifier_groups(
+                        name, tree['groups_by_item'].get(it['id'], []), tree['modifiers_by_group']),
+                })
+            item_count += len(items)
+
+            category_count += 1
+            yield {
+                "id": cat_id,
+                "name": cat['name'],
+                "sequence": cat['sequence'] or 1,
+                "availableStatus": _norm_status(cat.get('available_status'), "AVAILABLE"),
+                "sellingTimeID": SELLING_TIME_ID,
+                "items": items,
+            }
+
+    queries = cr.sql_log_count - queries_before
+    _logger.info("GRAB MENU BUILD | menu=%s categories=%s items=%s queries=%s",
+                 menu.id, category_count, item_count, queries)
+    if stats is not None:
+        stats.update({'categories': category_count, 'items': item_count, 'queries': queries})
+
+def _build_categories_from_db(menu, stats=None):
+    return list(_iter_categories_from_db(menu, stats=stats))
+
+def _build_placeholder_category(env):
+    Product = env['product.template'].sudo()
+    p = Product.search([('website_published', '=', True)], limit=1)
+    name = p.name if p else "Sample Item"
+    price_cents = _int_cents(p.list_price if p else 1.00)
+    url = _product_image_url(p) if p else ""
+    return [{
+        "id": "CATEGORY-PLACEHOLDER",
+        "name": "Placeholder",
+        "sequence": 1,
+        "availableStatus": "AVAILABLE",
+        "sellingTimeID": SELLING_TIME_ID,
+        "items": [{
+            "id": "ITEM-PLACEHOLDER",
+            "name": name,
+            "sequence": 1,
+            "availableStatus": "AVAILABLE",
+            "price": price_cents,
+            "description": "Autogenerated placeholder to pass validation.",
+            "imageUrl": url or "",
+            "photos": [url] if url else [],
+            "modifierGroups": []
+        }]
+    }]
+
+def _build_selling_times():
+    return [{
+        "id": SELLING_TIME_ID,
+        "name": "All Day",
+        "sequence": 1,
+        "serviceHours": {
+            d: {
+                "openPeriodType": "OpenPeriod",
+                "periods": [{"startTime": "00:00", "endTime": "23:59"}]
+            } for d in DAYS
+        },
+        "startTime": "1000-01-01 00:00:00",
+        "endTime":   "9999-12-31 23:59:59"
+    }]
+
+def _payload_header(menu, grab_mid, pmid):
+    effective_mid = grab_mid or (menu.merchant_id or "")
+    effective_pmid = pmid or (menu.partner_merchant_id or "")
+
+    return {
+        "merchantID": effective_mid,
+        "partnerMerchantID": effective_pmid,
+        "currency": {
+            "code": menu.currency_code or "SGD",
+            "symbol": menu.currency_symbol or "S$",
+            "exponent": menu.currency_exponent or 2
+        },
+        "sellingTimes": _build_selling_times(),
+    }
+
+def _build_payload(menu, grab_mid, pmid, stats=None):
+    payload = _payload_header(menu, grab_mid, pmid)
+    categories = _build_categories_from_db(menu, stats=stats)
+    if not categories:
+        categories = _build_placeholder_category(menu.env)
+    payload["categories"] = categories
+    return payload
+
+def _payload_hash(payload):
+    """规范化 JSON（键排序、紧凑分隔符）的 sha256，只随菜单内容变化。"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def _iter_payload_json(menu, grab_mid, pmid, stats=None):
+    """
+    与 json.dumps(_build_payload(...), ensure_ascii=False) 输出完全相同的文本，
+    但按 category 逐段产出，整份 payload 和整段 JSON 字符串不会同时留在内存里。
+    """
+    head = json.dumps(_payload_header(menu, grab_mid, pmid), ensure_ascii=False)
+    yield head[:-1] + ', "categories": ['
+    count = 0
+    for category in _iter_categories_from_db(menu, stats=stats):
+        yield (', ' if count else '') + json.dumps(category, ensure_ascii=False)
+        count += 1
+    if not count:
+        yield ', '.join(json.dumps(c, ensure_ascii=False) for c in _build_placeholder_category(menu.env))
+    yield ']}'
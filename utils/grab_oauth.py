@@ -1,35 +1,252 @@
 # utils/grab_oauth.py
 # -*- coding: utf-8 -*-
+"""
+Grab IdP access token 的统一管理（进程级缓存 + 单飞刷新）。
+
+- 进程内缓存：同一数据库、同一组凭证的 token 在内存里复用，出站调用不再每次读 ir.config_parameter
+- 单飞刷新：进程内每个 key 一把锁，只有一个线程去刷新，其余线程等待结果；
+  跨 worker 用 PostgreSQL advisory lock（独立 cursor），拿到锁后先重读参数，
+  别的 worker 刚刷新过就直接复用，不再请求 IdP
+- 提前刷新：离过期不足 REFRESH_AHEAD 秒时继续返回旧 token，同时后台线程刷新
+- 出站调用返回 401（token 被吊销或凭证已更换）：grab_invalidate_access_token 丢掉内存里和参数里的这个 token，
+  调用方用新 token 重试一次（grab_request 带 env 时自动处理）
+- 计数：token_stats() 返回命中 / 刷新 / 等待等计数
+"""
+import logging
+import threading
 import time
+from collections import Counter
+
 import requests
 
-def grab_get_access_token(env):
+from odoo import _
+from odoo.exceptions import UserError
+
+from .grab_http import grab_request
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_URL = 'https://api.grab.com/grabid/v1/oauth2/token'
+DEFAULT_SCOPE = 'food.partner_api'
+TOKEN_PARAM = 'grab.oauth.token'
+EXP_PARAM = 'grab.oauth.token_exp'
+
+REFRESH_AHEAD = 300   # 离过期不足 5 分钟：后台刷新，仍返回旧 token
+MIN_TTL = 60          # 离过期不足 1 分钟：视为过期，调用方等待刷新结果
+
+
+class TokenRejected(UserError):
+    """出站调用被 Grab 以 401 拒绝；token 为被拒的那个，调用方作废它后重试一次"""
+
+    def __init__(self, token, message):
+        super().__init__(message)
+        self.token = token
+
+
+class TokenCache:
+    """
+    key -> (token, expires_at) 的线程安全缓存。load(key) 负责拿到新 token（跨 worker 的协调在 load 里做），
+    返回 (token, expires_at)；同一个 key 同一时间只会有一个 load 在跑。
+    """
+
+    def __init__(self, refresh_ahead=REFRESH_AHEAD, min_ttl=MIN_TTL, clock=time.time):
+        self.refresh_ahead = refresh_ahead
+        self.min_ttl = min_ttl
+        self.clock = clock
+        self.stats = Counter()
+        self._tokens = {}
+        self._locks = {}
+        self._background = set()
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key, load):
+        """返回 (token, expires_at)"""
+        entry = self._tokens.get(key)
+        now = self.clock()
+        if entry and entry[1] - now > self.min_ttl:
+            self.stats['hits'] += 1
+            if entry[1] - now <= self.refresh_ahead:
+                self._refresh_in_background(key, load)
+            return entry
+
+        lock = self._lock_for(key)
+        if not lock.acquire(blocking=False):
+            # 别的线程正在刷新：等它完成后直接用它的结果
+            self.stats['waits'] += 1
+            lock.acquire()
+        try:
+            entry = self._tokens.get(key)
+            if entry and entry[1] - self.clock() > self.min_ttl:
+                self.stats['hits'] += 1
+                return entry
+            return self._load(key, load)
+        finally:
+            lock.release()
+
+    def _load(self, key, load):
+        try:
+            token, expires_at = load(key)
+        except Exception:
+            self.stats['failures'] += 1
+            raise
+        self.stats['refreshes'] += 1
+        self._tokens[key] = (token, expires_at)
+        return self._tokens[key]
+
+    def seed(self, key, token, expires_at):
+        """用调用方已经读到的有效 token 填充缓存（例如别的 worker 刷新后写入参数的 token）"""
+        if token and expires_at - self.clock() > self.min_ttl and key not in self._tokens:
+            self.stats['db_hits'] += 1
+            self._tokens[key] = (token, expires_at)
+
+    def _refresh_in_background(self, key, load):
+        with self._guard:
+            if key in self._background:
+                return
+            self._background.add(key)
+
+        def _run():
+            lock = self._lock_for(key)
+            try:
+                with lock:
+                    entry = self._tokens.get(key)
+                    if entry and entry[1] - self.clock() > self.refresh_ahead:
+                        return  # 已被别的线程刷新
+                    self.stats['background_refreshes'] += 1
+                    self._load(key, load)
+            except Exception:
+                _logger.exception("Grab token background refresh failed")
+            finally:
+                with self._guard:
+                    self._background.discard(key)
+
+        threading.Thread(target=_run, name='grab-token-refresh', daemon=True).start()
+
+    def invalidate(self, key=None, token=None):
+        """token 给定时只在缓存的仍是这个 token 时作废（别的线程可能已经换上了新 token）"""
+        with self._guard:
+            if key is None:
+                self._tokens.clear()
+            elif token is None or (self._tokens.get(key) or (None,))[0] == token:
+                if self._tokens.pop(key, None):
+                    self.stats['invalidations'] += 1
+
+
+_cache = TokenCache()
+
+
+def _credentials(env):
     ICP = env['ir.config_parameter'].sudo()
-    cid  = ICP.get_param('grab.client_id')
-    csec = ICP.get_param('grab.client_secret')
+    return (
+        ICP.get_param('grab.client_id') or ICP.get_param('grab.oauth.client_id') or '',
+        ICP.get_param('grab.client_secret') or ICP.get_param('grab.oauth.client_secret') or '',
+        ICP.get_param('grab.scope') or DEFAULT_SCOPE,
+        ICP.get_param('grab.oauth.token_url') or DEFAULT_TOKEN_URL,
+    )
 
-    tok  = ICP.get_param('grab.oauth.token')
-    exp  = int(ICP.get_param('grab.oauth.token_exp') or 0)
-    now  = int(time.time())
-    if tok and exp - now > 60:
-        return tok
 
-    token_url = ICP.get_param('grab.oauth.token_url') or 'https://api.grab.com/grabid/v1/oauth2/token'
+def _request_token(cid, csec, scope, token_url):
     payload = {
         "client_id": cid,
         "client_secret": csec,
         "grant_type": "client_credentials",
-        "scope": "food.partner_api",
+        "scope": scope,
     }
-    r = requests.post(token_url, json=payload, headers={'Content-Type': 'application/json'}, timeout=20)
-    # 若授权失败，清缓存，抛错更清晰
-    if r.status_code == 401:
-        ICP.set_param('grab.oauth.token', '')
-        ICP.set_param('grab.oauth.token_exp', '0')
+    r = grab_request('POST', token_url, 'oauth_token', json=payload, headers={'Content-Type': 'application/json'})
     r.raise_for_status()
-    data = r.json()
-    tok = data['access_token']
-    ttl = int(data.get('expires_in', 604799))
-    ICP.set_param('grab.oauth.token', tok)
-    ICP.set_param('grab.oauth.token_exp', str(now + ttl))
-    return tok
+    data = r.json() or {}
+    token, ttl = data.get('access_token'), data.get('expires_in')
+    try:
+        ttl = int(ttl or 0)
+    except (TypeError, ValueError):
+        ttl = 0
+    if not token or not ttl:
+        raise UserError(_("Grab OAuth response missing token/expires_in: %s") % data)
+    return token, ttl
+
+
+def _make_loader(registry, credentials):
+    """
+    跨 worker 单飞：在独立 cursor 上拿 session 级 advisory lock，别的 worker 会阻塞在这里。
+    拿到锁后先 commit 一次拿新快照、重读参数，别人刚刷新过就直接用；否则请求 IdP 并写回参数。
+    用独立 cursor，调用方事务回滚也不会丢掉新 token，也不会与调用方的事务产生写冲突。
+    """
+    from odoo import api, SUPERUSER_ID
+
+    cid, csec, scope, token_url = credentials
+
+    def load(key):
+        with registry.cursor() as cr:
+            cr.execute("SELECT pg_advisory_lock(hashtext('grab.oauth.token'), hashtext(%s))", (cid,))
+            try:
+                cr.commit()
+                ICP = api.Environment(cr, SUPERUSER_ID, {})['ir.config_parameter']
+                cr.execute("SELECT key, value FROM ir_config_parameter WHERE key IN %s", ((TOKEN_PARAM, EXP_PARAM),))
+                stored = dict(cr.fetchall())
+                tok, exp = stored.get(TOKEN_PARAM), int(stored.get(EXP_PARAM) or 0)
+                if tok and exp - time.time() > _cache.refresh_ahead:
+                    return tok, exp
+                now = int(time.time())
+                try:
+                    tok, ttl = _request_token(cid, csec, scope, token_url)
+                except requests.HTTPError as e:
+                    if e.response is not None and e.response.status_code == 401:
+                        # 凭证失效，清掉旧 token，抛错更清晰
+                        ICP.set_param(TOKEN_PARAM, '')
+                        ICP.set_param(EXP_PARAM, '0')
+                        cr.commit()
+                    raise
+                ICP.set_param(TOKEN_PARAM, tok)
+                ICP.set_param(EXP_PARAM, str(now + ttl))
+                cr.commit()
+                _logger.info("Grab access token refreshed (ttl=%ss)", ttl)
+                return tok, now + ttl
+            finally:
+                # session 级锁不随事务结束释放，连接回池前必须解锁
+                cr.rollback()
+                cr.execute("SELECT pg_advisory_unlock(hashtext('grab.oauth.token'), hashtext(%s))", (cid,))
+
+    return load
+
+
+def grab_get_access_token(env):
+    return grab_get_access_token_info(env)[0]
+
+
+def grab_get_access_token_info(env):
+    """返回 (token, expires_at)"""
+    credentials = _credentials(env)
+    key = (env.cr.dbname,) + credentials[:3]
+    if key not in _cache._tokens:
+        # 进程刚启动：参数里已有有效 token 就直接用，不必加锁
+        ICP = env['ir.config_parameter'].sudo()
+        _cache.seed(key, ICP.get_param(TOKEN_PARAM), int(ICP.get_param(EXP_PARAM) or 0))
+    return _cache.get(key, _make_loader(env.registry, credentials))
+
+
+def grab_invalidate_access_token(env=None, token=None):
+    """
+    出站调用拿到 401 时调用，下次取 token 会重新刷新。给出被拒的 token 时，参数里存的仍是它就一并清掉，
+    否则其他 worker（以及本进程的 seed）会继续读到这个已失效的 token；用独立 cursor，调用方回滚也不影响
+    """
+    if env is None:
+        _cache.invalidate()
+        return
+    _cache.invalidate((env.cr.dbname,) + _credentials(env)[:3], token)
+    if not token:
+        return
+    from odoo import api, SUPERUSER_ID
+    with env.registry.cursor() as cr:
+        ICP = api.Environment(cr, SUPERUSER_ID, {})['ir.config_parameter']
+        if ICP.get_param(TOKEN_PARAM) == token:
+            ICP.set_param(TOKEN_PARAM, '')
+            ICP.set_param(EXP_PARAM, '0')
+            _logger.warning("Grab rejected the stored access token; cleared it for refresh")
+
+
+def token_stats():
+    return dict(_cache.stats)
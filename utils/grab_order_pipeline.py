@@ -0,0 +1,232 @@
+# utils/grab_order_pipeline.py
+# -*- coding: utf-8 -*-
+"""
+订单入库流水线：/grab/webhook/order、List Orders 同步、队列消费者共用同一套解析逻辑。
+
+    validate → normalize → resolve → persist → post_hooks
+
+- validate：检查必填字段，不合格的单记入 errors 并跳过（批量时不影响其他单）
+- normalize：Grab JSON → 表头 / 明细 / 活动 / 优惠 vals，金额从最小货币单位换算
+- resolve：按 grab_item_code → default_code → barcode 匹配 grab.menu.item（内存索引）
+- persist：grab.order._upsert_prepared_orders，按稳定键比对、每个子模型一次批量插入
+- post_hooks：grab.order._after_grab_ingest（继承扩展点）以及调用方传入的回调
+
+每个阶段累计耗时记在 timings（秒），方便定位入库延迟。
+"""
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+_logger = logging.getLogger(__name__)
+
+STAGES = ('validate', 'normalize', 'resolve', 'persist', 'post_hooks')
+
+# Submit Order webhook 的必填字段；List Orders 同步只要求 orderID
+SUBMIT_REQUIRED_FIELDS = (
+    'orderID', 'shortOrderNumber', 'merchantID', 'paymentType', 'cutlery',
+    'orderTime', 'currency', 'featureFlags', 'items', 'price',
+)
+
+
+def dt_iso_to_odoo(s):
+    """Grab 的 ISO 时间（可带 Z / 毫秒）→ Odoo Datetime 字符串；无法解析返回 False"""
+    if not s or not str(s).strip():
+        return False
+    v = s[:-1] if isinstance(s, str) and s.endswith('Z') else s
+    for fmt in ("%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(v, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            pass
+    return False
+
+
+def _first(d, *keys):
+    """按顺序取第一个非空标识并去空白"""
+    for k in keys:
+        v = d.get(k)
+        if v:
+            return str(v).strip()
+    return ''
+
+
+class OrderIngestResult:
+    """一次 run 的结果：orders 与输入中合格的单同序；errors 为 [(orderID, reason, details)]"""
+
+    def __init__(self, orders, errors, timings):
+        self.orders = orders
+        self.errors = errors
+        self.timings = timings
+
+
+class GrabOrderPipeline:
+
+    def __init__(self, env, required=('orderID',), post_hooks=()):
+        self.env = env
+        self.required = tuple(required)
+        self.post_hooks = list(post_hooks)
+        self.timings = dict.fromkeys(STAGES, 0.0)
+
+    @contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[stage] += time.perf_counter() - start
+
+    # ---- stages ----
+
+    def validate(self, data):
+        """返回 (reason, details)；合格返回 None"""
+        if not isinstance(data, dict):
+            return 'invalid_payload', None
+        missing = [k for k in self.required if k not in data]
+        if missing:
+            return 'missing_fields', missing
+        if not data.get('orderID'):
+            return 'missing_fields', ['orderID']
+        return None
+
+    def normalize(self, data):
+        """Grab 订单 JSON → (表头 vals, {子表字段: [vals]})；明细的 product 留给 resolve 阶段"""
+        cur = data.get('currency') or {}
+        currency_exponent = cur.get('exponent', 2)
+        price_divisor = 10 ** currency_exponent  # Grab 金额为最小货币单位，如 SGD 为分
+
+        def money(v):
+            return (v or 0) / price_divisor
+
+        vals = {
+            'grab_order_id': data['orderID'],
+            'short_order_number': data.get('shortOrderNumber'),
+            'merchant_id': data.get('merchantID'),
+            'partner_merchant_id': data.get('partnerMerchantID'),
+            'payment_type': data.get('paymentType'),
+            'cutlery': bool(data.get('cutlery')),
+            'order_time': dt_iso_to_odoo(data.get('orderTime')),
+            'submit_time': dt_iso_to_odoo(data.get('submitTime')),
+            'complete_time': dt_iso_to_odoo(data.get('completeTime')),
+            'scheduled_time': dt_iso_to_odoo(data.get('scheduledTime')),
+            'currency_code': cur.get('code'),
+            'currency_symbol': cur.get('symbol'),
+            'currency_exponent': currency_exponent,
+            'feature_flags': data.get('featureFlags'),
+            'dine_in': data.get('dineIn'),
+            'receiver': data.get('receiver'),
+            'order_ready_estimation': data.get('orderReadyEstimation'),
+            'price_info': data.get('price'),
+            'membership_id': data.get('membershipID') or '',
+            'raw_json': data,
+            'is_mex_edit_order': bool((data.get('featureFlags') or {}).get('isMexEditOrder')),
+        }
+        # Submit payload 里通常没有状态：不带时不写，重复提交 / MEX 修改不会把状态推送写入的值清空
+        if data.get('orderState'):
+            vals['order_state'] = data['orderState']
+
+        line_vals = []
+        for item in (data.get('items') or []):
+            modifiers = []
+            for mod in (item.get('modifiers') or []):
+                mod = dict(mod)
+                if mod.get('price') is not None:
+                    mod['price'] = mod['price'] / price_divisor
+                if mod.get('tax') is not None:
+                    mod['tax'] = mod['tax'] / price_divisor
+                modifiers.append(mod)
+            line_vals.append({
+                'grab_item_id': _first(item, 'grabItemID', 'itemID', 'itemId', 'grabItemId') or False,
+                'grab_item_code': _first(item, 'id', 'itemCode', 'code') or False,
+                'barcode': _first(item, 'barcode'),  # resolve 阶段用完即移除
+                'name': item.get('name') or item.get('shortName') or item.get('short_name') or '',
+                'quantity': item.get('quantity'),
+                'price': money(item.get('price')),
+                'tax': money(item.get('tax')),
+                'specifications': item.get('specifications') or '',
+                'out_of_stock_instruction': item.get('outOfStockInstruction'),
+                'modifiers': modifiers,
+            })
+
+        campaign_vals = [{
+            'campaign_id': c.get('id'),
+            'name': c.get('name'),
+            'level': c.get('level'),
+            'type': c.get('type'),
+            'usage_count': c.get('usageCount'),
+            'mex_funded_ratio': c.get('mexFundedRatio'),
+            'deducted_amount': money(c.get('deductedAmount')),
+            'deducted_part': c.get('deductedPart'),
+            'campaign_name_for_mex': c.get('campaignNameForMex'),
+            'applied_item_ids': c.get('appliedItemIDs'),
+            'free_item': c.get('freeItem'),
+        } for c in (data.get('campaigns') or [])]
+
+        promo_vals = [{
+            'code': p.get('code'),
+            'description': p.get('description'),
+            'name': p.get('name'),
+            'promo_amount': money(p.get('promoAmount')),
+            'mex_funded_ratio': p.get('mexFundedRatio'),
+            'mex_funded_amount': money(p.get('mexFundedAmount')),
+            'targeted_price': money(p.get('targetedPrice')),
+            'promo_amount_in_min': money(p.get('promoAmountInMin')),
+        } for p in (data.get('promos') or [])]
+
+        return vals, {'line_ids': line_vals, 'campaign_ids': campaign_vals, 'promo_ids': promo_vals}
+
+    def resolve(self, prepared):
+        """给每行明细填 product_id / product_name，名称缺省时用商品名或外部标识兜底"""
+        MenuItem = self.env['grab.menu.item'].sudo()
+        for _vals, children in prepared:
+            for line in children['line_ids']:
+                code, grab_id = line['grab_item_code'] or '', line['grab_item_id'] or ''
+                menu_item = MenuItem._resolve_grab_item(code, grab_id, line.pop('barcode', ''))
+                product_name = (menu_item.product_id.name if menu_item and menu_item.product_id else '') \
+                    or line['name'] or code or grab_id or 'Unknown Item'
+                _logger.debug("Grab item lookup: code=%s id=%s -> menu item=%s",
+                              code, grab_id, menu_item.display_name if menu_item else 'None')
+                line.update({
+                    'product_id': menu_item.id if menu_item else False,
+                    'product_name': product_name,
+                    'name': line['name'] or product_name,
+                })
+        return prepared
+
+    def persist(self, prepared):
+        return self.env['grab.order'].sudo()._upsert_prepared_orders(prepared)
+
+    def run_post_hooks(self, orders):
+        orders._after_grab_ingest()
+        for hook in self.post_hooks:
+            hook(orders)
+
+    # ---- entry point ----
+
+    def run(self, orders):
+        """orders：单个订单 dict 或可迭代的多个订单；返回 OrderIngestResult"""
+        if isinstance(orders, dict):
+            orders = [orders]
+
+        errors, valid = [], []
+        with self._timed('validate'):
+            for data in orders:
+                error = self.validate(data)
+                if error:
+                    order_id = data.get('orderID') if isinstance(data, dict) else None
+                    errors.append((order_id, error[0], error[1]))
+                else:
+                    valid.append(data)
+        with self._timed('normalize'):
+            prepared = [self.normalize(data) for data in valid]
+        with self._timed('resolve'):
+            prepared = self.resolve(prepared)
+        with self._timed('persist'):
+            records = self.persist(prepared)
+        with self._timed('post_hooks'):
+            if records:
+                self.run_post_hooks(records)
+
+        _logger.info("Grab order ingest: %s ok, %s rejected; %s", len(records), len(errors),
+                     ', '.join('%s=%.1fms' % (s, self.timings[s] * 1000) for s in STAGES))
+        return OrderIngestResult(records, errors, dict(self.timings))
@@ -0,0 +1,57 @@
+# utils/grab_pricing.py
+# -*- coding: utf-8 -*-
+"""
+菜单导出的含税价计算（GetMenu payload 与 grab.price.wizard 共用）。
+
+产品按（公司内的销售税组合, 币种）分组，同组内相同标价只调用一次 compute_all，
+参数与逐个产品调用完全相同，所以结果与 compute_all 逐个计算一致。
+含 python 代码税（amount_type='code'）的组结果可能依赖产品本身，仍逐个产品计算。
+"""
+from collections import defaultdict
+
+
+def _int_cents(x):
+    try:
+        return int(round(float(x or 0.0) * 100))
+    except Exception:
+        return 0
+
+
+def tax_included_prices(products):
+    """{product.template id: 含税价}；没有税的产品直接用 list_price。"""
+    if not products:
+        return {}
+    company = products.env.company
+
+    # (tax ids, currency id) -> (taxes, currency, products)
+    groups = {}
+    for pt in products:
+        taxes = pt.taxes_id.filtered(lambda t: t.company_id == company)
+        key = (tuple(taxes.ids), pt.currency_id.id)
+        if key not in groups:
+            groups[key] = (taxes, pt.currency_id, [])
+        groups[key][2].append(pt)
+
+    prices = {}
+    for taxes, currency, members in groups.values():
+        if not taxes:
+            for pt in members:
+                prices[pt.id] = pt.list_price or 0.0
+            continue
+        per_product = any(t.amount_type == 'code' for t in taxes | taxes.children_tax_ids)
+        by_price = defaultdict(list)
+        for pt in members:
+            by_price[pt.id if per_product else (pt.list_price or 0.0)].append(pt)
+        for bucket in by_price.values():
+            pt = bucket[0]
+            price = pt.list_price or 0.0
+            res = taxes.compute_all(price, currency=currency, quantity=1.0, product=pt, partner=None)
+            total = res.get('total_included', price)
+            for member in bucket:
+                prices[member.id] = total
+    return prices
+
+
+def tax_included_cents(products):
+    """{product.template id: 含税价（分）}，供 payload 与价格向导直接使用。"""
+    return {pid: _int_cents(price) for pid, price in tax_included_prices(products).items()}
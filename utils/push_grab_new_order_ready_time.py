@@ -1,8 +1,8 @@
 from .grab_oauth import grab_get_access_token
-import requests
+from .grab_http import grab_request
 
-def push_grab_new_order_ready_time(order_id, new_order_ready_time, client_id, client_secret):
-    access_token = grab_get_access_token(client_id, client_secret)
+def push_grab_new_order_ready_time(env, order_id, new_order_ready_time):
+    access_token = grab_get_access_token(env)
     url = 'https://partner-api.grab.com/grabfood/partner/v1/order/readytime'
     headers = {
         'Authorization': f'Bearer {access_token}',
@@ -12,5 +12,5 @@ def push_grab_new_order_ready_time(order_id, new_order_ready_time, client_id, cl
         "orderID": order_id,
         "newOrderReadyTime": new_order_ready_time  # 必须是 ISO8601 格式字符串
     }
-    resp = requests.put(url, headers=headers, json=data, timeout=10)
+    resp = grab_request('PUT', url, 'order_ready_time', env=env, headers=headers, json=data)
     return resp.status_code, resp.text
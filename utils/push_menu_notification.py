@@ -1,7 +1,7 @@
 # utils/push_menu_notification.py
 # -*- coding: utf-8 -*-
-import requests
 from .grab_oauth import grab_get_access_token
+from .grab_http import grab_request
 
 def push_menu_notification(env, merchant_id: str):
     ICP = env['ir.config_parameter'].sudo()
@@ -12,5 +12,5 @@ def push_menu_notification(env, merchant_id: str):
     token = grab_get_access_token(env)
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
     payload = {"merchantID": merchant_id}
-    r = requests.post(url, json=payload, headers=headers, timeout=20)
+    r = grab_request('POST', url, 'menu_notification', env=env, json=payload, headers=headers)
     return r.status_code, (r.text or "")
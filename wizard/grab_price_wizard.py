@@ -1,5 +1,7 @@
 from odoo import models, fields, api
 
+from ..utils.grab_pricing import tax_included_prices
+
 
 class GrabPriceWizard(models.TransientModel):
     _name = 'grab.price.wizard'
@@ -60,6 +62,8 @@ class GrabPriceWizard(models.TransientModel):
     def action_preview_prices(self):
         """Preview the calculated prices before applying"""
         preview_data = []
+        # 产品含税价整批计算一次（与 GetMenu 同一套计算）
+        tax_included = tax_included_prices(self.item_ids.product_id)
         for item in self.item_ids:
             if not item.product_id:
                 continue
@@ -83,6 +87,7 @@ class GrabPriceWizard(models.TransientModel):
             preview_data.append({
                 'item_name': item.name,
                 'current_price': current_price,
+                'current_price_incl_tax': tax_included.get(item.product_id.id, current_price),
                 'new_grab_price': new_grab_price,
                 'gst_amount': gst_amount,
                 'final_price': final_price,
@@ -108,6 +113,7 @@ class GrabPricePreview(models.TransientModel):
     wizard_id = fields.Many2one('grab.price.wizard', string='Wizard')
     item_name = fields.Char(string='Item Name')
     current_price = fields.Float(string='Current Price')
+    current_price_incl_tax = fields.Float(string='Current Price (Incl. Tax)')
     new_grab_price = fields.Float(string='New Grab Price (Excl. GST)')
     gst_amount = fields.Float(string='GST Amount')
     final_price = fields.Float(string='Final Price (Incl. GST)')
\ No newline at end of file